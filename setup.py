@@ -2,6 +2,7 @@
 import multiprocessing
 assert multiprocessing
 import re
+import sys
 from setuptools import setup, find_packages
 
 
@@ -17,6 +18,17 @@ def get_version():
         raise RuntimeError('Unable to find version string in {0}.'.format(VERSION_FILE))
 
 
+install_requires = [
+    'Django>=1.7',
+    'djangorestframework>=2.3.13',
+    'django-manager-utils>=0.8.2',
+    'django_filter>=0.7',
+]
+if sys.version_info < (3,):
+    # Backport of concurrent.futures used to check steps in parallel
+    install_requires.append('futures>=3.0')
+
+
 setup(
     name='django-tour',
     version=get_version(),
@@ -39,12 +51,7 @@ setup(
         'Framework :: Django :: 1.8',
     ],
     license='MIT',
-    install_requires=[
-        'Django>=1.7',
-        'djangorestframework>=2.3.13',
-        'django-manager-utils>=0.8.2',
-        'django_filter>=0.7',
-    ],
+    install_requires=install_requires,
     tests_require=[
         'psycopg2',
         'django-nose>=1.4',
@@ -0,0 +1,83 @@
+"""
+Support for awaiting the tour api from code running in an asyncio event loop. The django orm is synchronous, so
+database work runs on a bounded thread pool and the returned futures can be awaited without blocking the loop.
+This module requires Python 3.4.4 or later.
+"""
+import asyncio
+from functools import partial
+
+from django.conf import settings
+
+from tour.executors import DatabaseThreadPoolExecutor
+
+_executor = None
+
+
+def get_executor():
+    """
+    Returns the thread pool used for database work, sized with the TOUR_ASYNC_WORKERS setting
+    """
+    global _executor
+    if _executor is None:
+        _executor = DatabaseThreadPoolExecutor(max_workers=getattr(settings, 'TOUR_ASYNC_WORKERS', 4))
+    return _executor
+
+
+def run_in_executor(func, *args, **kwargs):
+    """
+    Runs the function on the tour thread pool
+    :return: A future resolved with the result of the function
+    :rtype: asyncio.Future
+    """
+    return asyncio.get_event_loop().run_in_executor(get_executor(), partial(func, *args, **kwargs))
+
+
+def then(awaitable, callback):
+    """
+    Returns a future resolved with the result of calling the callback with the result of the awaitable. If the
+    callback returns another awaitable, the future is resolved with its result instead.
+    :rtype: asyncio.Future
+    """
+    result = asyncio.Future()
+
+    def resolve(future):
+        if result.cancelled():
+            return
+        try:
+            result.set_result(future.result())
+        except Exception as error:
+            result.set_exception(error)
+
+    def on_done(future):
+        if result.cancelled():
+            return
+        try:
+            value = callback(future.result())
+        except Exception as error:
+            result.set_exception(error)
+            return
+        if isinstance(value, asyncio.Future) or asyncio.iscoroutine(value):
+            asyncio.ensure_future(value).add_done_callback(resolve)
+        else:
+            result.set_result(value)
+
+    asyncio.ensure_future(awaitable).add_done_callback(on_done)
+    return result
+
+
+def get_first_incomplete_step(steps, checks):
+    """
+    Runs the completion checks of the steps concurrently. Like checking the steps in order, a check that fails is
+    only raised if every step before it is complete.
+    :param checks: Awaitables resolved with the completion of each step
+    :return: A future resolved with the first step that isn't complete, or None if all steps are complete
+    :rtype: asyncio.Future
+    """
+    def get_first_incomplete(results):
+        for step, complete in zip(steps, results):
+            if isinstance(complete, Exception):
+                raise complete
+            if not complete:
+                return step
+        return None
+    return then(asyncio.gather(*checks, return_exceptions=True), get_first_incomplete)
@@ -1,9 +1,44 @@
+from django.conf import settings
+from django.db.models import Count, Max
+from django.http import StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from rest_framework.authentication import SessionAuthentication
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import ListAPIView
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.views import APIView
+from tour.cache import get_api_version
+from tour.export import CONTENT_TYPES, EXPORT_FORMATS, iter_export
 from tour.filters import TourFilter
-from tour.models import Tour
+from tour.models import Tour, TourStatus
 from tour.serializers import TourSerializer
+from tour.state import get_tour_state
+
+
+def get_tour_list_etag(request):
+    """
+    Returns the ETag of the tours listed for the user of the request. It is computed from the tour statuses of the
+    user with one aggregate query, the versions of the tour progress of the user and the tour definitions kept in the
+    cache, the requested filters and media type, and the time the version was first seen, without evaluating any tour
+    or step. No Last-Modified header is sent because it only has a precision of one second, so changes made within
+    the second of a response would be missed. Returns None if conditional responses are disabled with the
+    TOUR_API_CONDITIONAL_TIMEOUT setting.
+    :rtype: str
+    """
+    timeout = getattr(settings, 'TOUR_API_CONDITIONAL_TIMEOUT', None)
+    if not timeout:
+        return None
+
+    def get_etag():
+        statuses = TourStatus.objects.filter(user=request.user).aggregate(
+            num_statuses=Count('id'), create_time=Max('create_time'), complete_time=Max('complete_time'))
+        key = '{0}.{1}.{2}.{3}.{4}'.format(
+            statuses['num_statuses'], statuses['create_time'], statuses['complete_time'],
+            request.query_params.urlencode(), request.accepted_media_type)
+        digest, modified = get_api_version(request.user, key, timeout)
+        return '{0}.{1}'.format(digest, modified)
+    return get_tour_state(request).get_value('tour_list_etag', get_etag)
 
 
 class TourApiView(ListAPIView):
@@ -12,6 +47,46 @@ class TourApiView(ListAPIView):
     permission_classes = (IsAuthenticated,)
     authentication_classes = (SessionAuthentication,)
 
+    @method_decorator(condition(etag_func=get_tour_list_etag))
+    def get(self, request, *args, **kwargs):
+        """
+        Lists the tours of the user, or responds with 304 Not Modified before completing or serializing any tours
+        if the ETag sent by the client still matches
+        """
+        return super(TourApiView, self).get(request, *args, **kwargs)
+
     def get_queryset(self):
-        Tour.objects.complete_tours(self.request.user)
+        get_tour_state(self.request).complete_tours()
         return Tour.objects.filter(tourstatus__user=self.request.user, tourstatus__complete=False)
+
+    def get_serializer(self, *args, **kwargs):
+        """
+        Adds the steps and step completion of the serialized tours to the context so the serializers don't
+        need to query them for every tour
+        """
+        serializer = super(TourApiView, self).get_serializer(*args, **kwargs)
+        instance = kwargs.get('instance', args[0] if args else None)
+        if instance is not None:
+            tours = instance if kwargs.get('many') else [instance]
+            serializer.context.update(get_tour_state(self.request).get_serializer_context(tours))
+        return serializer
+
+
+class TourExportApiView(APIView):
+    """
+    Streams the tour statuses of every user, or the step statuses with `steps=1`, to staff users as CSV or JSON
+    Lines with the `output` query parameter. The statuses can be limited to tours with `tour` parameters.
+    """
+    permission_classes = (IsAdminUser,)
+    authentication_classes = (SessionAuthentication,)
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.query_params.get('output', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError({'output': ['Expected one of {0}'.format(', '.join(EXPORT_FORMATS))]})
+        kind = 'steps' if request.query_params.get('steps') else 'tours'
+        response = StreamingHttpResponse(
+            iter_export(kind, export_format, request.query_params.getlist('tour')),
+            content_type=CONTENT_TYPES[export_format])
+        response['Content-Disposition'] = 'attachment; filename="tour_{0}.{1}"'.format(kind, export_format)
+        return response
@@ -1,6 +1,29 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
 
 
 class TourAppConfig(AppConfig):
     name = 'tour'
     verbose_name = 'Django Tour'
+
+    def ready(self):
+        # Rebuild everything derived from the tour definitions whenever tours or steps change
+        from tour.cache import invalidate_definitions, invalidate_user_tours_on_progress, invalidate_user_tours_on_save
+        from tour.signals import tour_progress_changed
+        for model_name in ('Tour', 'Step'):
+            for signal in (post_save, post_delete):
+                signal.connect(invalidate_definitions, sender=self.get_model(model_name))
+
+        # Forget the cached tours and progress of users when they change
+        tour_progress_changed.connect(invalidate_user_tours_on_progress)
+        for model_name in ('TourStatus', 'StepStatus'):
+            for signal in (post_save, post_delete):
+                signal.connect(invalidate_user_tours_on_save, sender=self.get_model(model_name))
+
+        # TOUR_PRELOAD_CLASSES can be True to import every tour and step class referenced in the database
+        # or a list of dotted paths to import
+        preload_setting = getattr(settings, 'TOUR_PRELOAD_CLASSES', False)
+        if preload_setting:
+            from tour.registry import preload_classes
+            preload_classes(None if preload_setting is True else preload_setting)
@@ -0,0 +1,289 @@
+from hashlib import md5
+from operator import attrgetter
+from uuid import uuid4
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+
+
+def get_cache():
+    """
+    Returns the django cache used by the tour app, configured with the TOUR_CACHE setting
+    """
+    return caches[getattr(settings, 'TOUR_CACHE', 'default')]
+
+
+# Changed whenever any tour or step changes so everything derived from the tour definitions is rebuilt, such as the
+# url indexes, the tour snapshot of every process, progress hints, cached navigation and api ETags
+DEFINITION_VERSION_KEY = 'tour.definition_version'
+
+
+def get_definition_version():
+    """
+    Returns the version of the tour and step definitions, which changes whenever any tour or step changes
+    """
+    return get_versions([DEFINITION_VERSION_KEY])[DEFINITION_VERSION_KEY]
+
+
+def get_step_completion_key(step_class, user_id):
+    """
+    Returns the cache key of the completion value of a step class for a user
+    """
+    return 'tour.step_complete.{0}.{1}.{2}'.format(step_class.__module__, step_class.__name__, user_id)
+
+
+def get_step_completion(step_class, user):
+    """
+    Returns the cached completion value of the step class for the user or None if it isn't cached
+    """
+    return get_cache().get(get_step_completion_key(step_class, user.pk))
+
+
+def set_step_completion(step_class, user, complete):
+    """
+    Caches the completion value of the step class for the user. Sticky steps keep their complete value forever.
+    """
+    timeout = None if complete and step_class.sticky_completion else step_class.completion_cache_timeout
+    get_cache().set(get_step_completion_key(step_class, user.pk), complete, timeout)
+
+
+def invalidate_step_completion(step_class, user_ids):
+    """
+    Removes the cached completion values of the step class for the users so they are evaluated again. The
+    complete values of sticky steps are kept.
+    """
+    cache = get_cache()
+    keys = [get_step_completion_key(step_class, user_id) for user_id in user_ids]
+    if step_class.sticky_completion:
+        complete_keys = [key for key, complete in cache.get_many(keys).items() if complete]
+        keys = [key for key in keys if key not in complete_keys]
+    cache.delete_many(keys)
+    change_progress_versions(user_ids)
+
+
+def invalidate_step_completion_on(step_classes, sender, get_user=attrgetter('user'), signals=(post_save, post_delete)):
+    """
+    Invalidates the cached completion values of the step classes whenever an instance of the sender model is
+    saved or deleted. This is meant to be called by the app defining the steps, for example:
+    invalidate_step_completion_on([ProfileStep], Profile)
+    :param get_user: Callable that returns the user that owns the given sender instance
+    """
+    def invalidate(sender, instance, **kwargs):
+        user = get_user(instance)
+        if user is not None:
+            for step_class in step_classes:
+                invalidate_step_completion(step_class, [user.pk])
+
+    for signal in signals:
+        signal.connect(invalidate, sender=sender, weak=False)
+    return invalidate
+
+
+def get_url_index_key(tour_id):
+    """
+    Returns the cache key of the url index of a tour. The tour id is 'all' for the index of the steps of every tour.
+    """
+    return 'tour.url_index.{0}'.format(tour_id)
+
+
+def get_url_index(tour_id):
+    """
+    Returns the current url index version and the cached url index of the tour. The url index is None if it isn't
+    cached or was cached for a different version.
+    :rtype: tuple
+    """
+    cache = get_cache()
+    key = get_url_index_key(tour_id)
+    values = cache.get_many([DEFINITION_VERSION_KEY, key])
+    version = values.get(DEFINITION_VERSION_KEY)
+    if version is None:
+        cache.add(DEFINITION_VERSION_KEY, uuid4().hex, None)
+        return cache.get(DEFINITION_VERSION_KEY), None
+    cached_version, url_index = values.get(key, (None, None))
+    return version, url_index if cached_version == version else None
+
+
+def set_url_index(tour_id, version, url_index, timeout):
+    """
+    Caches the url index of the tour for the version returned by `get_url_index`
+    """
+    get_cache().set(get_url_index_key(tour_id), (version, url_index), timeout)
+
+
+def invalidate_definitions(**kwargs):
+    """
+    Changes the version of the tour definitions so the url indexes, the tour snapshot of every process and
+    everything else derived from the tours and steps is rebuilt. This is connected to the signals of the tour and
+    step models and should be called after updating tours or steps without sending signals, such as with a queryset
+    update.
+    """
+    get_cache().set(DEFINITION_VERSION_KEY, uuid4().hex, None)
+
+
+def get_no_tour_key(user_id):
+    """
+    Returns the cache key of the flag telling that a user doesn't have any tour
+    """
+    return 'tour.no_tour.{0}'.format(user_id)
+
+
+def has_no_tour(user):
+    """
+    Returns whether the user is cached as not having any tour
+    """
+    return get_cache().get(get_no_tour_key(user.pk), False)
+
+
+def set_no_tour(user, timeout):
+    """
+    Caches that the user doesn't have any tour
+    """
+    get_cache().set(get_no_tour_key(user.pk), True, timeout)
+
+
+def invalidate_no_tour(user_ids):
+    """
+    Removes the cached flags of the users not having any tour
+    """
+    get_cache().delete_many([get_no_tour_key(user_id) for user_id in user_ids])
+
+
+def get_progress_version_key(user_id):
+    """
+    Returns the cache key of the version of the tour progress of a user
+    """
+    return 'tour.progress_version.{0}'.format(user_id)
+
+
+def change_progress_versions(user_ids):
+    """
+    Changes the versions of the tour progress of the users, so anything cached for their progress is not used again
+    """
+    get_cache().set_many(dict((get_progress_version_key(user_id), uuid4().hex) for user_id in user_ids), None)
+
+
+def get_versions(keys):
+    """
+    Returns a dict of the values of the version keys, setting a new version for any key that isn't cached
+    """
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return versions
+
+
+def get_navigation_key(user, path, always_show):
+    """
+    Returns the cache key of the rendered tour navigation of a user for a path. The key changes whenever the tour
+    progress of the user or any tour or step changes.
+    """
+    progress_key = get_progress_version_key(user.pk)
+    versions = get_versions([progress_key, DEFINITION_VERSION_KEY])
+    digest = md5('{0}.{1}.{2}'.format(
+        versions[progress_key], versions[DEFINITION_VERSION_KEY], path).encode('utf-8')).hexdigest()
+    return 'tour.navigation.{0}.{1:d}.{2}'.format(user.pk, bool(always_show), digest)
+
+
+def get_api_version(user, key, timeout):
+    """
+    Returns a digest of the key, the tour progress version of the user and the version of the tour definitions, and
+    the time the digest was first seen. The time is cached for the timeout, after which a new time is returned so
+    the api responds again to steps completed by something the tour doesn't know about.
+    :return: A tuple of the digest and the time as a unix timestamp
+    :rtype: tuple
+    """
+    progress_key = get_progress_version_key(user.pk)
+    versions = get_versions([progress_key, DEFINITION_VERSION_KEY])
+    digest = md5('{0}.{1}.{2}'.format(
+        versions[progress_key], versions[DEFINITION_VERSION_KEY], key).encode('utf-8')).hexdigest()
+    cache = get_cache()
+    time_key = 'tour.api_modified.{0}.{1}'.format(user.pk, digest)
+    cache.add(time_key, int(time.time()), timeout)
+    return digest, cache.get(time_key) or int(time.time())
+
+
+def invalidate_user_tours(user_ids):
+    """
+    Removes the cached values that depend on the tours and tour progress of the users
+    """
+    invalidate_no_tour(user_ids)
+    change_progress_versions(user_ids)
+
+
+def invalidate_user_tours_on_progress(sender, user_ids, **kwargs):
+    """
+    Receives the tour_progress_changed signal, which is sent when users are added to tours or make progress
+    """
+    invalidate_user_tours(user_ids)
+
+
+def invalidate_user_tours_on_save(sender, instance, **kwargs):
+    """
+    Receives the post_save and post_delete signals of tour and step statuses that are changed without sending
+    tour_progress_changed
+    """
+    invalidate_user_tours([instance.user_id])
+
+
+def get_progress_hint_key(tour_id, user_id):
+    """
+    Returns the cache key of the progress hint of a user for a tour
+    """
+    return 'tour.progress_hint.{0}.{1}'.format(tour_id, user_id)
+
+
+def get_progress_hint(tour_id, user_id):
+    """
+    Returns the current tour definition version and the number of leading steps of the tour the user is known to
+    have completed. The number is 0 if it isn't cached or was cached before any tour or step changed.
+    :rtype: tuple
+    """
+    key = get_progress_hint_key(tour_id, user_id)
+    values = get_cache().get_many([DEFINITION_VERSION_KEY, key])
+    if DEFINITION_VERSION_KEY not in values:
+        return get_versions([DEFINITION_VERSION_KEY])[DEFINITION_VERSION_KEY], 0
+    cached_version, position = values.get(key, (None, 0))
+    return values[DEFINITION_VERSION_KEY], position if cached_version == values[DEFINITION_VERSION_KEY] else 0
+
+
+def set_progress_hint(tour_id, user_id, version, position):
+    """
+    Caches the number of leading steps of the tour the user completed for the version returned by
+    `get_progress_hint`
+    """
+    get_cache().set(get_progress_hint_key(tour_id, user_id), (version, position), None)
+
+
+def get_progress_summary_key(tour_id, user_id):
+    """
+    Returns the cache key of the progress summary last saved to the tour status of a user
+    """
+    return 'tour.progress_summary.{0}.{1}'.format(tour_id, user_id)
+
+
+def get_progress_summary(tour_id, user_id):
+    """
+    Returns the current progress version of the user and the progress summary last saved to the tour status of
+    the user. The summary is None if it isn't cached or was cached before the tour progress of the user changed.
+    :rtype: tuple
+    """
+    version_key = get_progress_version_key(user_id)
+    key = get_progress_summary_key(tour_id, user_id)
+    values = get_cache().get_many([version_key, key])
+    if version_key not in values:
+        return get_versions([version_key])[version_key], None
+    cached_version, summary = values.get(key, (None, None))
+    return values[version_key], summary if cached_version == values[version_key] else None
+
+
+def set_progress_summary(tour_id, user_id, version, summary, timeout):
+    """
+    Caches the progress summary saved to the tour status of the user for the version returned by
+    `get_progress_summary`
+    """
+    get_cache().set(get_progress_summary_key(tour_id, user_id), (version, summary), timeout)
@@ -0,0 +1,191 @@
+"""
+Tours declared in code or in JSON or YAML files and synced to the database. A definition is a dict with the fields
+of a tour and its steps, where each step can contain its own child steps:
+
+    {
+        'name': 'example_tour',
+        'display_name': 'Example Tour',
+        'tour_class': 'path.to.ExampleTour',
+        'complete_url': '/finished/',
+        'steps': [
+            {'name': 'first_step', 'display_name': 'First Step', 'step_class': 'path.to.FirstStep', 'url': '/first/',
+             'steps': [...]},
+        ],
+    }
+
+The steps are sorted in the order they are declared. Tours and steps are matched to the database by name.
+"""
+import json
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+
+from tour.cache import invalidate_definitions
+from tour.models import Step, Tour
+
+# The fields of the definitions that are synced besides the name
+TOUR_FIELDS = ('display_name', 'tour_class', 'complete_url')
+STEP_FIELDS = ('display_name', 'url', 'step_class', 'tour_id', 'sort_order')
+
+
+def load_definitions(path):
+    """
+    Reads a list of tour definitions from a JSON file, or a YAML file if the path ends with .yaml or .yml, which
+    requires PyYAML
+    :rtype: list
+    :raises ImproperlyConfigured: If the file doesn't contain a list of definitions
+    """
+    with open(path) as definition_file:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ImproperlyConfigured('PyYAML is required to load tour definitions from {0}'.format(path))
+            definitions = yaml.safe_load(definition_file)
+        else:
+            definitions = json.load(definition_file)
+    if not isinstance(definitions, list) or not all(isinstance(definition, dict) for definition in definitions):
+        raise ImproperlyConfigured('{0} must contain a list of tour definitions'.format(path))
+    return definitions
+
+
+def get_values(definition, required_fields, fields, kind):
+    """
+    Returns the values of the fields in the definition. Missing optional fields are None.
+    :raises ImproperlyConfigured: If the definition isn't a dict or a required field is missing
+    """
+    if not isinstance(definition, dict):
+        raise ImproperlyConfigured('{0} definitions must be dicts: {1}'.format(kind, definition))
+    for field in required_fields:
+        if not definition.get(field):
+            raise ImproperlyConfigured('{0} definitions require a {1}: {2}'.format(kind, field, definition))
+    return dict((field, definition.get(field)) for field in fields)
+
+
+def get_step_values(step_definitions, parent_name=None, values=None):
+    """
+    Flattens the nested step definitions of a tour in order
+    :return: A list of tuples of each step name, the name of its parent step and the values of its fields
+    :rtype: list
+    """
+    values = [] if values is None else values
+    for step_definition in step_definitions:
+        step_values = get_values(step_definition, ('name', 'display_name', 'step_class'), STEP_FIELDS, 'Step')
+        values.append((step_definition['name'], parent_name, step_values))
+        get_step_values(step_definition.get('steps', []), step_definition['name'], values)
+    return values
+
+
+def sync_objects(model, values_by_name, fields):
+    """
+    Inserts the objects that don't exist and updates the objects whose fields changed with one query each
+    :param values_by_name: A dict of the names of the objects to the values of their fields
+    :return: A dict of the names to the saved objects, the names of the created objects and the names of the
+        updated objects
+    :rtype: tuple
+    """
+    objects = dict((obj.name, obj) for obj in model.objects.filter(name__in=list(values_by_name)))
+    new_objects = [
+        model(name=name, **values) for name, values in values_by_name.items() if name not in objects
+    ]
+    changed_objects = []
+    for name, obj in objects.items():
+        values = values_by_name[name]
+        if any(getattr(obj, field) != values[field] for field in fields):
+            for field in fields:
+                setattr(obj, field, values[field])
+            changed_objects.append(obj)
+
+    if new_objects:
+        model.objects.bulk_create(new_objects)
+        objects.update(
+            (obj.name, obj) for obj in model.objects.filter(name__in=[obj.name for obj in new_objects]))
+    if changed_objects:
+        model.objects.bulk_update(changed_objects, list(fields))
+    return objects, set(obj.name for obj in new_objects), set(obj.name for obj in changed_objects)
+
+
+def get_definition_values(definitions):
+    """
+    Returns the values of the tours and steps in the definitions. The steps are sorted in the order they are
+    declared and their `tour_id` is the name of their tour.
+    :return: A dict of tour names to values, a dict of step names to values and a dict of step names to the names
+        of their parent steps
+    :rtype: tuple
+    :raises ImproperlyConfigured: If a definition is invalid
+    """
+    tour_values = {}
+    step_values = {}
+    parent_names = {}
+    sort_order = 0
+    for definition in definitions:
+        values = get_values(definition, ('name', 'display_name', 'tour_class'), TOUR_FIELDS, 'Tour')
+        if definition['name'] in tour_values:
+            raise ImproperlyConfigured('Tour {0} is defined more than once'.format(definition['name']))
+        tour_values[definition['name']] = values
+        for name, parent_name, values in get_step_values(definition.get('steps', [])):
+            if name in step_values:
+                raise ImproperlyConfigured('Step {0} is defined more than once'.format(name))
+            values.update(tour_id=definition['name'], sort_order=sort_order)
+            step_values[name] = values
+            parent_names[name] = parent_name
+            sort_order += 1
+    return tour_values, step_values, parent_names
+
+
+def sync_parent_steps(steps, parent_names):
+    """
+    Sets the parents of the steps once every step has an id
+    :return: The names of the steps whose parent changed
+    :rtype: set
+    """
+    moved_steps = []
+    for name, step in steps.items():
+        parent_step_id = steps[parent_names[name]].id if parent_names[name] else None
+        if step.parent_step_id != parent_step_id:
+            step.parent_step_id = parent_step_id
+            moved_steps.append(step)
+    if moved_steps:
+        Step.objects.bulk_update(moved_steps, ['parent_step_id'])
+    return set(step.name for step in moved_steps)
+
+
+@transaction.atomic
+def sync_tours(definitions, delete_steps=False):
+    """
+    Makes the tours and steps in the database match the definitions with a few bulk queries, only writing the rows
+    that changed. Tours that aren't in the definitions are left alone.
+    :param definitions: A list of tour definitions
+    :param delete_steps: Delete the steps of the synced tours that are no longer in the definitions
+    :return: A dict with the number of tours `created` and `updated` and the number of steps `created`, `updated`
+        and `deleted`
+    :rtype: dict
+    :raises ImproperlyConfigured: If a definition is invalid
+    """
+    tour_values, step_values, parent_names = get_definition_values(definitions)
+    tours, created_tours, updated_tours = sync_objects(Tour, tour_values, TOUR_FIELDS)
+    for values in step_values.values():
+        values['tour_id'] = tours[values['tour_id']].id
+    steps, created_steps, updated_steps = sync_objects(Step, step_values, STEP_FIELDS)
+    updated_steps.update(sync_parent_steps(steps, parent_names))
+
+    num_deleted_steps = 0
+    if delete_steps:
+        deleted_steps = Step.objects.filter(tour_id__in=[tour.id for tour in tours.values()]).exclude(
+            name__in=list(steps))
+        num_deleted_steps = deleted_steps.count()
+        if num_deleted_steps:
+            deleted_steps.delete()
+
+    counts = {
+        'tours': {'created': len(created_tours), 'updated': len(updated_tours)},
+        'steps': {
+            'created': len(created_steps),
+            'updated': len(updated_steps - created_steps),
+            'deleted': num_deleted_steps,
+        },
+    }
+    # Bulk queries don't send the signals that invalidate the cached tour definitions
+    if any(counts['tours'].values()) or any(counts['steps'].values()):
+        invalidate_definitions()
+    return counts
@@ -0,0 +1,88 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from django.conf import settings
+from django.db import close_old_connections
+
+_step_check_executor = None
+
+
+def call_and_close(func, *args, **kwargs):
+    """
+    Calls the function and then closes the database connection of the thread if it can't be used anymore, which
+    is what django does at the end of each request
+    """
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+class DatabaseThreadPoolExecutor(ThreadPoolExecutor):
+    """
+    Thread pool for database work that closes broken or expired connections of its threads after each call
+    """
+    def submit(self, fn, *args, **kwargs):
+        return super(DatabaseThreadPoolExecutor, self).submit(call_and_close, fn, *args, **kwargs)
+
+
+def get_step_check_executor():
+    """
+    Returns the thread pool used to check the completion of steps in parallel, sized with the
+    TOUR_STEP_CHECK_WORKERS setting
+    """
+    global _step_check_executor
+    if _step_check_executor is None:
+        _step_check_executor = DatabaseThreadPoolExecutor(
+            max_workers=getattr(settings, 'TOUR_STEP_CHECK_WORKERS', 4))
+    return _step_check_executor
+
+
+class TimedCall(object):
+    """
+    Calls a function and records when the call started, so a timeout can count from when the call runs instead of
+    when it was submitted and waited for a free thread
+    """
+    def __init__(self, func):
+        self.func = func
+        self.started = threading.Event()
+        self.start_time = None
+
+    def __call__(self, *args, **kwargs):
+        self.start_time = time.time()
+        self.started.set()
+        return self.func(*args, **kwargs)
+
+    def result(self, future, timeout):
+        """
+        Returns the result of the future of the call, waiting at most `timeout` seconds after the call started
+        :raises TimeoutError: If the call took longer than the timeout
+        """
+        if timeout is None:
+            return future.result()
+        self.started.wait()
+        return future.result(max(self.start_time + timeout - time.time(), 0))
+
+
+def iter_step_completion(user, steps, timeout=None):
+    """
+    Checks the completion of all steps at once on the thread pool and yields a tuple of each step and whether it
+    is complete, in the order of the steps. Checks that haven't started when the caller stops iterating are
+    cancelled. Checks that already started can't be interrupted, so they keep their thread until they return.
+    :param timeout: The number of seconds each check can run before the step is considered incomplete. Checks
+        waiting for a free thread don't use up their timeout.
+    """
+    executor = get_step_check_executor()
+    calls = [TimedCall(step.load_step_class().check_complete) for step in steps]
+    futures = [executor.submit(call, user) for call in calls]
+    try:
+        for step, call, future in zip(steps, calls, futures):
+            try:
+                complete = call.result(future, timeout)
+            except TimeoutError:
+                complete = False
+            yield step, complete
+    finally:
+        for future in futures:
+            future.cancel()
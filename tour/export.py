@@ -0,0 +1,160 @@
+"""
+Exports the tour statuses and step statuses of users as CSV or JSON Lines for analytics. The rows are read in
+chunks ordered by id, so any number of rows is exported with constant memory.
+"""
+from collections import defaultdict
+import csv
+import datetime
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+
+from tour.models import StepStatus, Tour, TourStatus
+
+# The columns of each export and the field lookups of their values. The current step of the tour statuses has no
+# lookup because it is evaluated while exporting.
+EXPORTS = {
+    'tours': (TourStatus, 'tour__name', (
+        ('id', 'id'),
+        ('tour', 'tour__name'),
+        ('user_id', 'user_id'),
+        ('complete', 'complete'),
+        ('create_time', 'create_time'),
+        ('complete_time', 'complete_time'),
+        ('current_step', None),
+        ('num_complete_steps', 'num_complete_steps'),
+        ('num_steps', 'num_steps'),
+        ('evaluate_time', 'evaluate_time'),
+    )),
+    'steps': (StepStatus, 'step__tour__name', (
+        ('id', 'id'),
+        ('tour', 'step__tour__name'),
+        ('step', 'step__name'),
+        ('user_id', 'user_id'),
+        ('complete', 'complete'),
+        ('create_time', 'create_time'),
+        ('complete_time', 'complete_time'),
+    )),
+}
+EXPORT_FORMATS = ('csv', 'jsonl')
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def iter_chunks(queryset, chunk_size=1000):
+    """
+    Yields lists of the rows of a values_list queryset that starts with the id, selecting `chunk_size` rows per
+    query after the id of the last row. Unlike `QuerySet.iterator`, which fetches every row at once with most
+    database drivers, only one chunk is held in memory.
+    """
+    queryset = queryset.order_by('id')
+    chunk = list(queryset[:chunk_size])
+    while chunk:
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        chunk = list(queryset.filter(id__gt=chunk[-1][0])[:chunk_size])
+
+
+def iter_chunked(queryset, chunk_size=1000):
+    """
+    Yields the rows of a values_list queryset that starts with the id, one chunk at a time like `iter_chunks`
+    """
+    for chunk in iter_chunks(queryset, chunk_size):
+        for row in chunk:
+            yield row
+
+
+def get_current_steps(statuses, tour_classes):
+    """
+    Evaluates the current steps of the users of the incomplete tour statuses of a chunk, with one batch of
+    `iter_progress` per tour
+    :param statuses: Tuples of the tour name, user id and completion of each tour status
+    :param tour_classes: A dict of tour names to tour class instances, the missing tours are added to it
+    :return: A dict of tuples of the tour name and user id to the name of the current step
+    :rtype: dict
+    """
+    user_ids = set(user_id for tour_name, user_id, complete in statuses if not complete)
+    users = get_user_model().objects.in_bulk(list(user_ids)) if user_ids else {}
+    users_by_tour = defaultdict(list)
+    for tour_name, user_id, complete in statuses:
+        if not complete and user_id in users:
+            users_by_tour[tour_name].append(users[user_id])
+
+    missing_names = [tour_name for tour_name in users_by_tour if tour_name not in tour_classes]
+    if missing_names:
+        tour_classes.update(
+            (tour.name, tour.load_tour_class()) for tour in Tour.objects.filter(name__in=missing_names))
+    current_steps = {}
+    for tour_name, tour_users in users_by_tour.items():
+        for user, current_step, next_url in tour_classes[tour_name].iter_progress(tour_users, len(tour_users)):
+            current_steps[tour_name, user.pk] = current_step.name if current_step else None
+    return current_steps
+
+
+def iter_rows(kind, tour_names=None, chunk_size=1000):
+    """
+    Yields the values of every row of the export ordered by id. The current step of each incomplete tour status is
+    evaluated with the other statuses of its chunk, like `iter_progress` without using recorded progress.
+    :param kind: 'tours' for the tour statuses or 'steps' for the step statuses
+    :param tour_names: Only export the statuses of these tours if given
+    :rtype: generator
+    """
+    model, tour_lookup, columns = EXPORTS[kind]
+    queryset = model.objects.all()
+    if tour_names:
+        queryset = queryset.filter(**{'{0}__in'.format(tour_lookup): list(tour_names)})
+    lookups = [lookup for name, lookup in columns if lookup]
+    chunks = iter_chunks(queryset.values_list(*lookups), chunk_size)
+    if kind == 'steps':
+        return (row for chunk in chunks for row in chunk)
+    return iter_tour_rows(chunks, lookups, [name for name, lookup in columns].index('current_step'))
+
+
+def iter_tour_rows(chunks, lookups, current_step_index):
+    """
+    Yields the rows of the tour statuses with the current step inserted at its column
+    """
+    tour_index, user_index, complete_index = [lookups.index(lookup) for lookup in ('tour__name', 'user_id', 'complete')]
+    tour_classes = {}
+    for chunk in chunks:
+        current_steps = get_current_steps(
+            [(row[tour_index], row[user_index], row[complete_index]) for row in chunk], tour_classes)
+        for row in chunk:
+            current_step = current_steps.get((row[tour_index], row[user_index]))
+            yield row[:current_step_index] + (current_step,) + row[current_step_index:]
+
+
+class Echo(object):
+    """
+    File-like object that returns what is written instead of storing it, so csv writers can format single rows
+    """
+    def write(self, value):
+        return value
+
+
+def format_csv_value(value):
+    return value.isoformat() if isinstance(value, datetime.datetime) else value
+
+
+def iter_export(kind, export_format, tour_names=None, chunk_size=1000):
+    """
+    Yields the lines of the export, starting with a header for CSV
+    :param kind: 'tours' for the tour statuses or 'steps' for the step statuses
+    :param export_format: 'csv' or 'jsonl'
+    :param tour_names: Only export the statuses of these tours if given
+    :rtype: generator
+    """
+    names = [name for name, lookup in EXPORTS[kind][2]]
+    rows = iter_rows(kind, tour_names, chunk_size)
+    if export_format == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(names)
+        for row in rows:
+            yield writer.writerow([format_csv_value(value) for value in row])
+    else:
+        for row in rows:
+            yield json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder, sort_keys=True) + '\n'
@@ -0,0 +1,122 @@
+"""
+Measures the duration and number of queries of the tour code that runs during requests, such as finding the
+current step, each step completion check, serializing tours and rendering the navigation. Measurements are sent
+to the backends in the TOUR_METRICS_BACKENDS setting and with the tour_metric signal. When there are no backends
+and no signal receivers, the measured code runs without any overhead besides that check.
+"""
+from collections import namedtuple
+from contextlib import contextmanager
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.dispatch import receiver
+from django.test.utils import CaptureQueriesContext
+
+try:
+    from django.core.signals import setting_changed
+except ImportError:  # pragma: no cover
+    # Django 1.7
+    from django.test.signals import setting_changed
+
+from tour.registry import load_class
+from tour.signals import tour_metric
+
+# The name of the measured code, its duration in seconds, the number of queries it made and a dict of details
+# such as the name of the tour or step
+Metric = namedtuple('Metric', ['name', 'duration', 'num_queries', 'tags'])
+
+_backends = None
+
+
+class MetricsBackend(object):
+    """
+    Base class of metrics backends, which are configured with dotted paths in the TOUR_METRICS_BACKENDS setting
+    """
+    def record(self, metric):
+        """
+        Records the measurement of some tour code
+        :type metric: Metric
+        """
+        raise NotImplementedError
+
+
+class MemoryCollector(MetricsBackend):
+    """
+    Keeps the metrics in memory, which is mostly useful in tests
+    """
+    def __init__(self):
+        self.metrics = []
+
+    def record(self, metric):
+        self.metrics.append(metric)
+
+    def get_metrics(self, name):
+        """
+        Returns the collected metrics with the name
+        """
+        return [metric for metric in self.metrics if metric.name == name]
+
+    def receive(self, sender, metric, **kwargs):
+        self.record(metric)
+
+
+def get_backends():
+    """
+    Returns instances of the backends configured in the TOUR_METRICS_BACKENDS setting
+    """
+    global _backends
+    if _backends is None:
+        _backends = [load_class(path)() for path in getattr(settings, 'TOUR_METRICS_BACKENDS', ())]
+    return _backends
+
+
+@receiver(setting_changed)
+def reset_backends(setting, **kwargs):
+    """
+    Loads the backends again when the setting changes in tests
+    """
+    global _backends
+    if setting == 'TOUR_METRICS_BACKENDS':
+        _backends = None
+
+
+def is_enabled():
+    """
+    Returns whether there is anything receiving the metrics
+    """
+    return bool(get_backends()) or tour_metric.has_listeners()
+
+
+@contextmanager
+def instrument(name, **tags):
+    """
+    Measures the duration and queries of the code in the block and sends the metric if instrumentation is enabled
+    """
+    if not is_enabled():
+        yield
+        return
+
+    queries = CaptureQueriesContext(connection)
+    start = time.time()
+    try:
+        with queries:
+            yield
+    finally:
+        metric = Metric(name, time.time() - start, len(queries), tags)
+        for backend in get_backends():
+            backend.record(metric)
+        tour_metric.send(sender=None, metric=metric)
+
+
+@contextmanager
+def collect_metrics():
+    """
+    Collects the metrics sent while in the block in a MemoryCollector
+    """
+    collector = MemoryCollector()
+    tour_metric.connect(collector.receive)
+    try:
+        yield collector
+    finally:
+        tour_metric.disconnect(collector.receive)
@@ -0,0 +1,54 @@
+from optparse import make_option
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tour.models import Tour
+
+
+class Command(BaseCommand):
+    """
+    Enrolls users in a tour from a file or stdin containing one user id per line
+    """
+    args = '<tour_name> [<file>]'
+    help = 'Adds the user ids listed one per line in a file, or stdin if no file is given, to a tour'
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--batch-size', action='store', dest='batch_size', type='int', default=1000,
+            help='The number of users inserted per query'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) not in (1, 2):
+            raise CommandError('Usage: add_tour_users {0}'.format(self.args))
+        tour_name = args[0]
+        path = args[1] if len(args) == 2 else '-'
+
+        tour = Tour.objects.filter(name=tour_name).first()
+        if tour is None:
+            raise CommandError('Tour {0} does not exist'.format(tour_name))
+
+        if path == '-':
+            counts = self.add_users(tour, sys.stdin, options['batch_size'])
+        else:
+            with open(path) as user_id_file:
+                counts = self.add_users(tour, user_id_file, options['batch_size'])
+        self.stdout.write('Added {0} users, skipped {1} users'.format(counts['added'], counts['skipped']))
+
+    def add_users(self, tour, lines, batch_size):
+        """
+        Streams the user ids from the lines into the tour
+        """
+        return tour.load_tour_class().add_users(self.get_user_ids(lines), batch_size=batch_size)
+
+    def get_user_ids(self, lines):
+        """
+        Generates the user ids from the lines, skipping blank lines
+        """
+        for line in lines:
+            line = line.strip()
+            if line:
+                try:
+                    yield int(line)
+                except ValueError:
+                    raise CommandError('Invalid user id {0}'.format(line))
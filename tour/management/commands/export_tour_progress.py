@@ -0,0 +1,51 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tour.export import EXPORT_FORMATS, iter_export
+
+
+class Command(BaseCommand):
+    """
+    Exports the tour statuses or step statuses of users for analytics
+    """
+    help = (
+        'Writes the enrollment, completion times and current step of every user of every tour, or the progress of '
+        'every step with --steps, as CSV or JSON Lines')
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--format', action='store', dest='export_format', default='csv',
+            help='The output format, csv or jsonl'),
+        make_option(
+            '--steps', action='store_true', dest='steps', default=False,
+            help='Export the progress of each step instead of each tour'),
+        make_option(
+            '--tour', action='append', dest='tour_names', default=[],
+            help='Only export the statuses of the named tour. Can be given more than once.'),
+        make_option(
+            '--output', action='store', dest='output', default=None,
+            help='The file to write, stdout if not given'),
+        make_option(
+            '--chunk-size', action='store', dest='chunk_size', type='int', default=1000,
+            help='The number of rows selected per query'),
+    )
+
+    def handle(self, *args, **options):
+        if args:
+            raise CommandError('export_tour_progress takes no arguments')
+        if options['export_format'] not in EXPORT_FORMATS:
+            raise CommandError('Invalid format {0}, expected one of {1}'.format(
+                options['export_format'], ', '.join(EXPORT_FORMATS)))
+        if options['chunk_size'] < 1:
+            raise CommandError('The chunk size must be at least 1')
+
+        lines = iter_export(
+            'steps' if options['steps'] else 'tours', options['export_format'], options['tour_names'],
+            options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                for line in lines:
+                    output_file.write(line)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
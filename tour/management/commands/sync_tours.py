@@ -0,0 +1,38 @@
+from optparse import make_option
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from tour.definitions import load_definitions, sync_tours
+
+
+class Command(BaseCommand):
+    """
+    Syncs the tours and steps in the database with tour definitions
+    """
+    args = '[<file> ...]'
+    help = (
+        'Creates and updates the tours and steps declared in JSON or YAML files, or in the TOUR_DEFINITIONS setting '
+        'if no file is given')
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--delete-steps', action='store_true', dest='delete_steps', default=False,
+            help='Delete the steps of the synced tours that are no longer declared'),
+    )
+
+    def handle(self, *args, **options):
+        try:
+            if args:
+                definitions = []
+                for path in args:
+                    definitions.extend(load_definitions(path))
+            else:
+                definitions = getattr(settings, 'TOUR_DEFINITIONS', [])
+            counts = sync_tours(definitions, delete_steps=options['delete_steps'])
+        except (IOError, ValueError, ImproperlyConfigured) as error:
+            raise CommandError(str(error))
+        self.stdout.write(
+            'Tours: {0} created, {1} updated. Steps: {2} created, {3} updated, {4} deleted'.format(
+                counts['tours']['created'], counts['tours']['updated'], counts['steps']['created'],
+                counts['steps']['updated'], counts['steps']['deleted']))
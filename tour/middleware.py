@@ -0,0 +1,49 @@
+from tour.cache import get_url_index, has_no_tour, set_no_tour, set_url_index
+from tour.models import Step
+from tour.state import get_tour_state
+from tour.tours import UrlIndex
+from tour.views import TourStepMixin
+
+
+def get_all_steps_url_index(timeout=3600):
+    """
+    Returns a url index of the steps of every tour, which tells whether a request can be part of any tour. The
+    index is kept in the django cache until any tour or step changes.
+    :rtype: UrlIndex
+    """
+    version, cached_index = get_url_index('all')
+    if cached_index is not None:
+        return UrlIndex(*cached_index)
+    url_index = UrlIndex.build(Step.objects.order_by('tour_id', 'sort_order'))
+    set_url_index('all', version, (url_index.paths, url_index.names), timeout)
+    return url_index
+
+
+class TourMiddleware(object):
+    """
+    Applies the redirects of `TourStepMixin` to every view without adding the mixin to the views. Requests for
+    urls that don't belong to any step and requests of users that don't have a tour are skipped using only the
+    django cache, so they don't make any database queries.
+    """
+    # The number of seconds a user is remembered as not having any tour
+    no_tour_timeout = 300
+    # The number of seconds the url index of all steps is cached
+    url_index_timeout = 3600
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        user = getattr(request, 'user', None)
+        if user is None or not user.pk:
+            return None
+        if get_all_steps_url_index(self.url_index_timeout).get_request_position(request) < 0:
+            return None
+        if has_no_tour(user):
+            return None
+
+        if get_tour_state(request).tour is None:
+            set_no_tour(user, self.no_tour_timeout)
+            return None
+
+        # Use the same redirect logic as views with the mixin
+        view = TourStepMixin()
+        view.request = request
+        return view.get_tour_response(request)
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.conf import settings
+
+
+def remove_duplicate_statuses(apps, schema_editor):
+    """
+    Removes duplicate incomplete statuses for the same tour and user, keeping the oldest one, so the unique
+    index can be created
+    """
+    TourStatus = apps.get_model('tour', 'TourStatus')
+    duplicates = TourStatus.objects.filter(complete=False).values('tour_id', 'user_id').annotate(
+        num_statuses=models.Count('id'), first_id=models.Min('id')).filter(num_statuses__gt=1)
+    for duplicate in duplicates:
+        TourStatus.objects.filter(
+            tour_id=duplicate['tour_id'], user_id=duplicate['user_id'], complete=False
+        ).exclude(id=duplicate['first_id']).delete()
+
+
+class VendorRunSQL(migrations.RunSQL):
+    """
+    Runs a single sql statement only on the database vendors that support it. Partial indexes are not supported by
+    MySQL and Oracle, which keep relying on the tour code to avoid duplicate incomplete statuses. The statement is
+    executed as is, so sqlparse isn't needed to split it.
+    """
+    def __init__(self, vendors, *args, **kwargs):
+        self.vendors = vendors
+        super(VendorRunSQL, self).__init__(*args, **kwargs)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor in self.vendors:
+            schema_editor.execute(self.sql)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor in self.vendors:
+            schema_editor.execute(self.reverse_sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tour', '0002_stepstatus'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='tourstatus',
+            index_together=set([('user', 'complete', 'complete_time')]),
+        ),
+        migrations.RunPython(remove_duplicate_statuses, lambda apps, schema_editor: None),
+        # Only allows one incomplete status per tour and user. SQLite drops the index when later migrations copy the
+        # table, so it may not exist when migrating backwards.
+        VendorRunSQL(
+            ('postgresql', 'sqlite'),
+            'CREATE UNIQUE INDEX tour_tourstatus_incomplete_uniq ON tour_tourstatus (tour_id, user_id) '
+            'WHERE NOT complete',
+            'DROP INDEX IF EXISTS tour_tourstatus_incomplete_uniq',
+        ),
+    ]
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.db.models.deletion
+
+
+def recreate_incomplete_unique_index(apps, schema_editor):
+    """
+    SQLite copies the table to add columns, which drops the partial unique index of the incomplete statuses
+    """
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE UNIQUE INDEX IF NOT EXISTS tour_tourstatus_incomplete_uniq ON tour_tourstatus (tour_id, user_id) '
+            'WHERE NOT complete')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tour', '0003_tourstatus_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tourstatus',
+            name='current_step',
+            field=models.ForeignKey(
+                blank=True, null=True, default=None, related_name='+', on_delete=django.db.models.deletion.SET_NULL,
+                to='tour.Step'),
+        ),
+        migrations.AddField(
+            model_name='tourstatus',
+            name='evaluate_time',
+            field=models.DateTimeField(blank=True, null=True, default=None),
+        ),
+        migrations.AddField(
+            model_name='tourstatus',
+            name='num_complete_steps',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tourstatus',
+            name='num_steps',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterIndexTogether(
+            name='tourstatus',
+            index_together=set([('tour', 'complete', 'num_complete_steps'), ('user', 'complete', 'complete_time')]),
+        ),
+        migrations.RunPython(recreate_incomplete_unique_index, lambda apps, schema_editor: None),
+    ]
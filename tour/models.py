@@ -1,25 +1,60 @@
+import datetime
+
 from django.conf import settings
 from django.db import models
-from django.utils.module_loading import import_by_path
 from manager_utils import ManagerUtilsManager
 import six
 
+from tour.instrumentation import instrument
+from tour.registry import load_class
+from tour.signals import tour_progress_changed
+
 
 class TourManager(ManagerUtilsManager):
     """
     Provides extra functionality for the Tour model
     """
-    def complete_tours(self, user):
+    def complete_tours(self, user, get_complete_tours=None):
+        """
+        Marks any completed tours as complete. The incomplete tours are loaded with one query, evaluated together
+        and all of the finished tour status records are flagged with a single update. Tours whose class overrides
+        `mark_complete` are marked with it instead so its side effects still run.
+        :param get_complete_tours: Optional callable that takes the incomplete tours of the user and returns the
+            ones that are complete. This allows evaluating the tours with values that were already loaded.
         """
-        Marks any completed tours as complete
+        from tour.state import TourState
+        from tour.tours import BaseTour
+        with instrument('complete_tours', user_id=user.pk):
+            if not user.pk:
+                return None
+            if get_complete_tours is None:
+                get_complete_tours = TourState(user).get_complete_tours
+            tour_statuses = list(TourStatus.objects.filter(user=user, complete=False).select_related('tour'))
+            complete_tour_ids = set()
+            for tour in get_complete_tours([tour_status.tour for tour_status in tour_statuses]):
+                tour_class = tour.load_tour_class()
+                if six.get_unbound_function(type(tour_class).mark_complete) is six.get_unbound_function(
+                        BaseTour.mark_complete):
+                    complete_tour_ids.add(tour.id)
+                else:
+                    tour_class.mark_complete(user)
+            complete_ids = [tour_status.id for tour_status in tour_statuses if tour_status.tour_id in complete_tour_ids]
+            if complete_ids:
+                TourStatus.objects.filter(id__in=complete_ids).update(
+                    complete=True, complete_time=datetime.datetime.utcnow())
+                tour_progress_changed.send(sender=TourStatus, user=user, user_ids=[user.pk])
+
+    def get_tour_status(self, user):
+        """
+        Returns the tour status of the active tour of the user, or of the most recently completed tour if there
+        isn't an active one, with its tour selected in the same query. Incomplete tours are ordered by tour like
+        `get_for_user`. The tours aren't evaluated, so call `complete_tours` first to flag any finished tours.
+        :rtype: TourStatus
         """
         if not user.pk:
             return None
-        tours = self.filter(tourstatus__user=user, tourstatus__complete=False)
-        for tour in tours:
-            tour_class = tour.load_tour_class()
-            if tour_class.is_complete(user):
-                tour_class.mark_complete(user)
+        return TourStatus.objects.filter(user=user).select_related('tour').order_by(
+            'complete', '-complete_time', 'tour_id').first()
 
     def get_for_user(self, user):
         """
@@ -28,13 +63,15 @@ class TourManager(ManagerUtilsManager):
         if not user.pk:
             return None
         self.complete_tours(user)
-        return self.filter(tourstatus__user=user, tourstatus__complete=False).first()
+        tour_status = self.get_tour_status(user)
+        return tour_status.tour if tour_status and not tour_status.complete else None
 
     def get_recent_tour(self, user):
-        if not user.pk:
-            return None
-        return self.filter(tourstatus__user=user).order_by(
-            'tourstatus__complete', '-tourstatus__complete_time').first()
+        """
+        Returns the active tour of the user or the most recently completed tour
+        """
+        tour_status = self.get_tour_status(user)
+        return tour_status.tour if tour_status else None
 
     def get_next_url(self, user):
         """
@@ -42,13 +79,47 @@ class TourManager(ManagerUtilsManager):
         """
         if not user.pk:
             return None
-        tour = self.get_for_user(user)
-        if not tour:
-            tour = self.get_recent_tour(user)
-        if tour:
-            return tour.load_tour_class().get_next_url(user)
+        self.complete_tours(user)
+        tour_status = self.get_tour_status(user)
+        if tour_status:
+            return tour_status.tour.load_tour_class().get_next_url(user)
         return None
 
+    def acomplete_tours(self, user):  # pragma: python3
+        """
+        Awaitable version of `complete_tours` for code running in an asyncio event loop
+        """
+        from tour.aio import run_in_executor
+        return run_in_executor(self.complete_tours, user)
+
+    def aget_tour_status(self, user):  # pragma: python3
+        """
+        Awaitable version of `get_tour_status`
+        """
+        from tour.aio import run_in_executor
+        return run_in_executor(self.get_tour_status, user)
+
+    def aget_for_user(self, user):  # pragma: python3
+        """
+        Awaitable version of `get_for_user`
+        """
+        from tour.aio import run_in_executor
+        return run_in_executor(self.get_for_user, user)
+
+    def aget_recent_tour(self, user):  # pragma: python3
+        """
+        Awaitable version of `get_recent_tour`
+        """
+        from tour.aio import run_in_executor
+        return run_in_executor(self.get_recent_tour, user)
+
+    def aget_next_url(self, user):  # pragma: python3
+        """
+        Awaitable version of `get_next_url`
+        """
+        from tour.aio import run_in_executor
+        return run_in_executor(self.get_next_url, user)
+
 
 @six.python_2_unicode_compatible
 class Tour(models.Model):
@@ -70,7 +141,7 @@ class Tour(models.Model):
         :return: The tour class instance determined by `tour_class`
         :rtype: BaseTour
         """
-        return import_by_path(self.tour_class)(self)
+        return load_class(self.tour_class, error_prefix='Tour {0}: '.format(self.name))(self)
 
     def __str__(self):
         return '{0}'.format(self.display_name)
@@ -96,7 +167,7 @@ class Step(models.Model):
         """
         Imports and returns the step class.
         """
-        return import_by_path(self.step_class)(self)
+        return load_class(self.step_class, error_prefix='Step {0}: '.format(self.name))(self)
 
     def __str__(self):
         return '{0}'.format(self.display_name)
@@ -105,12 +176,54 @@ class Step(models.Model):
 class TourStatus(models.Model):
     """
     This is the model that represents the relationship between a user and a tour. Keeps
-    track of whether the tour has been completed by a user.
+    track of whether the tour has been completed by a user. The database only allows one incomplete
+    status per tour and user with a partial unique index created in the migrations.
     """
     tour = models.ForeignKey(Tour)
     user = models.ForeignKey(settings.AUTH_USER_MODEL)
     complete = models.BooleanField(default=False)
     create_time = models.DateTimeField(auto_now_add=True)
     complete_time = models.DateTimeField(null=True, blank=True, default=None)
+    # A summary of the progress of the user that is saved whenever the current step is evaluated by tours that
+    # enable `persist_progress_summary`, so progress can be listed, filtered and sorted without evaluating steps
+    current_step = models.ForeignKey(
+        Step, null=True, blank=True, default=None, on_delete=models.SET_NULL, related_name='+')
+    num_complete_steps = models.IntegerField(default=0)
+    num_steps = models.IntegerField(default=0)
+    evaluate_time = models.DateTimeField(null=True, blank=True, default=None)
 
     objects = ManagerUtilsManager()
+
+    class Meta:
+        # Matches the lookups of the TourManager, which filter on the user and complete flag and order
+        # by the complete flag and complete time, and the progress listings of a tour
+        index_together = [('user', 'complete', 'complete_time'), ('tour', 'complete', 'num_complete_steps')]
+
+    @property
+    def percent_complete(self):
+        """
+        Returns the percentage of the steps of the tour the user completed according to the progress summary
+        :rtype: int
+        """
+        if self.complete:
+            return 100
+        if not self.num_steps:
+            return 0
+        return 100 * self.num_complete_steps // self.num_steps
+
+
+class StepStatus(models.Model):
+    """
+    Records the progress of a user through a step so the current step of a tour can be determined without
+    evaluating every step again. Only used by tours that enable `persist_step_progress`.
+    """
+    step = models.ForeignKey(Step)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL)
+    complete = models.BooleanField(default=False)
+    create_time = models.DateTimeField(auto_now_add=True)
+    complete_time = models.DateTimeField(null=True, blank=True, default=None)
+
+    objects = ManagerUtilsManager()
+
+    class Meta:
+        unique_together = ('user', 'step')
@@ -0,0 +1,44 @@
+from django.db import DatabaseError
+from django.utils.module_loading import import_by_path
+
+
+# Process wide mapping of dotted paths to the imported tour and step classes
+_classes = {}
+
+
+def load_class(class_path, error_prefix=''):
+    """
+    Imports and returns the class found at the dotted path. Each path is only imported once per process and
+    the class is reused for subsequent calls. Paths that fail to import are not cached.
+    :raises ImproperlyConfigured: If the path can not be imported
+    """
+    try:
+        return _classes[class_path]
+    except KeyError:
+        cls = import_by_path(class_path, error_prefix=error_prefix)
+        _classes[class_path] = cls
+        return cls
+
+
+def clear_classes():
+    """
+    Empties the registry so that the classes get imported again on the next load
+    """
+    _classes.clear()
+
+
+def preload_classes(class_paths=None):
+    """
+    Imports the classes ahead of time so the first request doesn't pay the import cost. When no paths are
+    given, the tour and step classes of every tour in the database are loaded.
+    """
+    if class_paths is None:
+        from tour.models import Step, Tour
+        try:
+            class_paths = list(Tour.objects.values_list('tour_class', flat=True))
+            class_paths.extend(Step.objects.values_list('step_class', flat=True))
+        except DatabaseError:
+            # The tables do not exist yet, such as before the migrations have been run
+            return
+    for class_path in class_paths:
+        load_class(class_path)
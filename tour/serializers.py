@@ -1,22 +1,41 @@
 from rest_framework import serializers
+from tour.instrumentation import instrument
 from tour.models import Tour, Step
+from tour.state import get_tour_state
 
 
 class TourSerializer(serializers.ModelSerializer):
+    """
+    Serializes a tour with its steps. If the context contains a `step_tree` the steps are read from it instead
+    of being queried for each tour.
+    """
     steps = serializers.SerializerMethodField()
 
     class Meta:
         model = Tour
         fields = ('name', 'display_name', 'complete_url', 'steps')
 
+    def to_representation(self, tour):
+        with instrument('serialize_tour', tour=tour.name):
+            return super(TourSerializer, self).to_representation(tour)
+
     def get_steps(self, tour):
+        step_tree = self.context.get('step_tree')
+        if step_tree is not None and tour.id in step_tree.tour_ids:
+            child_steps = step_tree.get_tour_steps(tour.id, depth=0)
+        else:
+            child_steps = tour.load_tour_class().get_steps(0)
         return [
             StepSerializer(child_step, context=self.context).data
-            for child_step in tour.load_tour_class().get_steps(0)
+            for child_step in child_steps
         ]
 
 
 class StepSerializer(serializers.ModelSerializer):
+    """
+    Serializes a step with its child steps. If the context contains a `step_tree` and a `step_completion` dict
+    of step ids to completion, they are used instead of querying and evaluating each step.
+    """
     steps = serializers.SerializerMethodField()
     complete = serializers.SerializerMethodField()
 
@@ -25,12 +44,20 @@ class StepSerializer(serializers.ModelSerializer):
         fields = ('name', 'display_name', 'url', 'sort_order', 'steps', 'complete')
 
     def get_steps(self, step):
+        step_tree = self.context.get('step_tree')
+        if step_tree is not None and step.tour_id in step_tree.tour_ids:
+            child_steps = step_tree.get_child_steps(step.id, depth=0)
+        else:
+            child_steps = step.load_step_class().get_steps(0)
         return [
             StepSerializer(child_step, context=self.context).data
-            for child_step in step.load_step_class().get_steps(0)
+            for child_step in child_steps
         ]
 
     def get_complete(self, step):
+        step_completion = self.context.get('step_completion', {})
+        if step.id in step_completion:
+            return step_completion[step.id]
         if 'request' in self.context:
-            return step.load_step_class().is_complete(self.context['request'].user)
+            return get_tour_state(self.context['request']).is_step_complete(step)
         return False
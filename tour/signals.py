@@ -0,0 +1,9 @@
+from django.dispatch import Signal
+
+
+# Sent whenever the tour progress of users changes, such as a tour being assigned or completed. The user is
+# None when the progress of many users changed at once, in which case only their ids are provided.
+tour_progress_changed = Signal(providing_args=['user', 'user_ids'])
+
+# Sent with a `metric` after instrumented tour code ran, when instrumentation is enabled. See tour.instrumentation.
+tour_metric = Signal(providing_args=['metric'])
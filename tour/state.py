@@ -0,0 +1,306 @@
+from django.dispatch import receiver
+from rest_framework.request import Request
+
+from tour.models import StepStatus, Tour
+from tour.signals import tour_progress_changed
+from tour.tours import get_step_tree, get_tour_snapshot
+
+
+def get_progress_version(user):
+    """
+    Returns a counter that is incremented on the user object every time the tour progress of the user changes
+    """
+    return getattr(user, '_tour_progress_version', 0)
+
+
+@receiver(tour_progress_changed)
+def increment_progress_version(sender, user, **kwargs):
+    """
+    Increments the progress counter of the user so any tour state computed for this user is recalculated
+    """
+    if user is not None:
+        user._tour_progress_version = get_progress_version(user) + 1
+
+
+class TourState(object):
+    """
+    Computes the tour information of a user once and shares it between everything that needs it during
+    a request, such as the view mixin, the navigation template tag and the api. Values are calculated lazily
+    and recalculated if the tour progress of the user changes or `invalidate` is called.
+    """
+    def __init__(self, user):
+        self.user = user
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Clears all computed values so they are calculated again on next access
+        """
+        self.version = get_progress_version(self.user)
+        self.values = {}
+
+    def check_version(self):
+        """
+        Invalidates the computed values if the tour progress of the user changed since they were computed
+        """
+        if self.version != get_progress_version(self.user):
+            self.invalidate()
+
+    def get_value(self, key, func):
+        """
+        Returns the memoized value for the key, calculating it with func if needed
+        """
+        self.check_version()
+        if key not in self.values:
+            self.values[key] = func()
+        return self.values[key]
+
+    def complete_tours(self):
+        """
+        Marks any completed tours of the user as complete. This only happens once for the state.
+        """
+        def complete_tours():
+            Tour.objects.complete_tours(self.user, get_complete_tours=self.get_complete_tours)
+            # Any changes were made by this state, so the computed values are still valid
+            self.version = get_progress_version(self.user)
+            return True
+        return self.get_value('complete_tours', complete_tours)
+
+    @property
+    def tour_status(self):
+        """
+        The tour status of the active tour of the user, or of the most recently completed tour if there isn't an
+        active one, loaded with its tour in one query
+        """
+        def get_tour_status():
+            if not self.user.pk:
+                return None
+            self.complete_tours()
+            return Tour.objects.get_tour_status(self.user)
+        return self.get_value('tour_status', get_tour_status)
+
+    @property
+    def active_tour(self):
+        """
+        The first incomplete tour of the user
+        """
+        tour_status = self.tour_status
+        return tour_status.tour if tour_status and not tour_status.complete else None
+
+    @property
+    def recent_tour(self):
+        """
+        The incomplete or most recently completed tour of the user
+        """
+        tour_status = self.tour_status
+        return tour_status.tour if tour_status else None
+
+    @property
+    def tour(self):
+        """
+        The active tour of the user or the most recent tour if there isn't an active one
+        """
+        return self.active_tour or self.recent_tour
+
+    @property
+    def tour_class(self):
+        return self.get_tour_class(self.tour) if self.tour else None
+
+    @property
+    def steps(self):
+        return self.get_steps(self.tour) if self.tour else []
+
+    @property
+    def current_step(self):
+        return self.get_current_step(self.tour) if self.tour else None
+
+    @property
+    def next_url(self):
+        return self.get_next_url(self.tour) if self.tour else None
+
+    def get_tour_class(self, tour):
+        """
+        Returns the tour class instance for the tour, which shares the step completion of the state
+        """
+        def get_tour_class():
+            tour_class = tour.load_tour_class()
+            tour_class.step_completion = self.get_value('step_completion', dict)
+            return tour_class
+        return self.get_value(('tour_class', tour.id), get_tour_class)
+
+    def get_steps(self, tour):
+        """
+        Returns the ordered steps of the tour
+        """
+        return self.get_value(('steps', tour.id), lambda: self.get_tour_class(tour).get_steps())
+
+    def get_step_tour(self, step):
+        """
+        Returns the tour of the step, reusing the tour instance if it was already loaded
+        """
+        tour_class = self.values.get(('tour_class', step.tour_id))
+        return tour_class.tour if tour_class else step.tour
+
+    def get_step_progress(self, tour):
+        """
+        Returns the recorded step progress of the user if the tour persists it, otherwise None
+        """
+        def get_step_progress():
+            tour_class = self.get_tour_class(tour)
+            if tour_class.persist_step_progress and self.user.pk:
+                tour_class.step_progress = tour_class.get_step_progress(self.user)
+            return tour_class.step_progress
+        return self.get_value(('step_progress', tour.id), get_step_progress)
+
+    def is_step_complete(self, step):
+        """
+        Returns whether the step is complete for the user
+        """
+        tour = self.get_step_tour(step)
+        step_progress = self.get_step_progress(tour)
+        if step_progress is not None:
+            # Finding the current step records the progress of every step before it
+            self.get_current_step(tour)
+            return step_progress.get(step.id, False)
+        return next(self.iter_step_completion(tour, [step]))[1]
+
+    def get_current_step(self, tour):
+        """
+        Returns the first incomplete step of the tour from the tour class, which reuses the step completion and
+        recorded step progress of the state
+        """
+        def get_current_step():
+            self.get_step_progress(tour)
+            current_step = self.get_tour_class(tour).get_current_step(self.user)
+            # Any progress recorded while finding the step was made by this state, so the computed values are still
+            # valid
+            self.version = get_progress_version(self.user)
+            return current_step
+        return self.get_value(('current_step', tour.id), get_current_step)
+
+    def get_progress_hint(self, tour):
+        """
+        Returns the tour definition version and the number of leading steps of the tour the user is known to have
+        completed
+        """
+        return self.get_value(
+            ('progress_hint', tour.id), lambda: self.get_tour_class(tour).get_progress_hint(self.user))
+
+    def iter_step_completion(self, tour, steps):
+        """
+        Yields a tuple of each step of a tour that doesn't persist step progress and whether it is complete. The
+        completion of each step is memoized in the step completion shared with the tour classes and the steps that
+        weren't checked yet are checked together by the tour class, which uses a thread pool for tours that enable
+        `parallel_step_checks`.
+        """
+        tour_class = self.get_tour_class(tour)
+        # Steps before the progress hint of monotonic tours are known to be complete
+        for step in self.get_steps(tour)[:self.get_progress_hint(tour)[1]]:
+            tour_class.step_completion.setdefault(step.id, True)
+        return tour_class.iter_step_completion(self.user, steps)
+
+    def is_tour_complete(self, tour):
+        """
+        Returns whether the tour is complete according to the tour class, which reuses the step completion and
+        recorded step progress of the state
+        """
+        def is_tour_complete():
+            self.get_step_progress(tour)
+            complete = self.get_tour_class(tour).is_complete(self.user)
+            # Any progress recorded while checking the tour was made by this state, so the computed values are still
+            # valid
+            self.version = get_progress_version(self.user)
+            return complete
+        return self.get_value(('tour_complete', tour.id), is_tour_complete)
+
+    def get_complete_tours(self, tours):
+        """
+        Returns the tours that have all steps complete, loading the steps of all of the tours together
+        """
+        self.prefetch_steps(tours)
+        return [tour for tour in tours if self.is_tour_complete(tour)]
+
+    def prefetch_steps(self, tours):
+        """
+        Loads the steps and recorded step progress of the tours with a fixed number of queries and shares them
+        with the tour classes
+        :return: The step tree containing the steps of the tours
+        :rtype: StepTree
+        """
+        step_tree = self.get_value('step_tree', get_tour_snapshot)
+        if not step_tree.tour_ids.issuperset(tour.id for tour in tours):
+            step_tree = self.values['step_tree'] = get_step_tree(step_tree.tour_ids.union(tour.id for tour in tours))
+        for tour in tours:
+            self.get_tour_class(tour).step_tree = step_tree
+
+        # Load the recorded progress of the tours that persist it
+        progress_keys = [
+            ('step_progress', tour.id) for tour in tours
+            if self.get_tour_class(tour).persist_step_progress and ('step_progress', tour.id) not in self.values
+        ]
+        if progress_keys and self.user.pk:
+            step_progress = dict((key, {}) for key in progress_keys)
+            for tour_id, step_id, complete in StepStatus.objects.filter(
+                    user=self.user, step__tour_id__in=[key[1] for key in progress_keys]).values_list(
+                    'step__tour_id', 'step_id', 'complete'):
+                step_progress[('step_progress', tour_id)][step_id] = complete
+            self.values.update(step_progress)
+            for tour in tours:
+                if ('step_progress', tour.id) in step_progress:
+                    self.get_tour_class(tour).step_progress = step_progress[('step_progress', tour.id)]
+        return step_tree
+
+    def get_serializer_context(self, tours):
+        """
+        Returns the serializer context for the tours with the step tree and the completion of every step, so the
+        tours can be serialized without going back to the database for each step
+        """
+        tours = list(tours)
+        step_tree = self.prefetch_steps(tours)
+        step_completion = {}
+        for tour in tours:
+            steps = step_tree.get_tour_steps(tour.id)
+            if self.get_step_progress(tour) is None:
+                # Check all of the steps together so tours can check them in parallel
+                for step, complete in self.iter_step_completion(tour, steps):
+                    step_completion[step.id] = complete
+            else:
+                for step in steps:
+                    step_completion[step.id] = self.is_step_complete(step)
+        return {
+            'step_tree': step_tree,
+            'step_completion': step_completion,
+        }
+
+    def get_next_url(self, tour):
+        """
+        Returns the url of the current step or the complete url of the tour if all steps are complete
+        """
+        current_step = self.get_current_step(tour)
+        return current_step.url if current_step else tour.complete_url
+
+    def get_url_index(self, tour):
+        """
+        Returns the url index of the steps of the tour
+        """
+        return self.get_value(('url_index', tour.id), lambda: self.get_tour_class(tour).get_url_index())
+
+    def get_url_list(self, tour):
+        """
+        Returns the urls of the steps of the tour
+        """
+        return [step.url for step in self.get_steps(tour) if step.url]
+
+
+def get_tour_state(request):
+    """
+    Returns the tour state attached to the request, creating it if the request doesn't have one for its user yet
+    """
+    if isinstance(request, Request):
+        # Share the state with the underlying django request
+        request = request._request
+    tour_state = getattr(request, 'tour_state', None)
+    if not isinstance(tour_state, TourState) or tour_state.user is not request.user:
+        tour_state = TourState(request.user)
+        request.tour_state = tour_state
+    return tour_state
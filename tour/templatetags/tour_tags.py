@@ -1,36 +1,75 @@
-from copy import deepcopy
-
 from django import template
+from django.conf import settings
+from django.dispatch import receiver
 from django.template.loader import get_template
 
-from tour.models import Tour
+try:
+    from django.core.signals import setting_changed
+except ImportError:  # pragma: no cover
+    # Django 1.7
+    from django.test.signals import setting_changed
+
+from tour.cache import get_cache, get_navigation_key
+from tour.instrumentation import instrument
 from tour.serializers import TourSerializer
+from tour.state import get_tour_state
 
 
 register = template.Library()
 
+# The settings that change which navigation template is loaded
+TEMPLATE_SETTINGS = ('DEBUG', 'TEMPLATES', 'TEMPLATE_DIRS', 'TEMPLATE_LOADERS', 'INSTALLED_APPS')
+
 
 class TourNavNode(template.Node):
+    """
+    Renders the navigation of the tour of the user. The rendered navigation can be cached per user and path by
+    setting TOUR_NAVIGATION_CACHE_TIMEOUT.
+    """
+    template_name = 'tour/tour_navigation.html'
+    # The loaded navigation template, shared by every node
+    tour_template = None
+
     def __init__(self, always_show=False):
         self.always_show = always_show
 
+    @classmethod
+    def get_template(cls):
+        """
+        Returns the navigation template, loading it the first time it is used. The template is loaded every time
+        when DEBUG is on so changes to it show up without restarting.
+        """
+        if settings.DEBUG:
+            return get_template(cls.template_name)
+        if cls.tour_template is None:
+            cls.tour_template = get_template(cls.template_name)
+        return cls.tour_template
+
     def get_tour(self, request):
         # Check for any tours
-        tour = Tour.objects.get_for_user(request.user)
+        tour_state = get_tour_state(request)
+        tour = tour_state.active_tour
 
         if not tour and self.always_show:
-            tour = Tour.objects.get_recent_tour(request.user)
-        if self.always_show:
-            mutable_get = deepcopy(request.GET)
-            mutable_get['always_show'] = True
-            request.GET = mutable_get
+            tour = tour_state.recent_tour
         return tour
 
+    def set_always_show(self, context):
+        """
+        Makes the always_show flag available to the navigation template as `tour_always_show` and to the rest of
+        the request as `request.tour_always_show`
+        """
+        context['tour_always_show'] = self.always_show
+        if self.always_show:
+            context['request'].tour_always_show = True
+
     def get_tour_dict(self, tour, context):
         if not tour:
             return None
 
-        tour_dict = TourSerializer(tour, context=context).data
+        serializer_context = {'request': context['request']}
+        serializer_context.update(get_tour_state(context['request']).get_serializer_context([tour]))
+        tour_dict = TourSerializer(tour, context=serializer_context).data
 
         # Set the step css classes
         previous_steps_complete = True
@@ -60,18 +99,39 @@ class TourNavNode(template.Node):
         return tour_dict
 
     def render(self, context):
-        if 'request' in context and hasattr(context['request'], 'user'):
-            # Make sure this isn't the anonymous user
-            if not context['request'].user.id:
-                return ''
-
-            tour = self.get_tour(context['request'])
-            context['tour'] = self.get_tour_dict(tour, context)
-
-            # Load the tour template and render it
-            tour_template = get_template('tour/tour_navigation.html')
-            return tour_template.render(context)
-        return ''
+        with instrument('tour_navigation', always_show=self.always_show):
+            if 'request' in context and hasattr(context['request'], 'user'):
+                # Make sure this isn't the anonymous user
+                if not context['request'].user.id:
+                    return ''
+
+                request = context['request']
+                cache_timeout = getattr(settings, 'TOUR_NAVIGATION_CACHE_TIMEOUT', None)
+                if cache_timeout:
+                    cache_key = get_navigation_key(request.user, request.path, self.always_show)
+                    cached = get_cache().get(cache_key)
+                    if cached is not None:
+                        self.set_always_show(context)
+                        context['tour'], rendered = cached
+                        return rendered
+
+                tour = self.get_tour(request)
+                self.set_always_show(context)
+                context['tour'] = self.get_tour_dict(tour, context)
+                rendered = self.get_template().render(context)
+                if cache_timeout:
+                    get_cache().set(cache_key, (context['tour'], rendered), cache_timeout)
+                return rendered
+            return ''
+
+
+@receiver(setting_changed)
+def reset_tour_template(setting, **kwargs):
+    """
+    Loads the navigation template again when the template settings change in tests
+    """
+    if setting in TEMPLATE_SETTINGS:
+        TourNavNode.tour_template = None
 
 
 @register.simple_tag(takes_context=True)
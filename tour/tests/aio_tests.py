@@ -0,0 +1,239 @@
+from unittest import skipIf
+
+from django.db import connection
+from mock import Mock, patch
+
+from tour.models import Tour
+from tour.tests.mocks import MockView
+from tour.tests.tour_tests import BaseTourTest
+
+try:
+    import asyncio
+    from concurrent.futures import Future
+    from tour.aio import DatabaseThreadPoolExecutor, get_executor, run_in_executor, then
+except ImportError:  # pragma: no cover
+    asyncio = None
+
+
+class InlineExecutor(object):
+    """
+    Runs the submitted functions in the calling thread so the test database transaction can be used
+    """
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as error:
+            future.set_exception(error)
+        return future
+
+
+@skipIf(asyncio is None, 'asyncio is not available')
+class AsyncTest(BaseTourTest):
+    """
+    Tests the awaitable versions of the tour api
+    """
+    def setUp(self):
+        super(AsyncTest, self).setUp()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        executor_patcher = patch('tour.aio.get_executor', return_value=InlineExecutor())
+        executor_patcher.start()
+        self.addCleanup(executor_patcher.stop)
+        self.tour1.steps.add(self.step1, self.step2, self.step3)
+
+    def tearDown(self):
+        super(AsyncTest, self).tearDown()
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def run_async(self, awaitable):
+        return self.loop.run_until_complete(awaitable)
+
+    @patch('tour.tests.mocks.MockStep2.is_complete', spec_set=True)
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_tour_manager(self, mock_step1_is_complete, mock_step2_is_complete):
+        """
+        Verifies the awaitable manager methods return the same values as the synchronous ones
+        :type mock_step1_is_complete: Mock
+        :type mock_step2_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = True
+        mock_step2_is_complete.return_value = False
+        self.assertIsNone(self.run_async(Tour.objects.aget_for_user(self.test_user)))
+        self.tour1.load_tour_class().add_user(self.test_user)
+        self.assertEqual(self.tour1, self.run_async(Tour.objects.aget_for_user(self.test_user)))
+        self.assertEqual(self.tour1, self.run_async(Tour.objects.aget_recent_tour(self.test_user)))
+        self.assertEqual(self.tour1, self.run_async(Tour.objects.aget_tour_status(self.test_user)).tour)
+        self.assertEqual('mock2', self.run_async(Tour.objects.aget_next_url(self.test_user)))
+
+        mock_step2_is_complete.return_value = True
+        self.run_async(Tour.objects.acomplete_tours(self.test_user))
+        self.assertTrue(self.tour1.tourstatus_set.get(user=self.test_user).complete)
+
+    @patch('tour.tests.mocks.MockStep2.is_complete', spec_set=True)
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_get_current_step(self, mock_step1_is_complete, mock_step2_is_complete):
+        """
+        Verifies the steps are checked concurrently and the first incomplete step is returned
+        :type mock_step1_is_complete: Mock
+        :type mock_step2_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = False
+        mock_step2_is_complete.return_value = False
+        tour_class = self.tour1.load_tour_class()
+        self.assertEqual([self.step1, self.step2, self.step3], self.run_async(tour_class.aget_steps()))
+        self.assertEqual(self.step1, self.run_async(tour_class.aget_current_step(self.test_user)))
+        self.assertEqual(1, mock_step2_is_complete.call_count)
+
+        mock_step1_is_complete.return_value = True
+        self.assertEqual(self.step2, self.run_async(tour_class.aget_current_step(self.test_user)))
+        self.assertEqual('mock2', self.run_async(tour_class.aget_next_url(self.test_user)))
+        self.assertFalse(self.run_async(tour_class.ais_complete(self.test_user)))
+
+        mock_step2_is_complete.return_value = True
+        self.assertIsNone(self.run_async(tour_class.aget_current_step(self.test_user)))
+        self.assertEqual('mock_complete1', self.run_async(tour_class.aget_next_url(self.test_user)))
+        self.assertTrue(self.run_async(tour_class.ais_complete(self.test_user)))
+
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_get_current_step_awaitable(self, mock_step1_is_complete):
+        """
+        Verifies steps can check their completion without the thread pool
+        :type mock_step1_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = True
+
+        def ais_complete(step_class, user=None):
+            future = asyncio.Future()
+            self.loop.call_soon(future.set_result, False)
+            return future
+
+        with patch('tour.tests.mocks.MockStep2.ais_complete', ais_complete):
+            current_step = self.run_async(self.tour1.load_tour_class().aget_current_step(self.test_user))
+        self.assertEqual(self.step2, current_step)
+
+    @patch('tour.tests.mocks.MockStep2.is_complete', spec_set=True)
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_get_current_step_error(self, mock_step1_is_complete, mock_step2_is_complete):
+        """
+        Verifies a failing check is only raised if every step before it is complete
+        :type mock_step1_is_complete: Mock
+        :type mock_step2_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = False
+        mock_step2_is_complete.side_effect = ValueError
+        tour_class = self.tour1.load_tour_class()
+        self.assertEqual(self.step1, self.run_async(tour_class.aget_current_step(self.test_user)))
+
+        mock_step1_is_complete.return_value = True
+        with self.assertRaises(ValueError):
+            self.run_async(tour_class.aget_current_step(self.test_user))
+
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_get_current_step_persisted(self, mock_step1_is_complete):
+        """
+        Verifies tours that persist progress record it
+        :type mock_step1_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = True
+        self.tour1.tour_class = 'tour.tests.mocks.MockPersistedTour'
+        self.tour1.save()
+        tour_class = self.tour1.load_tour_class()
+        self.assertIsNone(self.run_async(tour_class.aget_current_step(self.test_user)))
+        self.assertEqual(
+            {self.step1.id: True, self.step2.id: True, self.step3.id: True},
+            tour_class.get_step_progress(self.test_user))
+
+    @patch('tour.tests.mocks.MockStep2.is_complete', spec_set=True)
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_get_current_step_summary(self, mock_step1_is_complete, mock_step2_is_complete):
+        """
+        Verifies tours that persist a progress summary or have monotonic steps are evaluated with get_current_step
+        :type mock_step1_is_complete: Mock
+        :type mock_step2_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = True
+        mock_step2_is_complete.return_value = False
+        for tour_class_path in ('tour.tests.mocks.MockSummaryTour', 'tour.tests.mocks.MockMonotonicTour'):
+            self.tour1.tour_class = tour_class_path
+            self.tour1.save()
+            tour_class = self.tour1.load_tour_class()
+            with patch.object(tour_class, 'get_current_step', wraps=tour_class.get_current_step) as mock_get:
+                self.assertEqual(self.step2, self.run_async(tour_class.aget_current_step(self.test_user)))
+            mock_get.assert_called_once_with(self.test_user)
+
+    def test_database_error(self):
+        """
+        Verifies errors of the database work are raised when awaiting
+        """
+        with patch('tour.tests.mocks.MockTour.get_steps', side_effect=ValueError):
+            with self.assertRaises(ValueError):
+                self.run_async(self.tour1.load_tour_class().aget_current_step(self.test_user))
+
+    def test_then(self):
+        """
+        Verifies callbacks are chained and errors are passed on
+        """
+        future = asyncio.Future()
+        future.set_result(1)
+        self.assertEqual(2, self.run_async(then(future, lambda value: value + 1)))
+
+        future = asyncio.Future()
+        future.set_exception(ValueError())
+        with self.assertRaises(ValueError):
+            self.run_async(then(future, int))
+
+        future = asyncio.Future()
+        future.set_result(0)
+        with self.assertRaises(ZeroDivisionError):
+            self.run_async(then(future, lambda value: 1 / value))
+
+        failed = asyncio.Future()
+        failed.set_exception(ValueError())
+        with self.assertRaises(ValueError):
+            self.run_async(then(future, lambda value: failed))
+
+        # A cancelled result is left alone
+        chained = asyncio.Future()
+        result = then(future, lambda value: chained)
+        self.run_async(asyncio.sleep(0))
+        result.cancel()
+        chained.set_result(1)
+        self.run_async(asyncio.sleep(0))
+        self.assertTrue(result.cancelled())
+        result = then(future, int)
+        result.cancel()
+        self.run_async(asyncio.sleep(0))
+        self.assertTrue(result.cancelled())
+
+    def test_tour_response(self):
+        """
+        Verifies the view mixin response can be awaited
+        """
+        request = Mock(user=self.test_user, path='mock2', method='get', GET={})
+        self.assertIsNone(self.run_async(MockView(request=request).aget_tour_response(request)))
+
+
+@skipIf(asyncio is None, 'asyncio is not available')
+class ExecutorTest(BaseTourTest):
+    """
+    Tests the thread pool used for database work
+    """
+    def test_executor(self):
+        """
+        Verifies the executor is created once and runs functions in other threads
+        """
+        with patch('tour.aio._executor', None):
+            executor = get_executor()
+            self.assertIsInstance(executor, DatabaseThreadPoolExecutor)
+            self.assertIs(executor, get_executor())
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                self.assertEqual(3, loop.run_until_complete(run_in_executor(lambda a, b: a + b, 1, b=2)))
+            finally:
+                loop.close()
+                asyncio.set_event_loop(None)
+                executor.shutdown()
+        self.assertIsNotNone(connection.connection)
@@ -1,9 +1,15 @@
+import json
+
 from django.contrib.auth.models import User
 from django.test import TestCase
+from django.test.utils import override_settings
 from django_dynamic_fixture import G
-from mock import Mock
-from tour.models import Tour
-from tour.api import TourApiView
+from mock import Mock, patch
+from rest_framework.test import APIRequestFactory, force_authenticate
+from tour.cache import get_cache
+from tour.models import StepStatus, Tour
+from tour.api import TourApiView, TourExportApiView
+from tour.tests.tour_tests import BaseTourTest
 
 
 class TourApiViewTest(TestCase):
@@ -15,3 +21,205 @@ class TourApiViewTest(TestCase):
         view = TourApiView()
         view.request = Mock(user=G(User, id=1))
         self.assertEqual(Tour, view.get_queryset().model)
+
+
+class TourApiViewQueryTest(BaseTourTest):
+    """
+    Tests the number of queries needed to list the tours of a user
+    """
+    def get_response(self, num_queries, path='/api/tour/', **headers):
+        request = APIRequestFactory().get(path, **headers)
+        force_authenticate(request, user=self.test_user)
+        with self.assertNumQueries(num_queries):
+            response = TourApiView.as_view()(request)
+            response.render()
+        return response
+
+    @patch('tour.tours.BaseStep.is_complete', spec_set=True)
+    def test_fixed_number_of_queries(self, mock_is_complete):
+        """
+        Verifies that listing more tours with more steps doesn't take more queries
+        :type mock_is_complete: Mock
+        """
+        mock_is_complete.return_value = False
+        self.tour1.steps.add(self.step1, self.step3)
+        self.step1.steps.add(self.step3)
+        self.tour1.load_tour_class().add_user(self.test_user)
+
+        response = self.get_response(4)
+        self.assertEqual([tour['name'] for tour in response.data], ['tour1'])
+        self.assertEqual(len(response.data[0]['steps'][0]['steps']), 1)
+
+        tour3 = G(Tour, name='tour3', tour_class='tour.tours.BaseTour')
+        self.tour2.steps.add(self.step2, self.step4)
+        tour3.steps.add(self.step5)
+        self.tour2.load_tour_class().add_user(self.test_user)
+        tour3.load_tour_class().add_user(self.test_user)
+
+        response = self.get_response(4)
+        self.assertEqual(
+            sorted(tour['name'] for tour in response.data), ['tour1', 'tour2', 'tour3'])
+        self.assertFalse(any(step['complete'] for tour in response.data for step in tour['steps']))
+
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_get_serializer(self, mock_step1_is_complete):
+        """
+        Verifies that the steps and step completion are only added to the context when there are tours to serialize
+        :type mock_step1_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = True
+        self.tour1.steps.add(self.step1)
+        view = TourApiView(request=Mock(user=self.test_user, tour_state=None), format_kwarg=None, kwargs={})
+        self.assertFalse('step_tree' in view.get_serializer().context)
+
+        serializer = view.get_serializer(instance=self.tour1)
+        self.assertEqual({self.step1.id: True}, serializer.context['step_completion'])
+        self.assertTrue(serializer.data['steps'][0]['complete'])
+
+        serializer = view.get_serializer([self.tour1], many=True)
+        self.assertEqual({self.step1.id: True}, serializer.context['step_completion'])
+
+
+@override_settings(TOUR_API_CONDITIONAL_TIMEOUT=60)
+class TourApiViewConditionalTest(BaseTourTest):
+    """
+    Tests responding to polls of the api with 304 Not Modified when the tours of the user didn't change
+    """
+    def setUp(self):
+        super(TourApiViewConditionalTest, self).setUp()
+        self.tour1.steps.add(self.step1)
+        self.tour1.load_tour_class().add_user(self.test_user)
+
+    def tearDown(self):
+        super(TourApiViewConditionalTest, self).tearDown()
+        get_cache().clear()
+
+    def get_response(self, path='/api/tour/', **headers):
+        request = APIRequestFactory().get(path, **headers)
+        force_authenticate(request, user=self.test_user)
+        response = TourApiView.as_view()(request)
+        # Not modified responses have no content to render
+        if response.status_code == 200:
+            response.render()
+        return response
+
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_not_modified(self, mock_step1_is_complete):
+        """
+        Verifies that a matching ETag is answered with one query and without checking steps
+        :type mock_step1_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = False
+        response = self.get_response()
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(['tour1'], [tour['name'] for tour in response.data])
+        mock_step1_is_complete.reset_mock()
+
+        with self.assertNumQueries(1):
+            not_modified = self.get_response(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(304, not_modified.status_code)
+        self.assertEqual(response['ETag'], not_modified['ETag'])
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.assertFalse(mock_step1_is_complete.called)
+
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_modified(self, mock_step1_is_complete):
+        """
+        Verifies that the tours are listed again when the progress of the user, the tour definitions or the
+        requested filters change
+        :type mock_step1_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = False
+        etag = self.get_response()['ETag']
+
+        self.assertNotEqual(etag, self.get_response('/api/tour/?name=tour1')['ETag'])
+
+        self.tour2.load_tour_class().add_user(self.test_user)
+        response = self.get_response(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response['ETag'])
+        etag = response['ETag']
+
+        self.step1.display_name = 'Changed'
+        self.step1.save()
+        response = self.get_response(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('Changed', response.data[0]['steps'][0]['display_name'])
+
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    @patch('tour.cache.time.time', spec_set=True)
+    def test_timeout(self, mock_time, mock_step1_is_complete):
+        """
+        Verifies that the ETag changes once the time it was first seen expires
+        :type mock_time: Mock
+        :type mock_step1_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = False
+        mock_time.return_value = 1000
+        etag = self.get_response()['ETag']
+        self.assertEqual(etag, self.get_response()['ETag'])
+
+        get_cache().clear()
+        mock_time.return_value = 1100
+        response = self.get_response(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response['ETag'])
+
+    @override_settings(TOUR_API_CONDITIONAL_TIMEOUT=None)
+    def test_disabled(self):
+        """
+        Verifies that no ETag is sent when conditional responses are disabled
+        """
+        response = self.get_response()
+        self.assertEqual(200, response.status_code)
+        self.assertFalse(response.has_header('ETag'))
+
+
+class TourExportApiViewTest(BaseTourTest):
+    """
+    Tests streaming the tour progress of users to staff
+    """
+    def setUp(self):
+        super(TourExportApiViewTest, self).setUp()
+        self.tour1.load_tour_class().add_user(self.test_user)
+        self.tour2.load_tour_class().add_user(self.test_user2)
+        self.test_user.is_staff = True
+        self.test_user.save()
+
+    def get_response(self, user, path='/api/tour/export/'):
+        request = APIRequestFactory().get(path)
+        force_authenticate(request, user=user)
+        return TourExportApiView.as_view()(request)
+
+    def test_csv(self):
+        """
+        Verifies that the tour statuses are streamed as CSV by default
+        """
+        response = self.get_response(self.test_user)
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.streaming)
+        self.assertEqual('text/csv', response['Content-Type'])
+        self.assertEqual('attachment; filename="tour_tours.csv"', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(3, len(lines))
+        self.assertTrue(lines[0].startswith('id,tour,user_id'))
+
+    def test_jsonl(self):
+        """
+        Verifies that the step statuses of some tours are streamed as JSON Lines
+        """
+        self.tour2.steps.add(self.step3)
+        G(StepStatus, step=self.step3, user=self.test_user2, complete=False)
+        response = self.get_response(self.test_user, '/api/tour/export/?output=jsonl&steps=1&tour=tour2')
+        self.assertEqual('application/x-ndjson', response['Content-Type'])
+        self.assertEqual('attachment; filename="tour_steps.jsonl"', response['Content-Disposition'])
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode('utf-8').splitlines()]
+        self.assertEqual([('mock3', self.test_user2.id)], [(row['step'], row['user_id']) for row in rows])
+
+    def test_invalid(self):
+        """
+        Verifies that only staff can export and that unknown formats are rejected
+        """
+        self.assertEqual(403, self.get_response(self.test_user2).status_code)
+        response = self.get_response(self.test_user, '/api/tour/export/?output=xml')
+        self.assertEqual(400, response.status_code)
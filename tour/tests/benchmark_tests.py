@@ -0,0 +1,193 @@
+import os
+import sys
+import time
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.template import Context, Template
+from django.test import TestCase
+from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from tour.api import TourApiView
+from tour.cache import get_cache
+from tour.models import Step, Tour
+from tour.tests.mocks import MockView
+from tour.tours import BaseStep, BaseTour
+
+
+# The size of the synthetic tours can be changed with environment variables to benchmark bigger tours
+# e.g. TOUR_BENCHMARK_WIDTH=10 TOUR_BENCHMARK_DEPTH=3 TOUR_BENCHMARK_REPORT=1 python run_tests.py
+TOUR_WIDTH = int(os.environ.get('TOUR_BENCHMARK_WIDTH', 3))
+TOUR_DEPTH = int(os.environ.get('TOUR_BENCHMARK_DEPTH', 3))
+TOUR_USERS = int(os.environ.get('TOUR_BENCHMARK_USERS', 1000))
+TOUR_COUNT = int(os.environ.get('TOUR_BENCHMARK_TOURS', 3))
+
+
+class BenchmarkStep(BaseStep):
+    """
+    Base class of the generated step classes
+    """
+    pass
+
+
+def get_class_path(base_class, index):
+    """
+    Creates a subclass of the base class for a synthetic tour or step and returns its path. The class path of
+    every tour and step must be unique.
+    """
+    name = '{0}{1}'.format(base_class.__name__, index)
+    module = sys.modules[__name__]
+    if not hasattr(module, name):
+        setattr(module, name, type(name, (base_class,), {}))
+    return '{0}.{1}'.format(__name__, name)
+
+
+def create_steps(tour, parent_step, width, depth, steps):
+    """
+    Creates `width` steps under the parent and recursively under each of them until `depth` levels exist
+    """
+    for _ in range(width):
+        index = Step.objects.count()
+        step = Step.objects.create(
+            tour=tour, parent_step=parent_step, name='benchmark{0}'.format(index),
+            display_name='Benchmark Step {0}'.format(index), url='/benchmark/{0}/'.format(index),
+            step_class=get_class_path(BenchmarkStep, index), sort_order=index)
+        steps.append(step)
+        if depth > 1:
+            create_steps(tour, step, width, depth - 1, steps)
+    return steps
+
+
+class BenchmarkTest(TestCase):
+    """
+    Measures the wall time and queries of the hot paths of the tour app with synthetic tours of TOUR_WIDTH steps
+    per level and TOUR_DEPTH levels, and TOUR_USERS users. Each path fails if it makes more queries than its
+    budget, which doesn't depend on the size of the tours.
+    """
+    # The name, number of queries and wall time of every measured call
+    results = []
+    # The maximum number of queries of each path
+    query_budgets = {
+        'get_steps': 1,
+        'get_current_step': 1,
+        'dispatch': 3,
+        'tour_navigation': 3,
+        'api': 4,
+        'api_not_modified': 1,
+    }
+
+    @classmethod
+    def tearDownClass(cls):
+        super(BenchmarkTest, cls).tearDownClass()
+        # Set TOUR_BENCHMARK_REPORT to print the measurements
+        if os.environ.get('TOUR_BENCHMARK_REPORT'):  # pragma: no cover
+            for name, num_queries, duration in cls.results:
+                sys.stderr.write('{0}: {1} queries in {2:.4f}s\n'.format(name, num_queries, duration))
+
+    def setUp(self):
+        super(BenchmarkTest, self).setUp()
+        get_cache().clear()
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user('benchmark', 'benchmark@gmail.com', 'benchmark')
+        User.objects.bulk_create([User(username='user{0}'.format(i)) for i in range(TOUR_USERS)])
+
+        self.tours = []
+        steps = []
+        for index in range(TOUR_COUNT):
+            tour = Tour.objects.create(
+                name='benchmark{0}'.format(index), display_name='Benchmark {0}'.format(index),
+                tour_class=get_class_path(BaseTour, index), complete_url='/benchmark/complete/')
+            tour_steps = create_steps(tour, None, TOUR_WIDTH, TOUR_DEPTH, [])
+            tour.load_tour_class().add_users(User.objects.all())
+            self.tours.append(tour)
+            steps.append(tour_steps)
+        self.tour = self.tours[0]
+        self.steps = steps[0]
+
+        # Every step is complete except the last step of each tour so the whole tours are checked
+        last_step_ids = set(tour_steps[-1].id for tour_steps in steps)
+        BenchmarkStep.is_complete = lambda step_class, user=None: step_class.step.id not in last_step_ids
+
+    def tearDown(self):
+        super(BenchmarkTest, self).tearDown()
+        del BenchmarkStep.is_complete
+        get_cache().clear()
+
+    def measure(self, name, func):
+        """
+        Calls the function and fails if it made more queries than the budget of the path
+        """
+        with CaptureQueriesContext(connection) as queries:
+            start = time.time()
+            result = func()
+            duration = time.time() - start
+        self.results.append((name, len(queries), duration))
+        self.assertLessEqual(len(queries), self.query_budgets[name], '{0} made {1} queries in {2:.4f}s: {3}'.format(
+            name, len(queries), duration, [query['sql'] for query in queries]))
+        return result
+
+    def get_request(self, path):
+        request = self.factory.get(path)
+        request.user = self.user
+        return request
+
+    def test_get_steps(self):
+        """
+        Measures loading the nested steps of a tour
+        """
+        steps = self.measure('get_steps', lambda: self.tour.load_tour_class().get_steps())
+        self.assertEqual(self.steps, steps)
+
+    def test_get_current_step(self):
+        """
+        Measures finding the current step of a tour
+        """
+        tour_class = self.tour.load_tour_class()
+        current_step = self.measure('get_current_step', lambda: tour_class.get_current_step(self.user))
+        self.assertEqual(self.steps[-1], current_step)
+
+    def test_dispatch(self):
+        """
+        Measures the redirect check of a view with the tour mixin
+        """
+        request = self.get_request(self.steps[-1].url)
+        response = self.measure('dispatch', lambda: MockView.as_view()(request))
+        self.assertEqual(200, response.status_code)
+
+        request = self.get_request(self.steps[0].url)
+        response = self.measure('dispatch', lambda: MockView.as_view()(request))
+        self.assertEqual(200, response.status_code)
+
+    def test_tour_navigation(self):
+        """
+        Measures rendering the tour navigation
+        """
+        template = Template('{% load tour_tags %}{% tour_navigation %}')
+        context = Context({'request': self.get_request(self.steps[0].url)})
+        rendered = self.measure('tour_navigation', lambda: template.render(context))
+        self.assertTrue('tour-wrap' in rendered)
+
+    def test_api(self):
+        """
+        Measures listing the tours of the user with the api
+        """
+        request = APIRequestFactory().get('/api/tour/')
+        force_authenticate(request, user=self.user)
+
+        def get_response():
+            response = TourApiView.as_view()(request)
+            response.render()
+            return response
+
+        response = self.measure('api', get_response)
+        self.assertEqual(TOUR_COUNT, len(response.data))
+
+        # Polling again with the ETag of the response doesn't evaluate the tours
+        with override_settings(TOUR_API_CONDITIONAL_TIMEOUT=60):
+            etag = get_response()['ETag']
+            request = APIRequestFactory().get('/api/tour/', HTTP_IF_NONE_MATCH=etag)
+            force_authenticate(request, user=self.user)
+            response = self.measure('api_not_modified', lambda: TourApiView.as_view()(request))
+        self.assertEqual(304, response.status_code)
@@ -0,0 +1,244 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from mock import patch
+
+from tour.cache import (
+    get_cache, get_navigation_key, get_progress_hint, get_progress_summary, get_url_index,
+    invalidate_step_completion_on, invalidate_definitions, invalidate_user_tours, set_progress_hint,
+    set_progress_summary, set_url_index
+)
+from tour.tests.mocks import MockCachedStep, MockStickyStep
+from tour.tests.tour_tests import BaseTourTest
+
+
+class StepCompletionCacheTest(BaseTourTest):
+    """
+    Tests caching the completion of steps across requests
+    """
+    def setUp(self):
+        super(StepCompletionCacheTest, self).setUp()
+        get_cache().clear()
+        self.step1.step_class = 'tour.tests.mocks.MockCachedStep'
+        self.step2.step_class = 'tour.tests.mocks.MockStickyStep'
+
+    def tearDown(self):
+        super(StepCompletionCacheTest, self).tearDown()
+        get_cache().clear()
+
+    @patch('tour.tests.mocks.MockStep3.is_complete', spec_set=True)
+    def test_not_cached(self, mock_is_complete):
+        """
+        Verifies that steps evaluate is_complete every time by default
+        :type mock_is_complete: Mock
+        """
+        mock_is_complete.return_value = False
+        step_class = self.step3.load_step_class()
+        self.assertFalse(step_class.check_complete(self.test_user))
+        self.assertFalse(step_class.check_complete(self.test_user))
+        self.assertEqual(2, mock_is_complete.call_count)
+
+    @patch('tour.tests.mocks.MockCachedStep.is_complete', spec_set=True)
+    def test_cached(self, mock_is_complete):
+        """
+        Verifies that the completion is only evaluated once per user until it is invalidated
+        :type mock_is_complete: Mock
+        """
+        mock_is_complete.return_value = False
+        step_class = self.step1.load_step_class()
+        self.assertFalse(step_class.check_complete(self.test_user))
+        self.assertFalse(step_class.check_complete(self.test_user))
+        self.assertFalse(step_class.check_complete(self.test_user2))
+        self.assertEqual(2, mock_is_complete.call_count)
+
+        mock_is_complete.return_value = True
+        MockCachedStep.invalidate_completion([self.test_user, self.test_user2.pk])
+        self.assertTrue(step_class.check_complete(self.test_user))
+        self.assertTrue(step_class.check_complete(self.test_user2))
+        self.assertEqual(4, mock_is_complete.call_count)
+
+    @patch('tour.tests.mocks.MockCachedStep.is_complete', spec_set=True)
+    def test_cached_anonymous_user(self, mock_is_complete):
+        """
+        Verifies that completion is not cached for anonymous users
+        :type mock_is_complete: Mock
+        """
+        mock_is_complete.return_value = False
+        step_class = self.step1.load_step_class()
+        step_class.check_complete(User())
+        step_class.check_complete(User())
+        self.assertEqual(2, mock_is_complete.call_count)
+
+    @patch('tour.tests.mocks.MockStickyStep.is_complete', spec_set=True)
+    def test_sticky(self, mock_is_complete):
+        """
+        Verifies that a sticky step is not evaluated again once it is complete
+        :type mock_is_complete: Mock
+        """
+        mock_is_complete.return_value = False
+        step_class = self.step2.load_step_class()
+        self.assertFalse(step_class.check_complete(self.test_user))
+
+        # incomplete values can be invalidated
+        mock_is_complete.return_value = True
+        MockStickyStep.invalidate_completion([self.test_user])
+        self.assertTrue(step_class.check_complete(self.test_user))
+
+        # complete values are kept
+        mock_is_complete.return_value = False
+        MockStickyStep.invalidate_completion([self.test_user])
+        self.assertTrue(step_class.check_complete(self.test_user))
+        self.assertEqual(2, mock_is_complete.call_count)
+
+    @patch('tour.tests.mocks.MockCachedStep.is_complete', spec_set=True)
+    def test_invalidate_on_signal(self, mock_is_complete):
+        """
+        Verifies that saving and deleting the sender model invalidates the completion of the owning user
+        :type mock_is_complete: Mock
+        """
+        mock_is_complete.return_value = False
+        step_class = self.step1.load_step_class()
+        receiver = invalidate_step_completion_on([MockCachedStep], User, get_user=lambda user: user)
+        try:
+            step_class.check_complete(self.test_user)
+            step_class.check_complete(self.test_user2)
+            self.test_user.save()
+            step_class.check_complete(self.test_user)
+            step_class.check_complete(self.test_user2)
+            self.assertEqual(3, mock_is_complete.call_count)
+
+            self.test_user.delete()
+            step_class.check_complete(self.test_user2)
+            self.assertEqual(3, mock_is_complete.call_count)
+        finally:
+            post_save.disconnect(receiver, sender=User)
+            post_delete.disconnect(receiver, sender=User)
+
+    @patch('tour.tests.mocks.MockCachedStep.is_complete', spec_set=True)
+    def test_invalidate_on_signal_no_user(self, mock_is_complete):
+        """
+        Verifies that instances without a user are ignored
+        :type mock_is_complete: Mock
+        """
+        mock_is_complete.return_value = False
+        step_class = self.step1.load_step_class()
+        receiver = invalidate_step_completion_on([MockCachedStep], User, get_user=lambda user: None)
+        try:
+            step_class.check_complete(self.test_user)
+            self.test_user.save()
+            step_class.check_complete(self.test_user)
+            self.assertEqual(1, mock_is_complete.call_count)
+        finally:
+            post_save.disconnect(receiver, sender=User)
+            post_delete.disconnect(receiver, sender=User)
+
+    @patch('tour.tests.mocks.MockCachedStep.is_complete', spec_set=True)
+    def test_get_current_step_cached(self, mock_is_complete):
+        """
+        Verifies that the tour uses the cached completion values
+        :type mock_is_complete: Mock
+        """
+        mock_is_complete.return_value = True
+        self.step1.save()
+        self.tour1.steps.add(self.step1)
+        tour_class = self.tour1.load_tour_class()
+        self.assertIsNone(tour_class.get_current_step(self.test_user))
+        self.assertIsNone(tour_class.get_current_step(self.test_user))
+        self.assertEqual(1, mock_is_complete.call_count)
+
+
+class UrlIndexCacheTest(BaseTourTest):
+    """
+    Tests caching the url indexes of tours
+    """
+    def tearDown(self):
+        super(UrlIndexCacheTest, self).tearDown()
+        get_cache().clear()
+
+    def test_versioned(self):
+        """
+        Verifies that cached url indexes are only returned for the version they were cached with
+        """
+        get_cache().clear()
+        version, url_index = get_url_index(self.tour1.id)
+        self.assertIsNone(url_index)
+        self.assertEqual((version, None), get_url_index(self.tour1.id))
+
+        set_url_index(self.tour1.id, version, ({'mock1': 0}, {}), 60)
+        self.assertEqual((version, ({'mock1': 0}, {})), get_url_index(self.tour1.id))
+
+        invalidate_definitions()
+        new_version, url_index = get_url_index(self.tour1.id)
+        self.assertNotEqual(version, new_version)
+        self.assertIsNone(url_index)
+
+
+class NavigationCacheTest(BaseTourTest):
+    """
+    Tests the cache keys of the rendered navigation
+    """
+    def tearDown(self):
+        super(NavigationCacheTest, self).tearDown()
+        get_cache().clear()
+
+    def test_navigation_key(self):
+        """
+        Verifies the key depends on the user, path and flag and changes with the progress of the user
+        """
+        key = get_navigation_key(self.test_user, 'mock1', False)
+        self.assertEqual(key, get_navigation_key(self.test_user, 'mock1', False))
+        self.assertNotEqual(key, get_navigation_key(self.test_user, 'mock2', False))
+        self.assertNotEqual(key, get_navigation_key(self.test_user, 'mock1', True))
+        self.assertNotEqual(key, get_navigation_key(self.test_user2, 'mock1', False))
+
+        MockCachedStep.invalidate_completion([self.test_user])
+        new_key = get_navigation_key(self.test_user, 'mock1', False)
+        self.assertNotEqual(key, new_key)
+
+        invalidate_user_tours([self.test_user.pk])
+        self.assertNotEqual(new_key, get_navigation_key(self.test_user, 'mock1', False))
+
+
+class ProgressHintCacheTest(BaseTourTest):
+    """
+    Tests caching the progress hints of monotonic tours
+    """
+    def tearDown(self):
+        super(ProgressHintCacheTest, self).tearDown()
+        get_cache().clear()
+
+    def test_versioned(self):
+        """
+        Verifies that hints are only returned for the version they were cached with
+        """
+        get_cache().clear()
+        version, position = get_progress_hint(self.tour1.id, self.test_user.id)
+        self.assertEqual(0, position)
+        set_progress_hint(self.tour1.id, self.test_user.id, version, 2)
+        self.assertEqual((version, 2), get_progress_hint(self.tour1.id, self.test_user.id))
+        self.assertEqual((version, 0), get_progress_hint(self.tour1.id, self.test_user2.id))
+
+        invalidate_definitions()
+        self.assertEqual(0, get_progress_hint(self.tour1.id, self.test_user.id)[1])
+
+
+class ProgressSummaryCacheTest(BaseTourTest):
+    """
+    Tests caching the progress summaries saved to tour statuses
+    """
+    def tearDown(self):
+        super(ProgressSummaryCacheTest, self).tearDown()
+        get_cache().clear()
+
+    def test_versioned(self):
+        """
+        Verifies that summaries are only returned until the tour progress of the user changes
+        """
+        get_cache().clear()
+        version, summary = get_progress_summary(self.tour1.id, self.test_user.id)
+        self.assertIsNone(summary)
+        set_progress_summary(self.tour1.id, self.test_user.id, version, (self.step1.id, 0, 3), 60)
+        self.assertEqual((version, (self.step1.id, 0, 3)), get_progress_summary(self.tour1.id, self.test_user.id))
+        self.assertIsNone(get_progress_summary(self.tour2.id, self.test_user.id)[1])
+
+        invalidate_user_tours([self.test_user.id])
+        self.assertIsNone(get_progress_summary(self.tour1.id, self.test_user.id)[1])
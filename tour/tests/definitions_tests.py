@@ -0,0 +1,202 @@
+import json
+import os
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase
+from django_dynamic_fixture import G
+from mock import Mock, patch
+
+from tour.cache import get_cache
+from tour.definitions import load_definitions, sync_tours
+from tour.models import Step, StepStatus, Tour
+
+
+def get_definition(steps=None, **kwargs):
+    """
+    Returns the definition of a mock tour with the steps
+    """
+    definition = {
+        'name': 'tour1', 'display_name': 'Mock Tour', 'tour_class': 'tour.tests.mocks.MockTour',
+        'complete_url': 'mock_complete1', 'steps': steps or [],
+    }
+    definition.update(kwargs)
+    return definition
+
+
+def get_step_definition(index, steps=None, **kwargs):
+    """
+    Returns the definition of one of the mock steps
+    """
+    definition = {
+        'name': 'mock{0}'.format(index), 'display_name': 'Mock Step {0}'.format(index),
+        'url': 'mock{0}'.format(index), 'step_class': 'tour.tests.mocks.MockStep{0}'.format(index),
+        'steps': steps or [],
+    }
+    definition.update(kwargs)
+    return definition
+
+
+class SyncToursTest(TestCase):
+    """
+    Tests syncing tour definitions to the database
+    """
+    def tearDown(self):
+        super(SyncToursTest, self).tearDown()
+        get_cache().clear()
+
+    def test_create(self):
+        """
+        Verifies that the tours and nested steps are created in the declared order
+        """
+        definitions = [
+            get_definition([
+                get_step_definition(1, [get_step_definition(2)]),
+                get_step_definition(3),
+            ]),
+            get_definition([get_step_definition(4)], name='tour2', tour_class='tour.tests.mocks.MockTour2'),
+        ]
+        counts = sync_tours(definitions)
+
+        self.assertEqual({
+            'tours': {'created': 2, 'updated': 0},
+            'steps': {'created': 4, 'updated': 0, 'deleted': 0},
+        }, counts)
+        tour1 = Tour.objects.get(name='tour1')
+        self.assertEqual(('Mock Tour', 'mock_complete1'), (tour1.display_name, tour1.complete_url))
+        self.assertEqual(
+            ['mock1', 'mock2', 'mock3'], [step.name for step in tour1.load_tour_class().get_steps()])
+        self.assertEqual(['mock1', 'mock3'], [step.name for step in tour1.load_tour_class().get_steps(0)])
+        self.assertEqual('mock2', Step.objects.get(parent_step__name='mock1').name)
+        self.assertEqual(
+            ['mock4'], [step.name for step in Tour.objects.get(name='tour2').load_tour_class().get_steps()])
+
+    def test_create_num_queries(self):
+        """
+        Verifies that the number of queries doesn't depend on the number of steps
+        """
+        definitions = [get_definition([get_step_definition(index) for index in range(1, 5)])]
+        # A select, an insert and a select of the created rows for the tours and the steps, and the savepoint
+        with self.assertNumQueries(8):
+            sync_tours(definitions)
+        self.assertEqual(4, Step.objects.count())
+
+    def test_unchanged(self):
+        """
+        Verifies that nothing is written when the definitions match the database
+        """
+        definitions = [get_definition([get_step_definition(1, [get_step_definition(2)])])]
+        sync_tours(definitions)
+        # Only the selects of the tours and steps, and the savepoint
+        with self.assertNumQueries(4):
+            counts = sync_tours(definitions)
+        self.assertEqual({
+            'tours': {'created': 0, 'updated': 0},
+            'steps': {'created': 0, 'updated': 0, 'deleted': 0},
+        }, counts)
+
+    def test_update(self):
+        """
+        Verifies that changed tours and steps are updated, including their order and parents
+        """
+        sync_tours([get_definition([get_step_definition(1, [get_step_definition(2)]), get_step_definition(3)])])
+        step1 = Step.objects.get(name='mock1')
+        tour_class = Tour.objects.get().load_tour_class()
+        self.assertEqual(['mock1', 'mock2', 'mock3'], [step.name for step in tour_class.get_steps()])
+
+        counts = sync_tours([get_definition(
+            [get_step_definition(3, [get_step_definition(2)]), get_step_definition(1, url='changed')],
+            display_name='Changed')])
+        self.assertEqual({
+            'tours': {'created': 0, 'updated': 1},
+            'steps': {'created': 0, 'updated': 3, 'deleted': 0},
+        }, counts)
+        self.assertEqual('Changed', Tour.objects.get().display_name)
+        self.assertEqual(step1.id, Step.objects.get(name='mock1').id)
+        self.assertEqual('changed', Step.objects.get(name='mock1').url)
+        self.assertEqual(['mock3', 'mock2', 'mock1'], [step.name for step in tour_class.get_steps()])
+        self.assertEqual('mock2', Step.objects.get(parent_step__name='mock3').name)
+
+    def test_delete_steps(self):
+        """
+        Verifies that steps that are no longer declared are only deleted when requested
+        """
+        sync_tours([get_definition([get_step_definition(1), get_step_definition(2)])])
+        G(StepStatus, step=Step.objects.get(name='mock2'))
+        other_tour = G(Tour, name='tour2', tour_class='tour.tests.mocks.MockTour2')
+        G(Step, tour=other_tour, name='mock4', step_class='tour.tests.mocks.MockStep4', parent_step=None)
+
+        self.assertEqual(0, sync_tours([get_definition([get_step_definition(1)])])['steps']['deleted'])
+        self.assertEqual(3, Step.objects.count())
+
+        self.assertEqual(
+            1, sync_tours([get_definition([get_step_definition(1)])], delete_steps=True)['steps']['deleted'])
+        self.assertEqual(['mock1', 'mock4'], sorted(Step.objects.values_list('name', flat=True)))
+        self.assertEqual(0, StepStatus.objects.count())
+        self.assertEqual(
+            0, sync_tours([get_definition([get_step_definition(1)])], delete_steps=True)['steps']['deleted'])
+
+    def test_invalid(self):
+        """
+        Verifies that invalid definitions raise errors without changing anything
+        """
+        with self.assertRaisesRegexp(ImproperlyConfigured, 'Tour definitions require a tour_class'):
+            sync_tours([get_definition(tour_class=None)])
+        with self.assertRaisesRegexp(ImproperlyConfigured, 'Step definitions require a step_class'):
+            sync_tours([get_definition([get_step_definition(1, step_class='')])])
+        with self.assertRaisesRegexp(ImproperlyConfigured, 'Tour tour1 is defined more than once'):
+            sync_tours([get_definition(), get_definition()])
+        with self.assertRaisesRegexp(ImproperlyConfigured, 'Step mock1 is defined more than once'):
+            sync_tours([get_definition([get_step_definition(1, [get_step_definition(1)])])])
+        with self.assertRaisesRegexp(ImproperlyConfigured, 'Tour definitions must be dicts'):
+            sync_tours(['tour1'])
+        with self.assertRaisesRegexp(ImproperlyConfigured, 'Step definitions must be dicts'):
+            sync_tours([get_definition(['mock1'])])
+        self.assertFalse(Tour.objects.exists())
+
+
+class LoadDefinitionsTest(TestCase):
+    """
+    Tests reading tour definitions from files
+    """
+    def write_file(self, suffix, content):
+        definition_file = tempfile.NamedTemporaryFile(mode='w', suffix=suffix, delete=False)
+        definition_file.write(content)
+        definition_file.close()
+        self.addCleanup(os.remove, definition_file.name)
+        return definition_file.name
+
+    def test_json(self):
+        """
+        Verifies that JSON files are loaded
+        """
+        definitions = [get_definition([get_step_definition(1)])]
+        self.assertEqual(definitions, load_definitions(self.write_file('.json', json.dumps(definitions))))
+
+    def test_yaml(self):
+        """
+        Verifies that YAML files are loaded with PyYAML
+        """
+        path = self.write_file('.yaml', '- name: tour1\n')
+        mock_yaml = Mock(safe_load=Mock(return_value=[{'name': 'tour1'}]))
+        with patch.dict('sys.modules', yaml=mock_yaml):
+            self.assertEqual([{'name': 'tour1'}], load_definitions(path))
+        self.assertEqual(path, mock_yaml.safe_load.call_args[0][0].name)
+
+        with patch.dict('sys.modules', yaml=None):
+            with self.assertRaisesRegexp(ImproperlyConfigured, 'PyYAML is required'):
+                load_definitions(path)
+
+    def test_invalid(self):
+        """
+        Verifies that files that don't contain a list of definitions raise errors
+        """
+        with self.assertRaisesRegexp(ImproperlyConfigured, 'must contain a list of tour definitions'):
+            load_definitions(self.write_file('.json', json.dumps(get_definition())))
+        with self.assertRaisesRegexp(ImproperlyConfigured, 'must contain a list of tour definitions'):
+            load_definitions(self.write_file('.json', json.dumps(['tour1'])))
+
+        # Empty YAML files are loaded as None
+        with patch.dict('sys.modules', yaml=Mock(safe_load=Mock(return_value=None))):
+            with self.assertRaisesRegexp(ImproperlyConfigured, 'must contain a list of tour definitions'):
+                load_definitions(self.write_file('.yml', ''))
@@ -0,0 +1,98 @@
+import datetime
+import json
+
+from django_dynamic_fixture import G
+from mock import patch
+
+from tour.export import iter_chunked, iter_export, iter_rows
+from tour.models import StepStatus, TourStatus
+from tour.tests.tour_tests import BaseTourTest
+
+
+class ExportTest(BaseTourTest):
+    """
+    Tests exporting the tour and step statuses of users
+    """
+    def setUp(self):
+        super(ExportTest, self).setUp()
+        self.tour1.steps.add(self.step1, self.step2)
+        self.tour2.steps.add(self.step3)
+        complete_time = datetime.datetime(2015, 1, 2, 3, 4, 5)
+        self.status1 = G(
+            TourStatus, tour=self.tour1, user=self.test_user, complete=True, complete_time=complete_time,
+            current_step=None, num_complete_steps=2, num_steps=2)
+        self.status2 = G(
+            TourStatus, tour=self.tour1, user=self.test_user2, complete=False, complete_time=None,
+            current_step=self.step1, num_complete_steps=0, num_steps=2)
+        self.status3 = G(
+            TourStatus, tour=self.tour2, user=self.test_user, complete=False, complete_time=None, current_step=None)
+
+    def test_iter_chunked(self):
+        """
+        Verifies that every row is yielded in order with one query per chunk
+        """
+        queryset = TourStatus.objects.values_list('id', 'user_id')
+        with self.assertNumQueries(2):
+            rows = list(iter_chunked(queryset, chunk_size=2))
+        self.assertEqual([self.status1.id, self.status2.id, self.status3.id], [row[0] for row in rows])
+
+        # A full last chunk takes one more query to find out there are no more rows
+        with self.assertNumQueries(4):
+            self.assertEqual(rows, list(iter_chunked(queryset, chunk_size=1)))
+        with self.assertNumQueries(1):
+            self.assertEqual([], list(iter_chunked(queryset.filter(user_id=0))))
+
+    @patch('tour.tests.mocks.MockStep2.is_complete', spec_set=True)
+    def test_iter_rows(self, mock_step2_is_complete):
+        """
+        Verifies the values of the tour and step statuses, optionally limited to some tours. The current step is
+        evaluated instead of read from the saved progress summary.
+        :type mock_step2_is_complete: Mock
+        """
+        mock_step2_is_complete.return_value = False
+        self.assertEqual([
+            (self.status1.id, 'tour1', self.test_user.id, True, self.status1.create_time, self.status1.complete_time,
+             None, 2, 2, None),
+            (self.status2.id, 'tour1', self.test_user2.id, False, self.status2.create_time, None, 'mock2', 0, 2, None),
+        ], list(iter_rows('tours', ['tour1'])))
+        self.assertEqual(1, mock_step2_is_complete.call_count)
+
+        # Each chunk selects the statuses, the users of the incomplete statuses and the tours that weren't loaded yet
+        with self.assertNumQueries(6):
+            rows = list(iter_rows('tours', chunk_size=2))
+        self.assertEqual(['mock2', None], [row[6] for row in rows[1:]])
+
+        step_status = G(StepStatus, step=self.step3, user=self.test_user, complete=False, complete_time=None)
+        G(StepStatus, step=self.step1, user=self.test_user, complete=True)
+        self.assertEqual([
+            (step_status.id, 'tour2', 'mock3', self.test_user.id, False, step_status.create_time, None),
+        ], list(iter_rows('steps', ['tour2'])))
+        self.assertEqual(2, len(list(iter_rows('steps'))))
+
+    def test_csv(self):
+        """
+        Verifies that CSV exports have a header and dates in ISO format
+        """
+        lines = list(iter_export('tours', 'csv', ['tour1']))
+        self.assertEqual(3, len(lines))
+        self.assertEqual(
+            'id,tour,user_id,complete,create_time,complete_time,current_step,num_complete_steps,num_steps,'
+            'evaluate_time\r\n', lines[0])
+        self.assertEqual('{0},tour1,{1},True,{2},2015-01-02T03:04:05,,2,2,\r\n'.format(
+            self.status1.id, self.test_user.id, self.status1.create_time.isoformat()), lines[1])
+
+    @patch('tour.tests.mocks.MockStep2.is_complete', spec_set=True)
+    def test_jsonl(self, mock_step2_is_complete):
+        """
+        Verifies that JSON Lines exports have one object per row
+        :type mock_step2_is_complete: Mock
+        """
+        mock_step2_is_complete.return_value = False
+        lines = list(iter_export('tours', 'jsonl', chunk_size=1))
+        self.assertEqual(3, len(lines))
+        self.assertTrue(all(line.endswith('\n') for line in lines))
+        row = json.loads(lines[1])
+        self.assertEqual(self.status2.id, row['id'])
+        self.assertEqual('mock2', row['current_step'])
+        self.assertIsNone(row['complete_time'])
+        self.assertEqual(['tour1', 'tour1', 'tour2'], [json.loads(line)['tour'] for line in lines])
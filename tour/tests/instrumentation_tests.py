@@ -0,0 +1,122 @@
+from django.template import Context, Template
+from django.test.utils import override_settings
+from mock import Mock, patch
+
+from tour.instrumentation import MemoryCollector, MetricsBackend, collect_metrics, get_backends, instrument
+from tour.models import Tour
+from tour.serializers import TourSerializer
+from tour.tests.mocks import MockView
+from tour.tests.tour_tests import BaseTourTest
+
+
+class InstrumentationTest(BaseTourTest):
+    """
+    Tests the measurements of the tour code
+    """
+    def setUp(self):
+        super(InstrumentationTest, self).setUp()
+        self.tour1.steps.add(self.step1, self.step2, self.step3)
+        self.tour1.load_tour_class().add_user(self.test_user)
+
+    @patch('tour.tests.mocks.MockStep2.is_complete', spec_set=True)
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_collect_metrics(self, mock_step1_is_complete, mock_step2_is_complete):
+        """
+        Verifies the hot paths send metrics with their queries and tags
+        :type mock_step1_is_complete: Mock
+        :type mock_step2_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = True
+        mock_step2_is_complete.return_value = False
+
+        with collect_metrics() as collector:
+            Tour.objects.complete_tours(self.test_user)
+            TourSerializer(self.tour1).data
+            Template('{% load tour_tags %}{% tour_navigation %}').render(Context({
+                'request': Mock(user=self.test_user, path='mock2', GET={}),
+            }))
+
+        complete_tours = collector.get_metrics('complete_tours')[0]
+        self.assertEqual({'user_id': self.test_user.id}, complete_tours.tags)
+        self.assertGreater(complete_tours.num_queries, 0)
+        self.assertGreaterEqual(complete_tours.duration, 0)
+        self.assertEqual({'tour': 'tour1'}, collector.get_metrics('get_current_step')[0].tags)
+        self.assertEqual(
+            [{'step': 'mock1'}, {'step': 'mock2'}],
+            [metric.tags for metric in collector.get_metrics('is_complete')][:2])
+        self.assertEqual({'tour': 'tour1'}, collector.get_metrics('serialize_tour')[0].tags)
+        self.assertEqual({'always_show': False}, collector.get_metrics('tour_navigation')[0].tags)
+
+        # Nothing is collected after the block
+        num_metrics = len(collector.metrics)
+        Tour.objects.complete_tours(self.test_user)
+        self.assertEqual(num_metrics, len(collector.metrics))
+
+    @patch('tour.tests.mocks.MockStep2.is_complete', spec_set=True)
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_collect_request_metrics(self, mock_step1_is_complete, mock_step2_is_complete):
+        """
+        Verifies the current step of the tour is measured when a view with the tour mixin is dispatched and when
+        the navigation is rendered
+        :type mock_step1_is_complete: Mock
+        :type mock_step2_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = True
+        mock_step2_is_complete.return_value = False
+
+        with collect_metrics() as collector:
+            request = Mock(user=self.test_user, path='mock2', method='GET', GET={})
+            MockView.as_view()(request)
+        self.assertEqual({'tour': 'tour1'}, collector.get_metrics('get_current_step')[0].tags)
+        self.assertEqual(1, len(collector.get_metrics('complete_tours')))
+
+        with collect_metrics() as collector:
+            Template('{% load tour_tags %}{% tour_navigation %}').render(Context({
+                'request': Mock(user=self.test_user, path='mock2', GET={}),
+            }))
+        self.assertEqual({'tour': 'tour1'}, collector.get_metrics('get_current_step')[0].tags)
+        self.assertEqual(
+            ['complete_tours', 'get_current_step', 'is_complete', 'serialize_tour', 'tour_navigation'],
+            sorted(set(metric.name for metric in collector.metrics)))
+
+    def test_disabled(self):
+        """
+        Verifies the code runs without measuring it when nothing receives the metrics
+        """
+        with patch('tour.instrumentation.CaptureQueriesContext') as mock_capture:
+            with instrument('mock'):
+                pass
+        self.assertFalse(mock_capture.called)
+
+    @override_settings(TOUR_METRICS_BACKENDS=['tour.instrumentation.MemoryCollector'])
+    def test_backends(self):
+        """
+        Verifies the metrics are recorded by the configured backends, including when the code raises an error
+        """
+        backend, = get_backends()
+        self.assertIsInstance(backend, MemoryCollector)
+        self.assertIs(backend, get_backends()[0])
+
+        with self.assertRaises(ValueError):
+            with instrument('mock', key='value'):
+                list(Tour.objects.all())
+                raise ValueError
+        metric, = backend.get_metrics('mock')
+        self.assertEqual({'key': 'value'}, metric.tags)
+        self.assertEqual(1, metric.num_queries)
+
+    def test_backends_setting_changed(self):
+        """
+        Verifies the backends are loaded again when the setting changes
+        """
+        self.assertEqual([], get_backends())
+        with override_settings(TOUR_METRICS_BACKENDS=['tour.instrumentation.MemoryCollector']):
+            self.assertEqual(1, len(get_backends()))
+        self.assertEqual([], get_backends())
+
+    def test_base_backend(self):
+        """
+        Verifies backends must implement record
+        """
+        with self.assertRaises(NotImplementedError):
+            MetricsBackend().record(None)
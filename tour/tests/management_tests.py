@@ -0,0 +1,163 @@
+import json
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.test.utils import override_settings
+from django_dynamic_fixture import G
+from mock import patch
+from six import StringIO
+
+from tour.models import Step, StepStatus, Tour, TourStatus
+from tour.tests.definitions_tests import get_definition, get_step_definition
+from tour.tests.tour_tests import BaseTourTest
+
+
+class AddTourUsersTest(BaseTourTest):
+    """
+    Tests the add_tour_users management command
+    """
+    def test_add_from_file(self):
+        """
+        Verifies that the user ids in the file are added to the tour and unknown user ids are skipped
+        """
+        user_id_file = tempfile.NamedTemporaryFile(mode='w', delete=False)
+        user_id_file.write('{0}\n\n{1}\n{0}\n0\n'.format(self.test_user.id, self.test_user2.id))
+        user_id_file.close()
+        stdout = StringIO()
+        try:
+            call_command('add_tour_users', 'tour1', user_id_file.name, batch_size=1, stdout=stdout)
+        finally:
+            os.remove(user_id_file.name)
+
+        self.assertEqual('Added 2 users, skipped 2 users', stdout.getvalue().strip())
+        self.assertEqual(2, TourStatus.objects.filter(tour=self.tour1).count())
+
+    def test_add_from_stdin(self):
+        """
+        Verifies that the user ids are read from stdin when no file is given
+        """
+        stdout = StringIO()
+        with patch('sys.stdin', StringIO('{0}\n'.format(self.test_user.id))):
+            call_command('add_tour_users', 'tour2', stdout=stdout)
+
+        self.assertEqual('Added 1 users, skipped 0 users', stdout.getvalue().strip())
+        self.assertEqual(self.tour2, TourStatus.objects.get(user=self.test_user).tour)
+
+    def test_invalid_arguments(self):
+        """
+        Verifies that errors are raised for missing tours, invalid ids and the wrong number of arguments
+        """
+        with self.assertRaisesRegexp(CommandError, 'Usage'):
+            call_command('add_tour_users')
+        with self.assertRaisesRegexp(CommandError, 'does not exist'):
+            call_command('add_tour_users', 'missing')
+        with patch('sys.stdin', StringIO('abc\n')):
+            with self.assertRaisesRegexp(CommandError, 'Invalid user id abc'):
+                call_command('add_tour_users', 'tour1')
+
+
+class SyncToursTest(TestCase):
+    """
+    Tests the sync_tours management command
+    """
+    def test_sync_from_files(self):
+        """
+        Verifies that the definitions of every file are synced
+        """
+        paths = []
+        for definition in [
+                get_definition([get_step_definition(1)]),
+                get_definition([get_step_definition(2)], name='tour2', tour_class='tour.tests.mocks.MockTour2')]:
+            definition_file = tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False)
+            json.dump([definition], definition_file)
+            definition_file.close()
+            paths.append(definition_file.name)
+        stdout = StringIO()
+        try:
+            call_command('sync_tours', *paths, stdout=stdout)
+        finally:
+            for path in paths:
+                os.remove(path)
+
+        self.assertEqual(
+            'Tours: 2 created, 0 updated. Steps: 2 created, 0 updated, 0 deleted', stdout.getvalue().strip())
+        self.assertEqual(['tour1', 'tour2'], list(Tour.objects.order_by('name').values_list('name', flat=True)))
+
+    @override_settings(TOUR_DEFINITIONS=[get_definition([get_step_definition(1)])])
+    def test_sync_from_settings(self):
+        """
+        Verifies that the definitions of the TOUR_DEFINITIONS setting are synced when no file is given, and that
+        steps are only deleted when requested
+        """
+        Step.objects.create(
+            tour=Tour.objects.create(name='tour1', display_name='Old', tour_class='tour.tests.mocks.MockTour'),
+            name='mock2', display_name='Mock Step 2', step_class='tour.tests.mocks.MockStep2')
+        stdout = StringIO()
+        call_command('sync_tours', delete_steps=True, stdout=stdout)
+
+        self.assertEqual(
+            'Tours: 0 created, 1 updated. Steps: 1 created, 0 updated, 1 deleted', stdout.getvalue().strip())
+        self.assertEqual(['mock1'], list(Step.objects.values_list('name', flat=True)))
+
+    def test_invalid(self):
+        """
+        Verifies that missing files and invalid definitions raise command errors
+        """
+        with self.assertRaisesRegexp(CommandError, 'No such file'):
+            call_command('sync_tours', 'missing.json')
+        with override_settings(TOUR_DEFINITIONS=[{'name': 'tour1'}]):
+            with self.assertRaisesRegexp(CommandError, 'Tour definitions require a display_name'):
+                call_command('sync_tours')
+
+
+class ExportTourProgressTest(BaseTourTest):
+    """
+    Tests the export_tour_progress management command
+    """
+    def setUp(self):
+        super(ExportTourProgressTest, self).setUp()
+        self.tour1.load_tour_class().add_user(self.test_user)
+        self.tour2.load_tour_class().add_user(self.test_user2)
+
+    def test_export_csv(self):
+        """
+        Verifies that the tour statuses are written to stdout as CSV
+        """
+        stdout = StringIO()
+        call_command('export_tour_progress', tour_names=['tour2'], chunk_size=1, stdout=stdout)
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual(2, len(lines))
+        self.assertTrue(lines[0].startswith('id,tour,user_id,complete'))
+        self.assertTrue(lines[1].startswith('{0},tour2,{1},False'.format(
+            TourStatus.objects.get(tour=self.tour2).id, self.test_user2.id)))
+
+    def test_export_file(self):
+        """
+        Verifies that the step statuses are written to the output file as JSON Lines
+        """
+        self.tour1.steps.add(self.step1)
+        G(StepStatus, step=self.step1, user=self.test_user, complete=True)
+        output_file = tempfile.NamedTemporaryFile(delete=False)
+        output_file.close()
+        try:
+            call_command('export_tour_progress', export_format='jsonl', steps=True, output=output_file.name)
+            with open(output_file.name) as exported:
+                rows = [json.loads(line) for line in exported]
+        finally:
+            os.remove(output_file.name)
+        self.assertEqual([('tour1', 'mock1', self.test_user.id, True)], [
+            (row['tour'], row['step'], row['user_id'], row['complete']) for row in rows])
+
+    def test_invalid_arguments(self):
+        """
+        Verifies that arguments, unknown formats and chunk sizes below 1 raise command errors
+        """
+        with self.assertRaisesRegexp(CommandError, 'takes no arguments'):
+            call_command('export_tour_progress', 'tour1')
+        with self.assertRaisesRegexp(CommandError, 'Invalid format xml'):
+            call_command('export_tour_progress', export_format='xml')
+        with self.assertRaisesRegexp(CommandError, 'chunk size must be at least 1'):
+            call_command('export_tour_progress', chunk_size=0)
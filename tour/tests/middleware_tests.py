@@ -0,0 +1,122 @@
+from django_dynamic_fixture import G
+from mock import Mock, patch
+
+from tour.cache import get_cache, has_no_tour
+from tour.middleware import TourMiddleware, get_all_steps_url_index
+from tour.models import Step, TourStatus
+from tour.tests.tour_tests import BaseTourTest
+
+
+class TourMiddlewareTest(BaseTourTest):
+    """
+    Tests the tour middleware
+    """
+    def setUp(self):
+        super(TourMiddlewareTest, self).setUp()
+        get_cache().clear()
+        self.tour1.steps.add(self.step1, self.step2, self.step3)
+        self.middleware = TourMiddleware()
+
+    def tearDown(self):
+        super(TourMiddlewareTest, self).tearDown()
+        get_cache().clear()
+
+    def process_view(self, path, user=None, method='get'):
+        request = Mock(user=user or self.test_user, path=path, method=method, GET={}, resolver_match=None)
+        return self.middleware.process_view(request, Mock(), [], {}), request
+
+    def test_get_all_steps_url_index(self):
+        """
+        Verifies the index contains the urls of every tour and is cached
+        """
+        self.tour2.steps.add(self.step4)
+        self.assertEqual({'mock1', 'mock2', 'mock3', 'mock4'}, set(get_all_steps_url_index().paths))
+        with self.assertNumQueries(0):
+            self.assertEqual({'mock1', 'mock2', 'mock3', 'mock4'}, set(get_all_steps_url_index().paths))
+
+    def test_get_all_steps_url_index_bad_step_class(self):
+        """
+        Verifies that a step class that can't be loaded is only matched by its url instead of breaking every request
+        """
+        self.tour2.steps.add(G(
+            Step, step_class='tour.tests.mocks.MissingStep', name='bad', url='mock-bad', parent_step=None,
+            sort_order=5))
+        self.assertEqual({'mock1', 'mock2', 'mock3', 'mock4', 'mock-bad'}, set(get_all_steps_url_index().paths))
+        self.assertIsNone(self.process_view('mock-fake')[0])
+
+    def test_anonymous_user(self):
+        """
+        Verifies that anonymous users are skipped
+        """
+        get_all_steps_url_index()
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.process_view('mock2', user=Mock(pk=None))[0])
+            self.assertIsNone(self.middleware.process_view(Mock(spec_set=['path']), Mock(), [], {}))
+
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_unrelated_path(self, mock_step1_is_complete):
+        """
+        Verifies that paths that don't belong to any step don't make any queries
+        :type mock_step1_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = False
+        self.tour1.load_tour_class().add_user(self.test_user)
+        get_all_steps_url_index()
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.process_view('mock-fake')[0])
+        self.assertFalse(mock_step1_is_complete.called)
+
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_redirect(self, mock_step1_is_complete):
+        """
+        Verifies that the user is redirected like with the view mixin
+        :type mock_step1_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = False
+        self.tour1.load_tour_class().add_user(self.test_user)
+
+        response = self.process_view('mock2')[0]
+        self.assertEqual(302, response.status_code)
+        self.assertEqual('mock1', response.url)
+        self.assertIsNone(self.process_view('mock1')[0])
+        self.assertFalse(has_no_tour(self.test_user))
+
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_post_invalidates(self, mock_step1_is_complete):
+        """
+        Verifies that the tour state is recalculated after views handling unsafe methods
+        :type mock_step1_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = False
+        self.tour1.load_tour_class().add_user(self.test_user)
+        response, request = self.process_view('mock1', method='post')
+        self.assertIsNone(response)
+        self.assertEqual({}, request.tour_state.values)
+
+    def test_no_tour_cached(self):
+        """
+        Verifies that users without a tour are remembered until they are added to a tour
+        """
+        self.assertIsNone(self.process_view('mock2')[0])
+        self.assertTrue(has_no_tour(self.test_user))
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.process_view('mock2')[0])
+
+        self.tour1.load_tour_class().add_user(self.test_user)
+        self.assertFalse(has_no_tour(self.test_user))
+        response = self.process_view('mock2')[0]
+        self.assertEqual('mock_complete1', response.url)
+
+    def test_no_tour_invalidated(self):
+        """
+        Verifies that adding users in bulk or creating statuses directly forgets that the users have no tour
+        """
+        self.process_view('mock2')
+        self.process_view('mock2', user=self.test_user2)
+        self.assertTrue(has_no_tour(self.test_user))
+        self.assertTrue(has_no_tour(self.test_user2))
+
+        self.tour1.load_tour_class().add_users([self.test_user])
+        G(TourStatus, tour=self.tour2, user=self.test_user2)
+        self.assertFalse(has_no_tour(self.test_user))
+        self.assertFalse(has_no_tour(self.test_user2))
@@ -34,3 +34,33 @@ class MockTour(BaseTour):
 
 class MockTour2(BaseTour):
     pass
+
+
+class MockCachedStep(BaseStep):
+    cache_completion = True
+
+
+class MockStickyStep(BaseStep):
+    cache_completion = True
+    sticky_completion = True
+
+
+class MockPersistedTour(BaseTour):
+    persist_step_progress = True
+
+
+class MockParallelTour(BaseTour):
+    parallel_step_checks = True
+
+
+class MockMonotonicTour(BaseTour):
+    monotonic_steps = True
+
+
+class MockSummaryTour(BaseTour):
+    persist_progress_summary = True
+
+
+class MockMarkCompleteTour(BaseTour):
+    def mark_complete(self, user):
+        return super(MockMarkCompleteTour, self).mark_complete(user)
@@ -3,6 +3,7 @@ from django.test import TestCase
 from django_dynamic_fixture import G
 from mock import patch
 from tour.models import Tour, TourStatus, Step
+from tour.tests.mocks import MockMarkCompleteTour
 from tour.tests.tour_tests import BaseTourTest
 
 
@@ -27,12 +28,103 @@ class TourManagerTest(BaseTourTest):
         self.assertEqual(1, TourStatus.objects.filter(complete=True).count())
         self.assertEqual(1, TourStatus.objects.filter(complete=False).count())
 
+    @patch('tour.tests.mocks.MockStep3.is_complete', spec_set=True)
+    @patch('tour.tests.mocks.MockStep2.is_complete', spec_set=True)
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_complete_tours_num_queries(self, mock_step1_is_complete, mock_step2_is_complete, mock_step3_is_complete):
+        """
+        Verifies that the steps of all of the tours are evaluated together and the tours are marked complete with a
+        fixed number of queries
+        :type mock_step1_is_complete: Mock
+        :type mock_step2_is_complete: Mock
+        :type mock_step3_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = True
+        mock_step2_is_complete.return_value = True
+        mock_step3_is_complete.return_value = False
+        self.tour1.steps.add(self.step1, self.step2)
+        self.tour2.steps.add(self.step3)
+
+        # add users to tours
+        self.tour1.load_tour_class().add_user(self.test_user)
+        self.tour2.load_tour_class().add_user(self.test_user)
+        self.tour1.load_tour_class().add_user(self.test_user2)
+
+        with self.assertNumQueries(3):
+            Tour.objects.complete_tours(self.test_user)
+
+        self.assertEqual(1, mock_step1_is_complete.call_count)
+        self.assertEqual(1, mock_step3_is_complete.call_count)
+        self.assertEqual(1, TourStatus.objects.filter(user=self.test_user, complete=True).count())
+        self.assertEqual(0, TourStatus.objects.filter(user=self.test_user, complete=True, complete_time=None).count())
+        self.assertEqual(1, TourStatus.objects.filter(user=self.test_user2, complete=False).count())
+
+        # More tours take the same number of queries
+        mock_step3_is_complete.return_value = True
+        tour3 = G(Tour, name='tour3', tour_class='tour.tours.BaseTour')
+        tour3.steps.add(self.step4)
+        tour3.load_tour_class().add_user(self.test_user)
+        with self.assertNumQueries(3):
+            Tour.objects.complete_tours(self.test_user)
+        self.assertEqual(3, TourStatus.objects.filter(user=self.test_user, complete=True).count())
+
+    @patch('tour.tests.mocks.MockMarkCompleteTour.mark_complete', autospec=True,
+           side_effect=MockMarkCompleteTour.mark_complete)
+    def test_complete_tours_mark_complete(self, mock_mark_complete):
+        """
+        Verifies that tours whose class overrides mark_complete are marked with it and the others are updated
+        together
+        :type mock_mark_complete: Mock
+        """
+        tour3 = G(Tour, name='tour3', tour_class='tour.tests.mocks.MockMarkCompleteTour')
+        self.tour1.load_tour_class().add_user(self.test_user)
+        tour3.load_tour_class().add_user(self.test_user)
+
+        Tour.objects.complete_tours(self.test_user)
+        self.assertEqual(1, mock_mark_complete.call_count)
+        self.assertEqual(tour3, mock_mark_complete.call_args[0][0].tour)
+        self.assertEqual(self.test_user, mock_mark_complete.call_args[0][1])
+        self.assertEqual(2, TourStatus.objects.filter(user=self.test_user, complete=True).count())
+
     def test_complete_tours_no_user(self):
         """
         Makes sure None is returned if the user is anonymous
         """
         self.assertIsNone(Tour.objects.complete_tours(User()))
 
+    def test_get_tour_status(self):
+        """
+        Verifies that the status of the first incomplete tour is returned before the most recently completed tour,
+        with its tour in the same query
+        """
+        tour3 = G(Tour, name='tour3', tour_class='tour.tests.mocks.MockParallelTour')
+        self.tour1.load_tour_class().add_user(self.test_user)
+        self.tour2.load_tour_class().add_user(self.test_user)
+        self.tour1.load_tour_class().mark_complete(self.test_user)
+        G(TourStatus, tour=tour3, user=self.test_user, complete=False)
+
+        with self.assertNumQueries(1):
+            tour_status = Tour.objects.get_tour_status(self.test_user)
+            self.assertEqual(self.tour2, tour_status.tour)
+        self.assertFalse(tour_status.complete)
+
+        self.tour2.load_tour_class().mark_complete(self.test_user)
+        self.assertEqual(tour3, Tour.objects.get_tour_status(self.test_user).tour)
+
+        tour3.load_tour_class().mark_complete(self.test_user)
+        with self.assertNumQueries(1):
+            tour_status = Tour.objects.get_tour_status(self.test_user)
+            self.assertEqual(tour3, tour_status.tour)
+        self.assertTrue(tour_status.complete)
+
+    def test_get_tour_status_none(self):
+        """
+        Verifies that None is returned for anonymous users and users without tours
+        """
+        with self.assertNumQueries(0):
+            self.assertIsNone(Tour.objects.get_tour_status(User()))
+        self.assertIsNone(Tour.objects.get_tour_status(self.test_user))
+
     @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
     def test_get_for_user(self, mock_step1_is_complete):
         """
@@ -129,14 +221,14 @@ class TourManagerTest(BaseTourTest):
         self.assertIsNone(Tour.objects.get_recent_tour(self.test_user))
 
     @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
-    @patch('tour.models.TourManager.get_for_user')
-    def test_get_next_url_current_tour(self, mock_get_for_user, mock_step1_is_complete):
+    @patch('tour.models.TourManager.get_tour_status')
+    def test_get_next_url_current_tour(self, mock_get_tour_status, mock_step1_is_complete):
         """
         Verifies that the next url of a tour will be returned
-        :type mock_get_for_user: Mock
+        :type mock_get_tour_status: Mock
         :type mock_step1_is_complete: Mock
         """
-        mock_get_for_user.return_value = self.tour1
+        mock_get_tour_status.return_value = TourStatus(tour=self.tour1, user=self.test_user)
         mock_step1_is_complete.return_value = False
 
         self.tour1.steps.add(self.step1)
@@ -148,33 +240,25 @@ class TourManagerTest(BaseTourTest):
         self.tour2.load_tour_class().add_user(self.test_user2)
 
         self.assertEqual(self.step1.url, Tour.objects.get_next_url(self.test_user))
-        self.assertEqual(1, mock_get_for_user.call_count)
+        self.assertEqual(1, mock_get_tour_status.call_count)
 
     @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
-    @patch('tour.models.TourManager.get_recent_tour')
-    @patch('tour.models.TourManager.get_for_user')
-    def test_get_next_url_recent_tour(self, mock_get_for_user, mock_get_recent_tour, mock_step1_is_complete):
+    def test_get_next_url_recent_tour(self, mock_step1_is_complete):
         """
         Verifies that the next url of a recent tour will be returned
-        :type mock_get_for_user: Mock
-        :type mock_get_recent_tour: Mock
         :type mock_step1_is_complete: Mock
         """
-        mock_get_for_user.return_value = None
-        mock_get_recent_tour.return_value = self.tour2
         mock_step1_is_complete.return_value = False
 
         self.tour2.steps.add(self.step1)
 
-        # add user to tour
+        # add user to tour and complete it
         self.tour1.load_tour_class().add_user(self.test_user)
-        self.tour1.load_tour_class().add_user(self.test_user2)
         self.tour2.load_tour_class().add_user(self.test_user)
-        self.tour2.load_tour_class().add_user(self.test_user2)
+        self.tour1.load_tour_class().mark_complete(self.test_user)
+        self.tour2.load_tour_class().mark_complete(self.test_user)
 
         self.assertEqual(self.step1.url, Tour.objects.get_next_url(self.test_user))
-        self.assertEqual(1, mock_get_for_user.call_count)
-        self.assertEqual(1, mock_get_recent_tour.call_count)
 
     def test_get_next_url_no_user(self):
         """
@@ -207,3 +291,14 @@ class StepTest(TestCase):
         """
         step = G(Step, display_name='test1')
         self.assertEqual('test1', str(step))
+
+
+class TourStatusTest(TestCase):
+
+    def test_percent_complete(self):
+        """
+        Tests the percentage of complete steps of the progress summary
+        """
+        self.assertEqual(0, TourStatus().percent_complete)
+        self.assertEqual(50, TourStatus(num_complete_steps=2, num_steps=4).percent_complete)
+        self.assertEqual(100, TourStatus(complete=True).percent_complete)
@@ -0,0 +1,79 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError
+from django.test import TestCase
+from django_dynamic_fixture import G
+from mock import patch
+
+from tour.models import Step, Tour
+from tour.registry import clear_classes, load_class, preload_classes
+from tour.tests.mocks import MockStep1, MockTour
+
+
+class RegistryTest(TestCase):
+    """
+    Tests the process wide cache of tour and step classes
+    """
+    def setUp(self):
+        super(RegistryTest, self).setUp()
+        clear_classes()
+
+    def tearDown(self):
+        super(RegistryTest, self).tearDown()
+        clear_classes()
+
+    @patch('tour.registry.import_by_path', spec_set=True)
+    def test_load_class_cached(self, mock_import_by_path):
+        """
+        Verifies that a path is only imported once
+        :type mock_import_by_path: Mock
+        """
+        mock_import_by_path.return_value = MockTour
+
+        self.assertEqual(MockTour, load_class('tour.tests.mocks.MockTour'))
+        self.assertEqual(MockTour, load_class('tour.tests.mocks.MockTour'))
+        self.assertEqual(1, mock_import_by_path.call_count)
+
+    def test_load_class_bad_path(self):
+        """
+        Verifies that a bad path raises an error that names the tour and is not cached
+        """
+        tour = G(Tour, name='bad_tour', tour_class='tour.tests.mocks.MissingTour')
+        with self.assertRaisesRegexp(ImproperlyConfigured, 'bad_tour'):
+            tour.load_tour_class()
+        with self.assertRaises(ImproperlyConfigured):
+            load_class('tour.tests.mocks.MissingTour')
+
+    @patch('tour.registry.import_by_path', spec_set=True)
+    def test_preload_classes(self, mock_import_by_path):
+        """
+        Verifies that the given paths are imported ahead of time
+        :type mock_import_by_path: Mock
+        """
+        mock_import_by_path.return_value = MockTour
+        preload_classes(['tour.tests.mocks.MockTour'])
+        load_class('tour.tests.mocks.MockTour')
+        self.assertEqual(1, mock_import_by_path.call_count)
+
+    def test_preload_classes_from_database(self):
+        """
+        Verifies that the classes of all tours and steps are imported when no paths are given
+        """
+        tour = G(Tour, tour_class='tour.tests.mocks.MockTour')
+        G(Step, tour=tour, parent_step=None, step_class='tour.tests.mocks.MockStep1')
+        preload_classes()
+
+        with self.assertNumQueries(0):
+            with patch('tour.registry.import_by_path', spec_set=True) as mock_import_by_path:
+                self.assertEqual(MockTour, load_class('tour.tests.mocks.MockTour'))
+                self.assertEqual(MockStep1, load_class('tour.tests.mocks.MockStep1'))
+                self.assertFalse(mock_import_by_path.called)
+
+    @patch('tour.registry.import_by_path', spec_set=True)
+    def test_preload_classes_no_tables(self, mock_import_by_path):
+        """
+        Verifies that preloading is skipped when the tables do not exist
+        :type mock_import_by_path: Mock
+        """
+        with patch('tour.models.Tour.objects.values_list', side_effect=DatabaseError):
+            preload_classes()
+        self.assertFalse(mock_import_by_path.called)
@@ -1,5 +1,7 @@
+from mock import Mock
 from tour.serializers import TourSerializer, StepSerializer
 from tour.tests.tour_tests import BaseTourTest
+from tour.tours import StepTree
 
 
 class SerializerTest(BaseTourTest):
@@ -75,3 +77,29 @@ class SerializerTest(BaseTourTest):
                 'complete': False,
             }]
         })
+
+    def test_tour_serializer_context(self):
+        """
+        Verifies the steps and completion are read from the serializer context without any queries
+        """
+        self.tour1.steps.add(self.step1, self.step2, self.step3, self.step4)
+        self.step1.steps.add(self.step3, self.step4)
+        context = {
+            'step_tree': StepTree.load([self.tour1.id]),
+            'step_completion': {self.step1.id: True, self.step3.id: True},
+        }
+        with self.assertNumQueries(0):
+            data = TourSerializer(self.tour1, context=context).data
+        self.assertEqual([step['name'] for step in data['steps']], ['mock1', 'mock2'])
+        self.assertEqual([step['name'] for step in data['steps'][0]['steps']], ['mock3', 'mock4'])
+        self.assertEqual([step['complete'] for step in data['steps']], [True, False])
+        self.assertEqual([step['complete'] for step in data['steps'][0]['steps']], [True, False])
+
+    def test_step_serializer_request_context(self):
+        """
+        Verifies the completion is determined with the tour state of the request when it isn't in the context
+        """
+        self.tour1.steps.add(self.step1)
+        request = Mock(user=self.test_user)
+        self.assertTrue(StepSerializer(self.step1, context={'request': request}).data['complete'])
+        self.assertTrue(request.tour_state.values['step_completion'][self.step1.id])
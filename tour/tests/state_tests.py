@@ -0,0 +1,313 @@
+from django.contrib.auth.models import User
+from django.template import Context, Template
+from django_dynamic_fixture import G
+from mock import Mock, patch
+from rest_framework.request import Request
+
+from tour.cache import get_cache
+from tour.models import StepStatus, Tour, TourStatus
+from tour.state import TourState, get_tour_state
+from tour.tests.mocks import MockView
+from tour.tests.tour_tests import BaseTourTest
+
+
+class TourStateTest(BaseTourTest):
+    """
+    Tests the per request tour state
+    """
+    def setUp(self):
+        super(TourStateTest, self).setUp()
+        self.tour1.steps.add(self.step1, self.step2)
+
+    def test_get_tour_state(self):
+        """
+        Verifies that the same state is returned for a request until the user changes
+        """
+        mock_request = Mock(user=self.test_user)
+        tour_state = get_tour_state(mock_request)
+        self.assertIsInstance(tour_state, TourState)
+        self.assertEqual(tour_state, get_tour_state(mock_request))
+
+        mock_request.user = self.test_user2
+        self.assertNotEqual(tour_state, get_tour_state(mock_request))
+        self.assertEqual(self.test_user2, get_tour_state(mock_request).user)
+
+    def test_get_tour_state_rest_request(self):
+        """
+        Verifies that a rest framework request shares the state of the django request
+        """
+        mock_request = Mock(user=self.test_user)
+        tour_state = get_tour_state(mock_request)
+        self.assertEqual(tour_state, get_tour_state(Request(mock_request)))
+
+    def test_no_user(self):
+        """
+        Verifies that nothing is computed for an anonymous user
+        """
+        tour_state = TourState(User())
+        with self.assertNumQueries(0):
+            self.assertIsNone(tour_state.active_tour)
+            self.assertIsNone(tour_state.recent_tour)
+            self.assertIsNone(tour_state.tour)
+            self.assertIsNone(tour_state.tour_class)
+            self.assertEqual([], tour_state.steps)
+            self.assertIsNone(tour_state.current_step)
+            self.assertIsNone(tour_state.next_url)
+
+    @patch('tour.tests.mocks.MockStep2.is_complete', spec_set=True)
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_values_computed_once(self, mock_step1_is_complete, mock_step2_is_complete):
+        """
+        Verifies that the tour, steps and step completion are only computed once
+        :type mock_step1_is_complete: Mock
+        :type mock_step2_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = True
+        mock_step2_is_complete.return_value = False
+        self.tour1.load_tour_class().add_user(self.test_user)
+
+        tour_state = TourState(self.test_user)
+        self.assertEqual(self.tour1, tour_state.tour)
+        self.assertEqual(self.tour1, tour_state.tour_class.tour)
+        self.assertEqual([self.step1, self.step2], tour_state.steps)
+        self.assertEqual(self.step2, tour_state.current_step)
+        self.assertEqual('mock2', tour_state.next_url)
+        self.assertEqual(['mock1', 'mock2'], tour_state.get_url_list(self.tour1))
+        mock_step1_is_complete.reset_mock()
+        mock_step2_is_complete.reset_mock()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.tour1, tour_state.tour)
+            self.assertEqual(self.step2, tour_state.current_step)
+            self.assertTrue(tour_state.is_step_complete(self.step1))
+            self.assertFalse(tour_state.is_step_complete(self.step2))
+        self.assertFalse(mock_step1_is_complete.called)
+        self.assertFalse(mock_step2_is_complete.called)
+
+    @patch('tour.tests.mocks.MockTour.is_complete', spec_set=True)
+    def test_tour_class_is_complete(self, mock_is_complete):
+        """
+        Verifies that tours are completed according to the is_complete method of the tour class
+        :type mock_is_complete: Mock
+        """
+        mock_is_complete.return_value = True
+        self.tour1.load_tour_class().add_user(self.test_user)
+
+        tour_state = TourState(self.test_user)
+        tour_state.complete_tours()
+        self.assertTrue(TourStatus.objects.get(tour=self.tour1, user=self.test_user).complete)
+        self.assertEqual(1, mock_is_complete.call_count)
+
+        mock_is_complete.return_value = False
+        self.tour1.load_tour_class().add_user(self.test_user)
+        self.assertEqual(self.tour1, TourState(self.test_user).active_tour)
+
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    @patch('tour.tests.mocks.MockTour.get_current_step', spec_set=True)
+    def test_tour_class_get_current_step(self, mock_get_current_step, mock_step1_is_complete):
+        """
+        Verifies that the current step comes from the get_current_step method of the tour class
+        :type mock_get_current_step: Mock
+        :type mock_step1_is_complete: Mock
+        """
+        mock_get_current_step.return_value = None
+        mock_step1_is_complete.return_value = False
+        self.tour1.load_tour_class().add_user(self.test_user)
+
+        tour_state = TourState(self.test_user)
+        self.assertIsNone(tour_state.get_current_step(self.tour1))
+        self.assertEqual(self.tour1.complete_url, tour_state.get_next_url(self.tour1))
+        self.assertFalse(mock_step1_is_complete.called)
+
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_progress_changed(self, mock_step1_is_complete):
+        """
+        Verifies that the state is recalculated when the tour progress changes during the request
+        :type mock_step1_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = False
+        self.tour1.load_tour_class().add_user(self.test_user)
+
+        tour_state = TourState(self.test_user)
+        self.assertEqual(self.tour1, tour_state.active_tour)
+
+        self.tour1.load_tour_class().mark_complete(self.test_user)
+        self.assertIsNone(tour_state.active_tour)
+        self.assertEqual(self.tour1, tour_state.recent_tour)
+        self.assertEqual('mock1', tour_state.next_url)
+
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_invalidate(self, mock_step1_is_complete):
+        """
+        Verifies that step completion is recalculated after the state is invalidated
+        :type mock_step1_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = False
+        self.tour1.load_tour_class().add_user(self.test_user)
+
+        tour_state = TourState(self.test_user)
+        self.assertEqual(self.step1, tour_state.current_step)
+
+        mock_step1_is_complete.return_value = True
+        self.assertEqual(self.step1, tour_state.current_step)
+        tour_state.invalidate()
+        self.assertIsNone(tour_state.current_step)
+
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_shared_by_view_and_template_tag(self, mock_step1_is_complete):
+        """
+        Verifies that the view mixin and the template tag only compute the tour state once per request
+        :type mock_step1_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = False
+        self.tour1.load_tour_class().add_user(self.test_user)
+
+        mock_request = Mock(user=self.test_user, path='mock1', method='get', GET={})
+        self.assertEqual(200, MockView(request=mock_request).dispatch(mock_request).status_code)
+        self.assertEqual(1, mock_step1_is_complete.call_count)
+
+        # the tour and steps are already loaded so rendering doesn't have to load them again
+        template = Template('{% load tour_tags %}{% tour_navigation %}')
+        self.assertTrue('tour-wrap' in template.render(Context({'request': mock_request})))
+        self.assertEqual(1, mock_step1_is_complete.call_count)
+
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_view_post_invalidates(self, mock_step1_is_complete):
+        """
+        Verifies that the state is recalculated after a view that may change progress
+        :type mock_step1_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = False
+        self.tour1.load_tour_class().add_user(self.test_user)
+
+        mock_request = Mock(user=self.test_user, path='mock1', method='post', GET={})
+        tour_state = get_tour_state(mock_request)
+        self.assertEqual(self.step1, tour_state.current_step)
+
+        mock_step1_is_complete.return_value = True
+        MockView(request=mock_request).dispatch(mock_request)
+        self.assertIsNone(tour_state.current_step)
+
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_persisted_step_progress(self, mock_step1_is_complete):
+        """
+        Verifies that the completion of steps comes from the recorded progress of tours that persist it
+        :type mock_step1_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = True
+        self.tour1.tour_class = 'tour.tests.mocks.MockPersistedTour'
+        self.tour1.save()
+        self.tour1.load_tour_class().add_user(self.test_user)
+        self.tour1.load_tour_class().get_current_step(self.test_user)
+
+        tour_state = TourState(self.test_user)
+        # The steps come from the tour snapshot loaded by the first evaluation. Finding the tour afterwards flags
+        # it as complete with the progress that was already loaded and then loads the tour status with its tour.
+        with self.assertNumQueries(4):
+            self.assertTrue(tour_state.is_step_complete(self.step1))
+            self.assertTrue(tour_state.is_step_complete(self.step2))
+            self.assertIsNone(tour_state.get_current_step(self.tour1))
+            self.assertEqual(self.tour1, tour_state.recent_tour)
+        self.assertEqual(1, mock_step1_is_complete.call_count)
+
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_serializer_context(self, mock_step1_is_complete):
+        """
+        Verifies the steps and recorded progress of several tours are loaded together for the serializer context
+        :type mock_step1_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = False
+        self.tour1.tour_class = 'tour.tests.mocks.MockPersistedTour'
+        self.tour1.save()
+        self.tour1.steps.add(self.step1, self.step2)
+        self.tour2.steps.add(self.step3)
+        G(StepStatus, step=self.step1, user=self.test_user, complete=False)
+
+        tour_state = TourState(self.test_user)
+        with self.assertNumQueries(2):
+            context = tour_state.get_serializer_context([self.tour1, self.tour2])
+        self.assertEqual(context['step_tree'].get_tour_steps(self.tour1.id), [self.step1, self.step2])
+        self.assertEqual(context['step_tree'].get_tour_steps(self.tour2.id), [self.step3])
+        self.assertEqual(context['step_completion'], {
+            self.step1.id: False,
+            self.step2.id: False,
+            self.step3.id: True,
+        })
+        self.assertEqual({self.step1.id: False}, tour_state.get_step_progress(self.tour1))
+
+        # Tours that were already loaded are not queried again
+        with self.assertNumQueries(0):
+            tour_state.prefetch_steps([self.tour1, self.tour2])
+
+        # Creating a tour reloads the snapshot, and tours without steps are missing from it so their steps are loaded
+        tour3 = G(Tour, name='tour3', tour_class='tour.tests.mocks.MockParallelTour')
+        with self.assertNumQueries(2):
+            step_tree = tour_state.prefetch_steps([self.tour1, tour3])
+        self.assertEqual([], step_tree.get_tour_steps(tour3.id))
+        self.assertEqual([self.step1, self.step2], step_tree.get_tour_steps(self.tour1.id))
+
+    @patch('tour.tests.mocks.MockStep2.is_complete', spec_set=True)
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_parallel_step_checks(self, mock_step1_is_complete, mock_step2_is_complete):
+        """
+        Verifies that the completion of steps checked in parallel is memoized
+        :type mock_step1_is_complete: Mock
+        :type mock_step2_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = True
+        mock_step2_is_complete.return_value = False
+        self.tour1.tour_class = 'tour.tests.mocks.MockParallelTour'
+        self.tour1.save()
+        self.tour1.steps.add(self.step1, self.step2, self.step3)
+
+        tour_state = TourState(self.test_user)
+        self.assertEqual(self.step2, tour_state.get_current_step(self.tour1))
+        context = tour_state.get_serializer_context([self.tour1])
+        self.assertEqual({self.step1.id: True, self.step2.id: False, self.step3.id: True}, context['step_completion'])
+        self.assertEqual(1, mock_step1_is_complete.call_count)
+        self.assertEqual(1, mock_step2_is_complete.call_count)
+
+    @patch('tour.tests.mocks.MockStep2.is_complete', spec_set=True)
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_progress_summary(self, mock_step1_is_complete, mock_step2_is_complete):
+        """
+        Verifies that the progress summary is saved when the state evaluates the current step
+        :type mock_step1_is_complete: Mock
+        :type mock_step2_is_complete: Mock
+        """
+        get_cache().clear()
+        mock_step1_is_complete.return_value = True
+        mock_step2_is_complete.return_value = False
+        self.tour1.tour_class = 'tour.tests.mocks.MockSummaryTour'
+        self.tour1.save()
+        self.tour1.steps.add(self.step1, self.step2, self.step3)
+        self.tour1.load_tour_class().add_user(self.test_user)
+
+        self.assertEqual(self.step2, TourState(self.test_user).get_current_step(self.tour1))
+        tour_status = TourStatus.objects.get(user=self.test_user)
+        self.assertEqual((self.step2.id, 1, 3), (
+            tour_status.current_step_id, tour_status.num_complete_steps, tour_status.num_steps))
+
+    @patch('tour.tests.mocks.MockStep2.is_complete', spec_set=True)
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_monotonic_steps(self, mock_step1_is_complete, mock_step2_is_complete):
+        """
+        Verifies that steps before the progress hint of monotonic tours are not checked
+        :type mock_step1_is_complete: Mock
+        :type mock_step2_is_complete: Mock
+        """
+        get_cache().clear()
+        mock_step1_is_complete.return_value = True
+        mock_step2_is_complete.return_value = False
+        self.tour1.tour_class = 'tour.tests.mocks.MockMonotonicTour'
+        self.tour1.save()
+        self.tour1.steps.add(self.step1, self.step2, self.step3)
+
+        self.assertEqual(self.step2, TourState(self.test_user).get_current_step(self.tour1))
+        tour_state = TourState(self.test_user)
+        self.assertEqual(self.step2, tour_state.get_current_step(self.tour1))
+        self.assertTrue(tour_state.is_step_complete(self.step1))
+        self.assertFalse(tour_state.is_step_complete(self.step2))
+        self.assertTrue(tour_state.is_step_complete(self.step3))
+        self.assertEqual(1, mock_step1_is_complete.call_count)
+        self.assertEqual(2, mock_step2_is_complete.call_count)
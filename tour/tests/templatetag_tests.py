@@ -1,7 +1,12 @@
 from django.contrib.auth.models import User
+from django.http import QueryDict
 from django.template import Template, Context
+from django.template.loader import get_template
+from django.test.utils import override_settings
 from mock import Mock, patch
 
+from tour.cache import get_cache
+from tour.templatetags.tour_tags import TourNavNode
 from tour.tests.tour_tests import BaseTourTest
 
 
@@ -138,6 +143,26 @@ class TemplateTagTest(BaseTourTest):
         })
         self.assertTrue('tour-wrap' in self.test_template.render(context))
 
+    def test_always_display_request_untouched(self):
+        """
+        Verifies the always_show flag is passed on without copying or changing the query parameters
+        """
+        self.test_template = Template(
+            '{% load tour_tags %}{% tour_navigation always_show=True %}{% if tour_always_show %}shown{% endif %}')
+        self.tour1.load_tour_class().add_user(self.test_user)
+        query_dict = QueryDict('page=1')
+        request = Mock(user=self.test_user, path='/mock/path', method='get', GET=query_dict)
+        with patch.object(QueryDict, '__deepcopy__', autospec=True) as mock_deepcopy, \
+                patch.object(QueryDict, 'copy', autospec=True) as mock_copy:
+            rendered = self.test_template.render(Context({'request': request}))
+        self.assertTrue('tour-wrap' in rendered)
+        self.assertTrue(rendered.endswith('shown'))
+        self.assertIs(query_dict, request.GET)
+        self.assertEqual({'page': ['1']}, dict(request.GET.lists()))
+        self.assertFalse(mock_deepcopy.called)
+        self.assertFalse(mock_copy.called)
+        self.assertTrue(request.tour_always_show)
+
     def test_missing_request(self):
         """
         Verify no errors for missing request object
@@ -255,3 +280,108 @@ class TemplateTagTest(BaseTourTest):
         # remove new lines
         rendered_content = rendered_content.replace('\n', '')
         return rendered_content
+
+
+@override_settings(TOUR_NAVIGATION_CACHE_TIMEOUT=60)
+class TemplateTagCacheTest(BaseTourTest):
+    """
+    Tests caching the rendered tour navigation
+    """
+    def setUp(self):
+        super(TemplateTagCacheTest, self).setUp()
+        get_cache().clear()
+        self.test_template = Template('{% load tour_tags %}{% tour_navigation %}')
+        self.tour1.steps.add(self.step1, self.step2, self.step3, self.step4)
+
+    def tearDown(self):
+        super(TemplateTagCacheTest, self).tearDown()
+        get_cache().clear()
+
+    def render(self, path='mock1', template=None):
+        context = Context({
+            'request': Mock(user=self.test_user, path=path, method='get', GET={}),
+        })
+        return (template or self.test_template).render(context)
+
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_cached(self, mock_step1_is_complete):
+        """
+        Verifies the navigation is rendered once per user and path
+        :type mock_step1_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = False
+        self.tour1.load_tour_class().add_user(self.test_user)
+        rendered = self.render()
+        self.assertTrue('tour-wrap' in rendered)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(rendered, self.render())
+        self.assertEqual(1, mock_step1_is_complete.call_count)
+
+        # Other paths and the always_show flag are cached separately
+        self.assertNotEqual(rendered, self.render(path='mock2'))
+        always_show_template = Template('{% load tour_tags %}{% tour_navigation always_show=True %}')
+        self.render(template=always_show_template)
+        self.assertEqual(3, mock_step1_is_complete.call_count)
+        with self.assertNumQueries(0):
+            self.render(template=always_show_template)
+
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_invalidated_by_progress(self, mock_step1_is_complete):
+        """
+        Verifies the navigation is rendered again when the tours or progress of the user change
+        :type mock_step1_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = False
+        self.assertEqual('', self.render().strip())
+
+        self.tour1.load_tour_class().add_user(self.test_user)
+        self.assertTrue('tour-wrap' in self.render())
+
+        mock_step1_is_complete.return_value = True
+        self.assertTrue('tour-wrap' in self.render())
+        self.tour1.load_tour_class().mark_complete(self.test_user)
+        self.assertEqual('', self.render().strip())
+
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_invalidated_by_steps(self, mock_step1_is_complete):
+        """
+        Verifies the navigation is rendered again when a step changes
+        :type mock_step1_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = False
+        self.tour1.load_tour_class().add_user(self.test_user)
+        self.assertTrue('Mock Step 1' in self.render())
+
+        self.step1.display_name = 'Changed Step 1'
+        self.step1.save()
+        self.assertTrue('Changed Step 1' in self.render())
+
+    def test_template_loaded_once(self):
+        """
+        Verifies the navigation template is only loaded once
+        """
+        self.tour1.load_tour_class().add_user(self.test_user)
+        TourNavNode.tour_template = None
+        with patch('tour.templatetags.tour_tags.get_template', wraps=get_template) as mock_get_template:
+            self.render()
+            self.render(path='mock2')
+        self.assertEqual(1, mock_get_template.call_count)
+
+    def test_template_reloaded(self):
+        """
+        Verifies the navigation template is loaded again when the template settings change, and every time when
+        DEBUG is on
+        """
+        self.tour1.load_tour_class().add_user(self.test_user)
+        self.render()
+        self.assertIsNotNone(TourNavNode.tour_template)
+        with override_settings(TEMPLATE_DIRS=()):
+            self.assertIsNone(TourNavNode.tour_template)
+
+        with override_settings(DEBUG=True):
+            with patch('tour.templatetags.tour_tags.get_template', wraps=get_template) as mock_get_template:
+                self.render()
+                self.render(path='mock2')
+        self.assertEqual(2, mock_get_template.call_count)
+        self.assertIsNone(TourNavNode.tour_template)
@@ -1,9 +1,17 @@
+import threading
+import time
+
 from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
 from django.test import TestCase
+from django.test.utils import override_settings
 from django_dynamic_fixture import G
-from mock import patch
+from mock import Mock, patch
 
-from tour.models import Tour, Step, TourStatus
+from tour.cache import get_cache, invalidate_definitions
+from tour.executors import DatabaseThreadPoolExecutor
+from tour.models import Tour, Step, StepStatus, TourStatus
+from tour.tours import StepTree, get_step_tree, get_tour_snapshot
 
 
 class BaseTourTest(TestCase):
@@ -80,6 +88,39 @@ class TourTest(BaseTourTest):
         expected_steps = [self.step1, self.step4, self.step3, self.step2]
         self.assertEqual(expected_steps, self.tour1.load_tour_class().get_steps())
 
+    def test_get_steps_depth(self):
+        """
+        Verifies that the depth limits how many levels of nested steps are returned
+        """
+        self.tour1.steps.add(self.step1, self.step2, self.step3, self.step4)
+        self.step1.steps.add(self.step3)
+        self.step3.steps.add(self.step4)
+        tour1_class = self.tour1.load_tour_class()
+
+        self.assertEqual([self.step1, self.step2], tour1_class.get_steps(0))
+        self.assertEqual([self.step1, self.step3, self.step2], tour1_class.get_steps(1))
+        self.assertEqual([self.step1, self.step3, self.step4, self.step2], tour1_class.get_steps())
+
+    def test_get_steps_num_queries(self):
+        """
+        Verifies that the nested steps are loaded with a single query
+        """
+        self.tour1.steps.add(self.step1, self.step2, self.step3, self.step4)
+        self.step1.steps.add(self.step3)
+        self.step3.steps.add(self.step4)
+        tour1_class = self.tour1.load_tour_class()
+
+        with self.assertNumQueries(1):
+            tour1_class.get_steps()
+
+        # The snapshot is used until a step changes
+        with self.assertNumQueries(0):
+            self.assertEqual([self.step1, self.step3, self.step4, self.step2], tour1_class.get_steps())
+        self.step2.sort_order = -1
+        self.step2.save()
+        with self.assertNumQueries(1):
+            self.assertEqual([self.step2, self.step1, self.step3, self.step4], tour1_class.get_steps())
+
     def test_get_url_list(self):
         """
         Verifies that the tour returns the correct step url list
@@ -88,6 +129,54 @@ class TourTest(BaseTourTest):
         expected_url_list = ['mock1', 'mock2']
         self.assertEqual(expected_url_list, self.tour1.load_tour_class().get_url_list())
 
+    @patch('tour.tests.mocks.MockStep3.url_name', 'mock:step3')
+    def test_get_url_index(self):
+        """
+        Verifies that the url index maps the urls and url names of the steps to their position
+        """
+        self.tour1.steps.add(self.step1, self.step2, self.step3, self.step5)
+        self.step1.steps.add(self.step2)
+        url_index = self.tour1.load_tour_class().get_url_index()
+        self.assertEqual({'mock1': 0, 'mock2': 1, 'mock3': 2}, url_index.paths)
+        self.assertEqual({'mock:step3': 2}, url_index.names)
+        self.assertEqual(1, url_index.get_position('mock2'))
+        self.assertEqual(-1, url_index.get_position('mock-fake'))
+        self.assertEqual(-1, url_index.get_position(None))
+        self.assertEqual(0, url_index.get_request_position(Mock(path='mock1')))
+        self.assertEqual(2, url_index.get_request_position(
+            Mock(path='mock3/5', resolver_match=Mock(view_name='mock:step3'))))
+        self.assertEqual(-1, url_index.get_request_position(
+            Mock(path='mock-fake', resolver_match=Mock(view_name='mock:fake'))))
+        self.assertEqual(-1, url_index.get_request_position(Mock(path='mock-fake', resolver_match=None)))
+
+    def test_get_url_index_cached(self):
+        """
+        Verifies that the url index is cached until a tour or step changes
+        """
+        get_cache().clear()
+        self.tour1.steps.add(self.step1, self.step2)
+        url_index = self.tour1.load_tour_class().get_url_index()
+        self.assertEqual({'mock1': 0, 'mock2': 1}, url_index.paths)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(url_index.paths, self.tour1.load_tour_class().get_url_index().paths)
+
+        # Moving a step to another tour rebuilds the indexes of both tours
+        self.tour2.load_tour_class().get_url_index()
+        self.tour2.steps.add(self.step1)
+        self.assertEqual({'mock2': 0}, self.tour1.load_tour_class().get_url_index().paths)
+        self.assertEqual({'mock1': 0}, self.tour2.load_tour_class().get_url_index().paths)
+
+        self.step2.delete()
+        self.assertEqual({}, self.tour1.load_tour_class().get_url_index().paths)
+
+        # Updates that don't send signals need to invalidate the indexes
+        self.assertEqual({'mock1': 0}, self.tour2.load_tour_class().get_url_index().paths)
+        Step.objects.filter(id=self.step1.id).update(url='mock-updated')
+        self.assertEqual({'mock1': 0}, self.tour2.load_tour_class().get_url_index().paths)
+        invalidate_definitions()
+        self.assertEqual({'mock-updated': 0}, self.tour2.load_tour_class().get_url_index().paths)
+
     def test_add_user(self):
         """
         Verifies that a user is linked to a tour properly and that the correct tour is returned
@@ -110,6 +199,71 @@ class TourTest(BaseTourTest):
         self.assertEqual(2, TourStatus.objects.count())
         self.assertEqual(1, TourStatus.objects.filter(complete=False).count())
 
+    def test_add_users(self):
+        """
+        Verifies that users are added in batches and users with an incomplete status or that don't exist are skipped
+        """
+        test_user3 = User.objects.create_user('test3', 'test3@gmail.com', 'test3')
+        tour1_class = self.tour1.load_tour_class()
+        tour1_class.add_user(self.test_user)
+
+        users = [self.test_user, self.test_user2.id, test_user3, test_user3.id, 0]
+        # each batch selects the statuses and users, and inserts the statuses in a savepoint
+        with self.assertNumQueries(12):
+            counts = tour1_class.add_users(users, batch_size=2)
+        self.assertEqual({'added': 2, 'skipped': 3}, counts)
+        self.assertEqual(
+            set([self.test_user.id, self.test_user2.id, test_user3.id]),
+            set(TourStatus.objects.filter(tour=self.tour1, complete=False).values_list('user_id', flat=True)))
+
+    def test_add_users_queryset(self):
+        """
+        Verifies that the users of a queryset are added and that completed tours are started again
+        """
+        tour1_class = self.tour1.load_tour_class()
+        tour1_class.add_user(self.test_user)
+        tour1_class.mark_complete(self.test_user)
+
+        self.assertEqual({'added': 2, 'skipped': 0}, tour1_class.add_users(User.objects.all()))
+        self.assertEqual({'added': 0, 'skipped': 2}, tour1_class.add_users(User.objects.all()))
+        self.assertEqual(2, TourStatus.objects.filter(tour=self.tour1, complete=False).count())
+
+    def test_add_users_concurrent(self):
+        """
+        Verifies that a batch is checked again if another process added some of the users first
+        """
+        tour1_class = self.tour1.load_tour_class()
+        TourStatus.objects.create(tour=self.tour1, user=self.test_user)
+
+        # the first check for existing statuses misses the status added by the other process
+        tour_status_filter = TourStatus.objects.filter
+        side_effect = [lambda **kwargs: TourStatus.objects.none(), tour_status_filter]
+        with patch('tour.tours.TourStatus.objects.filter', side_effect=lambda **kwargs: side_effect.pop(0)(**kwargs)):
+            counts = tour1_class.add_users([self.test_user, self.test_user2])
+
+        self.assertEqual({'added': 1, 'skipped': 1}, counts)
+        self.assertEqual(2, TourStatus.objects.filter(tour=self.tour1, complete=False).count())
+
+    def test_add_users_integrity_error(self):
+        """
+        Verifies that an integrity error is raised if the batch fails again
+        """
+        with patch('tour.tours.TourStatus.objects.bulk_create', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                self.tour1.load_tour_class().add_users([self.test_user])
+
+    def test_incomplete_status_unique(self):
+        """
+        Verifies that only one incomplete status can exist per tour and user
+        """
+        TourStatus.objects.create(tour=self.tour1, user=self.test_user, complete=True)
+        TourStatus.objects.create(tour=self.tour1, user=self.test_user, complete=True)
+        TourStatus.objects.create(tour=self.tour1, user=self.test_user)
+        TourStatus.objects.create(tour=self.tour2, user=self.test_user)
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                TourStatus.objects.create(tour=self.tour1, user=self.test_user)
+
     def test_mark_complete(self):
         """
         Verifies that a tour status record will be marked as complete for a user
@@ -167,6 +321,285 @@ class TourTest(BaseTourTest):
         mock_step2_is_complete.return_value = True
         self.assertIsNone(tour1_class.get_current_step(self.test_user))
 
+    @patch('tour.tests.mocks.MockStep2.is_complete', spec_set=True)
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_get_current_step_persisted(self, mock_step1_is_complete, mock_step2_is_complete):
+        """
+        Verifies that recorded step progress is used instead of evaluating completed steps again
+        :type mock_step1_is_complete: Mock
+        :type mock_step2_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = False
+        mock_step2_is_complete.return_value = False
+
+        self.tour1.tour_class = 'tour.tests.mocks.MockPersistedTour'
+        self.tour1.steps.add(self.step1, self.step2)
+        tour1_class = self.tour1.load_tour_class()
+
+        self.assertEqual(self.step1, tour1_class.get_current_step(self.test_user))
+        self.assertEqual(0, StepStatus.objects.count())
+
+        # completing the first step records it
+        mock_step1_is_complete.return_value = True
+        self.assertEqual(self.step2, tour1_class.get_current_step(self.test_user))
+        step_status = StepStatus.objects.get()
+        self.assertEqual((self.step1, self.test_user, True), (step_status.step, step_status.user, step_status.complete))
+        self.assertIsNotNone(step_status.complete_time)
+
+        # the recorded step is not evaluated again
+        mock_step1_is_complete.reset_mock()
+        mock_step1_is_complete.return_value = False
+        with self.assertNumQueries(1):
+            self.assertEqual(self.step2, tour1_class.get_current_step(self.test_user))
+        self.assertFalse(mock_step1_is_complete.called)
+        self.assertEqual({self.step1.id: True}, tour1_class.get_step_progress(self.test_user))
+        self.assertEqual({}, tour1_class.get_step_progress(self.test_user2))
+
+        # a live check evaluates every step and updates the recorded progress
+        self.assertEqual(self.step1, tour1_class.get_current_step(self.test_user, live=True))
+        self.assertEqual({self.step1.id: False}, tour1_class.get_step_progress(self.test_user))
+
+        mock_step1_is_complete.return_value = True
+        self.assertEqual(self.step2, tour1_class.get_current_step(self.test_user))
+        self.assertEqual({self.step1.id: True}, tour1_class.get_step_progress(self.test_user))
+
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_record_step_progress_concurrent(self, mock_step1_is_complete):
+        """
+        Verifies that steps already recorded by another request are updated
+        :type mock_step1_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = True
+
+        self.tour1.tour_class = 'tour.tests.mocks.MockPersistedTour'
+        self.tour1.steps.add(self.step1)
+        tour1_class = self.tour1.load_tour_class()
+        G(StepStatus, step=self.step1, user=self.test_user, complete=False)
+
+        self.assertIsNone(tour1_class.get_current_step(self.test_user, step_progress={}))
+        self.assertEqual({self.step1.id: True}, tour1_class.get_step_progress(self.test_user))
+
+    @patch('tour.tests.mocks.MockStep3.is_complete', spec_set=True)
+    @patch('tour.tests.mocks.MockStep2.is_complete', spec_set=True)
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_get_current_step_parallel(self, mock_step1_is_complete, mock_step2_is_complete, mock_step3_is_complete):
+        """
+        Verifies that tours with parallel step checks check the steps at the same time and return the first
+        incomplete step
+        :type mock_step1_is_complete: Mock
+        :type mock_step2_is_complete: Mock
+        :type mock_step3_is_complete: Mock
+        """
+        step3_checked = threading.Event()
+
+        def wait_for_step3(user=None):
+            # Only finishes as complete if step 3 is checked at the same time
+            return step3_checked.wait(5)
+
+        def check_step3(user=None):
+            step3_checked.set()
+            return False
+
+        mock_step1_is_complete.side_effect = wait_for_step3
+        mock_step2_is_complete.return_value = False
+        mock_step3_is_complete.side_effect = check_step3
+        self.tour1.tour_class = 'tour.tests.mocks.MockParallelTour'
+        self.tour1.steps.add(self.step1, self.step2, self.step3)
+        tour1_class = self.tour1.load_tour_class()
+
+        self.assertEqual(self.step2, tour1_class.get_current_step(self.test_user))
+        self.assertTrue(mock_step3_is_complete.called)
+
+        mock_step2_is_complete.return_value = True
+        self.assertEqual(self.step3, tour1_class.get_current_step(self.test_user))
+        mock_step3_is_complete.side_effect = None
+        mock_step3_is_complete.return_value = True
+        self.assertIsNone(tour1_class.get_current_step(self.test_user))
+
+    @patch('tour.tests.mocks.MockStep2.is_complete', spec_set=True)
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_get_current_step_parallel_timeout(self, mock_step1_is_complete, mock_step2_is_complete):
+        """
+        Verifies that steps that take longer than the timeout are considered incomplete
+        :type mock_step1_is_complete: Mock
+        :type mock_step2_is_complete: Mock
+        """
+        release = threading.Event()
+        mock_step1_is_complete.return_value = True
+        mock_step2_is_complete.side_effect = lambda user=None: release.wait(5)
+        self.tour1.tour_class = 'tour.tests.mocks.MockParallelTour'
+        self.tour1.steps.add(self.step1, self.step2, self.step3)
+        tour1_class = self.tour1.load_tour_class()
+        tour1_class.step_check_timeout = 0.05
+        try:
+            self.assertEqual(self.step2, tour1_class.get_current_step(self.test_user))
+        finally:
+            release.set()
+
+    @patch('tour.tests.mocks.MockStep3.is_complete', spec_set=True)
+    @patch('tour.tests.mocks.MockStep2.is_complete', spec_set=True)
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_get_current_step_parallel_timeout_queued(
+            self, mock_step1_is_complete, mock_step2_is_complete, mock_step3_is_complete):
+        """
+        Verifies that the timeout of each check starts when it runs, so checks waiting for a free thread get the
+        same answer as checking the steps in order
+        :type mock_step1_is_complete: Mock
+        :type mock_step2_is_complete: Mock
+        :type mock_step3_is_complete: Mock
+        """
+        for mock_is_complete in (mock_step1_is_complete, mock_step2_is_complete, mock_step3_is_complete):
+            mock_is_complete.side_effect = lambda user=None: time.sleep(0.05) is None
+        self.tour1.tour_class = 'tour.tests.mocks.MockParallelTour'
+        self.tour1.steps.add(self.step1, self.step2, self.step3)
+        tour1_class = self.tour1.load_tour_class()
+        tour1_class.step_check_timeout = 0.08
+        executor = DatabaseThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        with patch('tour.executors.get_step_check_executor', return_value=executor):
+            self.assertIsNone(tour1_class.get_current_step(self.test_user))
+
+    @patch('tour.tests.mocks.MockStep2.is_complete', spec_set=True)
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_get_current_step_parallel_error(self, mock_step1_is_complete, mock_step2_is_complete):
+        """
+        Verifies that errors are raised for the same steps as when checking the steps in order
+        :type mock_step1_is_complete: Mock
+        :type mock_step2_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = False
+        mock_step2_is_complete.side_effect = ValueError
+        self.tour1.tour_class = 'tour.tests.mocks.MockParallelTour'
+        self.tour1.steps.add(self.step1, self.step2)
+        tour1_class = self.tour1.load_tour_class()
+        self.assertEqual(self.step1, tour1_class.get_current_step(self.test_user))
+
+        mock_step1_is_complete.return_value = True
+        with self.assertRaises(ValueError):
+            tour1_class.get_current_step(self.test_user)
+
+    @patch('tour.tests.mocks.MockStep2.is_complete', spec_set=True)
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_iter_step_completion_shared(self, mock_step1_is_complete, mock_step2_is_complete):
+        """
+        Verifies that steps in the shared step completion are not checked again and the other steps are added to it,
+        with the steps checked in order or in parallel
+        :type mock_step1_is_complete: Mock
+        :type mock_step2_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = True
+        mock_step2_is_complete.return_value = False
+        self.tour1.steps.add(self.step1, self.step2, self.step3)
+        for tour_class_path in ('tour.tests.mocks.MockTour', 'tour.tests.mocks.MockParallelTour'):
+            mock_step1_is_complete.reset_mock()
+            mock_step2_is_complete.reset_mock()
+            self.tour1.tour_class = tour_class_path
+            tour1_class = self.tour1.load_tour_class()
+            tour1_class.step_completion = {self.step2.id: True}
+
+            self.assertEqual(
+                [(self.step1, True), (self.step2, True), (self.step3, True)],
+                list(tour1_class.iter_step_completion(self.test_user, [self.step1, self.step2, self.step3])))
+            self.assertEqual(
+                {self.step1.id: True, self.step2.id: True, self.step3.id: True}, tour1_class.step_completion)
+            self.assertIsNone(tour1_class.get_current_step(self.test_user))
+            self.assertEqual(1, mock_step1_is_complete.call_count)
+            self.assertFalse(mock_step2_is_complete.called)
+
+            # Checking the steps ignores the shared step completion
+            self.assertEqual(
+                [(self.step1, True), (self.step2, False)],
+                list(tour1_class.check_step_completion(self.test_user, [self.step1, self.step2])))
+
+    @patch('tour.tests.mocks.MockStep2.is_complete', spec_set=True)
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_get_current_step_monotonic(self, mock_step1_is_complete, mock_step2_is_complete):
+        """
+        Verifies that monotonic tours resume checking from the step that was current the last time
+        :type mock_step1_is_complete: Mock
+        :type mock_step2_is_complete: Mock
+        """
+        get_cache().clear()
+        mock_step1_is_complete.return_value = True
+        mock_step2_is_complete.return_value = False
+        self.tour1.tour_class = 'tour.tests.mocks.MockMonotonicTour'
+        self.tour1.steps.add(self.step1, self.step2, self.step3)
+        tour1_class = self.tour1.load_tour_class()
+
+        self.assertEqual(self.step2, tour1_class.get_current_step(self.test_user))
+        self.assertEqual(1, tour1_class.get_progress_hint(self.test_user)[1])
+        self.assertEqual(0, tour1_class.get_progress_hint(self.test_user2)[1])
+        self.assertEqual(1, mock_step1_is_complete.call_count)
+
+        # Only the frontier step is checked
+        mock_step1_is_complete.return_value = False
+        self.assertEqual(self.step2, tour1_class.get_current_step(self.test_user))
+        self.assertFalse(tour1_class.is_complete(self.test_user))
+        self.assertEqual(1, mock_step1_is_complete.call_count)
+        self.assertEqual(3, mock_step2_is_complete.call_count)
+
+        # A live check starts from the first step
+        self.assertEqual(self.step1, tour1_class.get_current_step(self.test_user, live=True))
+        self.assertEqual(0, tour1_class.get_progress_hint(self.test_user)[1])
+
+        mock_step1_is_complete.return_value = True
+        mock_step2_is_complete.return_value = True
+        self.assertIsNone(tour1_class.get_current_step(self.test_user))
+        self.assertEqual(3, tour1_class.get_progress_hint(self.test_user)[1])
+
+        # Changing the steps forgets the hints
+        self.step2.sort_order = 5
+        self.step2.save()
+        self.assertEqual(0, tour1_class.get_progress_hint(self.test_user)[1])
+
+        # Tours that aren't monotonic and anonymous users don't have hints
+        self.assertEqual((None, 0), self.tour2.load_tour_class().get_progress_hint(self.test_user))
+        self.assertEqual((None, 0), tour1_class.get_progress_hint(User()))
+
+    @patch('tour.tests.mocks.MockStep2.is_complete', spec_set=True)
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_get_current_step_progress_summary(self, mock_step1_is_complete, mock_step2_is_complete):
+        """
+        Verifies that the progress summary is saved to the incomplete tour status when it changes
+        :type mock_step1_is_complete: Mock
+        :type mock_step2_is_complete: Mock
+        """
+        get_cache().clear()
+        mock_step1_is_complete.return_value = True
+        mock_step2_is_complete.return_value = False
+        self.tour1.tour_class = 'tour.tests.mocks.MockSummaryTour'
+        self.tour1.steps.add(self.step1, self.step2, self.step3)
+        tour1_class = self.tour1.load_tour_class()
+        tour1_class.add_user(self.test_user)
+        tour1_class.add_user(self.test_user2)
+
+        self.assertEqual(self.step2, tour1_class.get_current_step(self.test_user))
+        tour_status = TourStatus.objects.get(user=self.test_user)
+        self.assertEqual(self.step2, tour_status.current_step)
+        self.assertEqual(
+            (1, 3, 33), (tour_status.num_complete_steps, tour_status.num_steps, tour_status.percent_complete))
+        self.assertIsNotNone(tour_status.evaluate_time)
+        self.assertIsNone(TourStatus.objects.get(user=self.test_user2).evaluate_time)
+
+        # An unchanged summary isn't saved again
+        with self.assertNumQueries(0):
+            tour1_class.get_current_step(self.test_user)
+
+        mock_step2_is_complete.return_value = True
+        self.assertIsNone(tour1_class.get_current_step(self.test_user))
+        tour_status = TourStatus.objects.get(user=self.test_user)
+        self.assertIsNone(tour_status.current_step)
+        self.assertEqual(
+            (3, 3, 100), (tour_status.num_complete_steps, tour_status.num_steps, tour_status.percent_complete))
+
+        # Tours without the summary and anonymous users don't save it
+        self.tour2.steps.add(self.step4)
+        self.tour2.load_tour_class().add_user(self.test_user2)
+        with self.assertNumQueries(1):
+            self.tour2.load_tour_class().get_current_step(self.test_user2)
+        with self.assertNumQueries(0):
+            tour1_class.get_current_step(User())
+
     @patch('tour.tests.mocks.MockStep4.is_complete', spec_set=True)
     @patch('tour.tests.mocks.MockStep3.is_complete', spec_set=True)
     @patch('tour.tests.mocks.MockStep2.is_complete', spec_set=True)
@@ -208,6 +641,41 @@ class TourTest(BaseTourTest):
         mock_step2_is_complete.return_value = True
         self.assertEqual('mock_complete1', tour1_class.get_next_url(self.test_user))
 
+    @patch('tour.tests.mocks.MockStep3.is_complete', spec_set=True)
+    @patch('tour.tests.mocks.MockStep2.is_complete_bulk', spec_set=True)
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    def test_iter_progress(self, mock_step1_is_complete, mock_step2_is_complete_bulk, mock_step3_is_complete):
+        """
+        Verifies that the progress of many users is evaluated in batches with the bulk completion checks
+        :type mock_step1_is_complete: Mock
+        :type mock_step2_is_complete_bulk: Mock
+        :type mock_step3_is_complete: Mock
+        """
+        test_user3 = User.objects.create_user('test3', 'test3@gmail.com', 'test3')
+        mock_step1_is_complete.side_effect = lambda user: user != self.test_user
+        mock_step2_is_complete_bulk.return_value = set([self.test_user2.id])
+        mock_step3_is_complete.return_value = True
+        self.tour1.steps.add(self.step1, self.step2, self.step3)
+        tour1_class = self.tour1.load_tour_class()
+
+        with self.assertNumQueries(2):
+            progress = list(tour1_class.iter_progress(User.objects.order_by('id'), batch_size=2))
+        self.assertEqual([
+            (self.test_user, self.step1, 'mock1'),
+            (self.test_user2, None, 'mock_complete1'),
+            (test_user3, self.step2, 'mock2'),
+        ], progress)
+        self.assertEqual(
+            [[self.test_user2], [test_user3]],
+            [call_args[0][0] for call_args in mock_step2_is_complete_bulk.call_args_list])
+        self.assertEqual(1, mock_step3_is_complete.call_count)
+
+        # The steps stop being checked once no user of the batch completed the previous steps
+        mock_step2_is_complete_bulk.reset_mock()
+        self.assertEqual(
+            [(self.test_user, self.step1, 'mock1')], list(tour1_class.iter_progress([self.test_user], batch_size=1)))
+        self.assertFalse(mock_step2_is_complete_bulk.called)
+
     @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
     def test_is_complete(self, mock_step1_is_complete):
         """
@@ -225,6 +693,85 @@ class TourTest(BaseTourTest):
         self.assertTrue(tour1_class.is_complete(self.test_user))
 
 
+class TourSnapshotTest(BaseTourTest):
+    """
+    Tests the in memory snapshot of the tour definitions
+    """
+    def test_versioned(self):
+        """
+        Verifies the snapshot is shared until any tour or step changes
+        """
+        self.tour1.steps.add(self.step1, self.step2)
+        self.step1.steps.add(self.step2)
+        snapshot = get_tour_snapshot()
+        self.assertIs(snapshot, get_tour_snapshot())
+        self.assertEqual([self.step1, self.step2], snapshot.get_tour_steps(self.tour1.id))
+        self.assertEqual([self.step1], snapshot.get_tour_steps(self.tour1.id, depth=0))
+
+        # The steps of the snapshot can't be changed through the returned list
+        snapshot.get_tour_steps(self.tour1.id).append(self.step3)
+        self.assertEqual([self.step1, self.step2], snapshot.get_tour_steps(self.tour1.id))
+
+        self.tour2.save()
+        self.assertIsNot(snapshot, get_tour_snapshot())
+
+    @patch('tour.tours.time.time', spec_set=True)
+    def test_max_age(self, mock_time):
+        """
+        Verifies the snapshot is loaded again once it is older than the maximum age, even if the version is the same
+        :type mock_time: Mock
+        """
+        mock_time.return_value = 1000
+        self.tour1.steps.add(self.step1)
+        snapshot = get_tour_snapshot()
+        mock_time.return_value = 1059
+        self.assertIs(snapshot, get_tour_snapshot())
+
+        # A step changed in a transaction that hadn't committed when the version changed is loaded after the max age
+        Step.objects.filter(id=self.step1.id).update(url='mock-updated')
+        mock_time.return_value = 1060
+        with self.assertNumQueries(1):
+            self.assertEqual('mock-updated', get_tour_snapshot().get_tour_steps(self.tour1.id)[0].url)
+
+        with override_settings(TOUR_SNAPSHOT_MAX_AGE=None):
+            snapshot = get_tour_snapshot()
+            mock_time.return_value = 100000
+            self.assertIs(snapshot, get_tour_snapshot())
+
+    def test_get_step_tree(self):
+        """
+        Verifies the snapshot is used for tours with steps and the steps of other tours are loaded
+        """
+        self.tour1.steps.add(self.step1)
+        snapshot = get_tour_snapshot()
+        self.assertIs(snapshot, get_step_tree([self.tour1.id]))
+        with self.assertNumQueries(1):
+            step_tree = get_step_tree([self.tour1.id, self.tour2.id])
+        self.assertEqual(set([self.tour1.id, self.tour2.id]), step_tree.tour_ids)
+        self.assertEqual([self.step1], step_tree.get_tour_steps(self.tour1.id))
+        self.assertEqual([], step_tree.get_tour_steps(self.tour2.id))
+
+    def test_nested_steps_of_other_tours(self):
+        """
+        Verifies the nested steps of a tour include child steps that belong to other tours however the steps are
+        loaded
+        """
+        self.tour1.steps.add(self.step1)
+        self.step1.steps.add(self.step3)
+        self.step3.steps.add(self.step4)
+        expected_steps = [self.step1, self.step3, self.step4]
+
+        self.assertEqual(expected_steps, get_tour_snapshot().get_tour_steps(self.tour1.id))
+        # One query per level of nesting and one more to find there are no more levels
+        with self.assertNumQueries(4):
+            self.assertEqual(expected_steps, StepTree.load([self.tour1.id]).get_tour_steps(self.tour1.id))
+
+        step_tree = get_step_tree([self.tour1.id, self.tour2.id])
+        self.assertEqual(set([self.tour1.id, self.tour2.id]), step_tree.tour_ids)
+        self.assertEqual(expected_steps, step_tree.get_tour_steps(self.tour1.id))
+        self.assertEqual([self.step4], self.step3.load_step_class().get_steps())
+
+
 class StepTest(BaseTourTest):
     """
     Tests the functionality of the BaseStep class
@@ -258,3 +805,15 @@ class StepTest(BaseTourTest):
         self.step2.steps.add(self.step3, self.step4)
         expected_steps = [self.step2, self.step3, self.step4]
         self.assertEqual(expected_steps, self.step1.load_step_class().get_steps())
+
+    def test_get_steps_depth(self):
+        """
+        Verifies that the depth limits the nested steps and that they are loaded with a single query
+        """
+        self.step1.tour.steps.add(self.step2, self.step3, self.step4)
+        self.step1.steps.add(self.step2)
+        self.step2.steps.add(self.step3, self.step4)
+        step1_class = self.step1.load_step_class()
+
+        with self.assertNumQueries(1):
+            self.assertEqual([self.step2], step1_class.get_steps(0))
@@ -7,4 +7,4 @@ class UrlsTest(TestCase):
         """
         Should have several urls defined.
         """
-        self.assertEqual(len(urlpatterns), 1)
+        self.assertEqual(len(urlpatterns), 2)
@@ -90,3 +90,20 @@ class ViewTest(BaseTourTest):
         mock_view = MockView(request=mock_request)
         response = mock_view.dispatch(mock_request)
         self.assertEqual(200, response.status_code)
+
+    @patch('tour.tests.mocks.MockStep1.is_complete', spec_set=True)
+    @patch('tour.tests.mocks.MockStep2.url_name', 'mock:step2')
+    def test_redirect_from_future_named_step(self, mock_step1_is_complete):
+        """
+        Verifies that steps are matched by the url name of the resolved request
+        :type mock_step1_is_complete: Mock
+        """
+        mock_step1_is_complete.return_value = False
+
+        self.tour1.load_tour_class().add_user(self.test_user)
+        mock_request = Mock(
+            user=self.test_user, path='mock2/5', method='get', GET={}, resolver_match=Mock(view_name='mock:step2'))
+        mock_view = MockView(request=mock_request)
+        response = mock_view.dispatch(mock_request)
+        self.assertEqual(302, response.status_code)
+        self.assertEqual('mock1', response.url)
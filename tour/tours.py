@@ -1,12 +1,214 @@
 import datetime
+import time
 
-from tour.models import TourStatus
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, transaction
+from django.db.models.query import QuerySet
+
+from tour.cache import (
+    get_definition_version, get_progress_hint, get_progress_summary, get_step_completion, get_url_index,
+    invalidate_step_completion, set_progress_hint, set_progress_summary, set_step_completion, set_url_index
+)
+from tour.executors import iter_step_completion
+from tour.instrumentation import instrument
+from tour.models import Step, StepStatus, TourStatus
+from tour.signals import tour_progress_changed
+
+_snapshot = None
+
+
+class StepTree(object):
+    """
+    In memory representation of the step hierarchy of a set of tours. The steps of the tours are fetched with one
+    query per level of nesting and the nested ordering is resolved without going back to the database. The steps
+    of a tour are its steps without a parent step followed by their child steps, which can belong to any tour.
+    """
+    def __init__(self, steps=(), tour_ids=()):
+        """
+        :param steps: All steps of the tours in sort order
+        :param tour_ids: The ids of the tours whose steps are in the tree
+        """
+        self.tour_ids = set(tour_ids)
+        self.root_steps = {}
+        self.child_steps = {}
+        self.add_steps(steps)
+
+    @classmethod
+    def load(cls, tour_ids):
+        """
+        Builds the tree for all steps of the given tour ids using one query per level of nesting
+        """
+        return cls().load_tours(tour_ids)
+
+    def load_tours(self, tour_ids):
+        """
+        Adds all steps of the given tour ids to the tree using one query per level of nesting
+        """
+        self.tour_ids.update(tour_ids)
+        steps = list(Step.objects.filter(tour_id__in=tour_ids, parent_step=None).order_by('sort_order'))
+        while steps:
+            self.add_steps(steps)
+            steps = list(Step.objects.filter(parent_step_id__in=[step.id for step in steps]).order_by('sort_order'))
+        return self
+
+    def add_steps(self, steps):
+        """
+        Adds the steps to the tree. Steps must be added in sort order.
+        """
+        for step in steps:
+            if step.parent_step_id is None:
+                self.root_steps.setdefault(step.tour_id, []).append(step)
+            else:
+                self.child_steps.setdefault(step.parent_step_id, []).append(step)
+
+    def flatten(self, steps, depth=-1):
+        """
+        Returns the given steps followed by their children in order, descending at most `depth` levels.
+        A negative depth means there is no limit.
+        """
+        all_steps = []
+        for step in steps:
+            all_steps.append(step)
+            if depth != 0:
+                all_steps.extend(self.flatten(self.child_steps.get(step.id, []), depth=depth - 1))
+        return all_steps
+
+    def get_tour_steps(self, tour_id, depth=-1):
+        """
+        Returns the flattened steps of a tour
+        """
+        return self.flatten(self.root_steps.get(tour_id, []), depth=depth)
+
+    def get_child_steps(self, step_id, depth=-1):
+        """
+        Returns the flattened descendants of a step
+        """
+        return self.flatten(self.child_steps.get(step_id, []), depth=depth)
+
+
+class TourSnapshot(StepTree):
+    """
+    Step tree of every tour that is kept in process memory and shared by all requests until the definition version
+    changes, which happens when any tour or step changes in any process, or until it is older than
+    TOUR_SNAPSHOT_MAX_AGE seconds. The flattened steps of each tour are computed once. The steps are shared, so they
+    must not be changed.
+    """
+    def __init__(self, version, steps=()):
+        steps = list(steps)
+        super(TourSnapshot, self).__init__(steps, set(step.tour_id for step in steps))
+        self.version = version
+        self.load_time = time.time()
+        self.tour_steps = dict(
+            (tour_id, tuple(super(TourSnapshot, self).get_tour_steps(tour_id))) for tour_id in self.tour_ids)
+
+    @classmethod
+    def load(cls, version):
+        """
+        Builds the snapshot of the steps of every tour using one query
+        """
+        return cls(version, Step.objects.order_by('sort_order'))
+
+    def get_tour_steps(self, tour_id, depth=-1):
+        if depth < 0 and tour_id in self.tour_steps:
+            return list(self.tour_steps[tour_id])
+        return super(TourSnapshot, self).get_tour_steps(tour_id, depth=depth)
+
+
+def get_tour_snapshot():
+    """
+    Returns the snapshot of the current definition version, loading it again if any tour or step changed or it is
+    older than TOUR_SNAPSHOT_MAX_AGE seconds. The version changes before the transaction changing the definitions
+    commits, so the maximum age makes sure a snapshot loaded in the meantime is replaced.
+    :rtype: TourSnapshot
+    """
+    global _snapshot
+    version = get_definition_version()
+    snapshot = _snapshot
+    max_age = getattr(settings, 'TOUR_SNAPSHOT_MAX_AGE', 60)
+    if snapshot is None or snapshot.version != version or (
+            max_age is not None and time.time() - snapshot.load_time >= max_age):
+        snapshot = _snapshot = TourSnapshot.load(version)
+    return snapshot
+
+
+def get_step_tree(tour_ids):
+    """
+    Returns a step tree containing the tours, which is the snapshot unless some of the tours are missing from it.
+    Only tours without steps are missing, and their steps are loaded in case they were added since the snapshot
+    was loaded.
+    :rtype: StepTree
+    """
+    snapshot = get_tour_snapshot()
+    missing_ids = set(tour_ids).difference(snapshot.tour_ids)
+    if not missing_ids:
+        return snapshot
+    snapshot_ids = snapshot.tour_ids.intersection(tour_ids)
+    step_tree = StepTree(
+        (step for tour_id in snapshot_ids for step in snapshot.tour_steps[tour_id]), snapshot_ids)
+    return step_tree.load_tours(missing_ids)
+
+
+class UrlIndex(object):
+    """
+    Maps the urls and url names of the steps of a tour to the position of the step in the tour, so the position
+    of a request can be found without scanning the steps. Positions are -1 for urls that are not part of the tour.
+    """
+    def __init__(self, paths=None, names=None):
+        self.paths = paths or {}
+        self.names = names or {}
+
+    @classmethod
+    def build(cls, steps):
+        """
+        Builds the index for the ordered steps of a tour. Steps are matched by their url and by the `url_name`
+        of their step class, and the first step wins if several steps match the same url. Steps whose step class
+        can't be loaded are only matched by their url, so a misconfigured step doesn't break every request.
+        """
+        url_index = cls()
+        for position, step in enumerate(steps):
+            if step.url:
+                url_index.paths.setdefault(step.url, position)
+            try:
+                url_name = step.load_step_class().url_name
+            except ImproperlyConfigured:
+                url_name = None
+            if url_name:
+                url_index.names.setdefault(url_name, position)
+        return url_index
+
+    def get_position(self, url):
+        """
+        Returns the position of the step with the url
+        """
+        return self.paths.get(url, -1)
+
+    def get_request_position(self, request):
+        """
+        Returns the position of the step matching the path of the request or the name of the url pattern it
+        was resolved to
+        """
+        position = self.paths.get(request.path)
+        if position is None:
+            resolver_match = getattr(request, 'resolver_match', None)
+            position = self.names.get(getattr(resolver_match, 'view_name', None), -1)
+        return position
 
 
 class BaseStep(object):
     """
     Base step class that handles the creation of step records and determines when the step is complete
     """
+    # Set to True to keep the result of is_complete in the django cache across requests
+    cache_completion = False
+    # The number of seconds a cached completion value is kept
+    completion_cache_timeout = 300
+    # Set to True to never evaluate the step again once it is complete for a user
+    sticky_completion = False
+    # The name of the url pattern of the step, including any namespace, which matches every url of the pattern
+    url_name = None
+
     def __init__(self, step):
         self.step = step
 
@@ -16,40 +218,101 @@ class BaseStep(object):
         """
         return True
 
+    def check_complete(self, user):
+        """
+        Returns the result of is_complete for the user, using the cached value when the step enables
+        `cache_completion`
+        """
+        cache_completion = self.cache_completion and user.pk
+        if cache_completion:
+            complete = get_step_completion(self.__class__, user)
+            if complete is not None:
+                return complete
+        with instrument('is_complete', step=self.step.name):
+            complete = self.is_complete(user)
+        if cache_completion:
+            set_step_completion(self.__class__, user, complete)
+        return complete
+
+    def is_complete_bulk(self, users):
+        """
+        Checks the completion of the step for many users at once. Steps that can determine which users completed
+        them with a single query can override this, by default `is_complete` is called for each user.
+        :param users: A list of users
+        :type users: list
+        :return: The ids of the users that completed the step
+        :rtype: set
+        """
+        return set(user.pk for user in users if self.check_complete(user))
+
+    def ais_complete(self, user=None):  # pragma: python3
+        """
+        Awaitable completion check used by the async api of the tour. By default `check_complete` runs on the tour
+        thread pool. Steps that can check their completion without blocking can override this with a coroutine.
+        """
+        from tour.aio import run_in_executor
+        return run_in_executor(self.check_complete, user)
+
+    @classmethod
+    def invalidate_completion(cls, users):
+        """
+        Removes the cached completion values of the step for the users or user ids, this should be called when the
+        data that determines completion changes
+        """
+        invalidate_step_completion(cls, [getattr(user, 'pk', user) for user in users])
+
     def get_steps(self, depth=-1):
         """
         Returns the steps in order based on if there is a parent or not
-        TODO: optimize this
         """
-        all_steps = []
-        steps = self.step.steps.filter(parent_step=self.step).order_by('sort_order')
-        for step in steps:
-            all_steps.append(step)
-            if depth != 0:
-                all_steps.extend(step.load_step_class().get_steps(depth=depth - 1))
-        return all_steps
+        return get_step_tree([self.step.tour_id]).get_child_steps(self.step.id, depth=depth)
 
 
 class BaseTour(object):
     """
     Base tour class that handles the creation of tour records and determines when tours are complete.
     """
+    # Set to True to record the step progress of users so completed steps are not evaluated again
+    persist_step_progress = False
+    # The number of seconds the url index of the tour is cached
+    url_index_timeout = 3600
+    # Set to True to check the completion of the steps at the same time on a thread pool
+    parallel_step_checks = False
+    # The number of seconds a parallel step check can take before the step is considered incomplete
+    step_check_timeout = None
+    # Set to True if a complete step never becomes incomplete again, so each user's checks resume from the step
+    # that was current the last time
+    monotonic_steps = False
+    # Set to True to save the current step and the number of complete steps to the tour status of each user whenever
+    # the current step is evaluated
+    persist_progress_summary = False
+    # The number of seconds an unchanged progress summary is not saved again, which limits how often the evaluate
+    # time of the tour status is updated
+    progress_summary_timeout = 300
+
     def __init__(self, tour):
-        # self.current_step_class = None
         self.tour = tour
+        # A step tree that already contains the steps of the tour, such as one shared by several tours
+        self.step_tree = None
+        # A dict of step ids to the completion of the steps that were already checked for one user, which is filled
+        # in as more steps are checked, such as one shared by the tour state of a request
+        self.step_completion = None
+        # The recorded step progress of one user that was already fetched, such as by the tour state of a request
+        self.step_progress = None
+
+    def get_step_tree(self):
+        """
+        Returns the step tree containing the steps of the tour, loading it if one wasn't provided
+        """
+        if self.step_tree is None or self.tour.id not in self.step_tree.tour_ids:
+            return get_step_tree([self.tour.id])
+        return self.step_tree
 
     def get_steps(self, depth=-1):
         """
         Returns the steps in order based on if there is a parent or not
-        TODO: optimize this
         """
-        all_steps = []
-        steps = self.tour.steps.filter(parent_step=None).order_by('sort_order')
-        for step in steps:
-            all_steps.append(step)
-            if depth != 0:
-                all_steps.extend(step.load_step_class().get_steps(depth=depth - 1))
-        return all_steps
+        return self.get_step_tree().get_tour_steps(self.tour.id, depth=depth)
 
     def get_url_list(self):
         """
@@ -57,13 +320,86 @@ class BaseTour(object):
         """
         return [step.url for step in self.get_steps() if step.url]
 
+    def get_url_index(self):
+        """
+        Returns the url index of the steps of the tour. The index is kept in the django cache until any tour or
+        step changes.
+        :rtype: UrlIndex
+        """
+        version, cached_index = get_url_index(self.tour.id)
+        if cached_index is not None:
+            return UrlIndex(*cached_index)
+        url_index = UrlIndex.build(self.get_steps())
+        set_url_index(self.tour.id, version, (url_index.paths, url_index.names), self.url_index_timeout)
+        return url_index
+
     def add_user(self, user):
         """
-        Adds a relationship record for the user
+        Adds a relationship record for the user. The unique index on incomplete statuses makes the insert
+        fail if another request added the user first, in which case get_or_create returns that record.
         """
         instance, created = TourStatus.objects.get_or_create(tour=self.tour, user=user, complete=False)
+        if created:
+            tour_progress_changed.send(sender=TourStatus, user=user, user_ids=[user.pk])
         return instance
 
+    def add_users(self, users, batch_size=1000):
+        """
+        Adds relationship records for many users with one bulk insert per batch. Users that already have an
+        incomplete status for the tour and user ids that don't exist are skipped.
+        :param users: A queryset or iterable of users or user ids
+        :param batch_size: The number of users handled per batch
+        :return: A dict with the number of users that were `added` and `skipped`
+        :rtype: dict
+        """
+        # The ids of a queryset are known to exist
+        check_users = not isinstance(users, QuerySet)
+        if check_users:
+            user_ids = (getattr(user, 'pk', user) for user in users)
+        else:
+            user_ids = users.values_list('pk', flat=True).iterator()
+
+        counts = {'added': 0, 'skipped': 0}
+        batch = []
+        for user_id in user_ids:
+            batch.append(user_id)
+            if len(batch) == batch_size:
+                self._add_user_batch(batch, counts, check_users)
+                batch = []
+        if batch:
+            self._add_user_batch(batch, counts, check_users)
+        return counts
+
+    def _add_user_batch(self, user_ids, counts, check_users=True, retry=True):
+        """
+        Inserts the missing status records for one batch of user ids and updates the counts. If another
+        process added some of the users in the meantime the batch is checked again.
+        :param check_users: Whether to skip the user ids that don't exist instead of failing the insert
+        """
+        existing_ids = set(TourStatus.objects.filter(
+            tour=self.tour, complete=False, user_id__in=user_ids).values_list('user_id', flat=True))
+        new_ids = []
+        for user_id in user_ids:
+            if user_id not in existing_ids:
+                existing_ids.add(user_id)
+                new_ids.append(user_id)
+        if new_ids and check_users:
+            found_ids = set(get_user_model().objects.filter(pk__in=new_ids).values_list('pk', flat=True))
+            new_ids = [user_id for user_id in new_ids if user_id in found_ids]
+        if new_ids:
+            try:
+                with transaction.atomic():
+                    TourStatus.objects.bulk_create([
+                        TourStatus(tour=self.tour, user_id=user_id) for user_id in new_ids
+                    ])
+            except IntegrityError:
+                if not retry:
+                    raise
+                return self._add_user_batch(user_ids, counts, check_users, retry=False)
+            tour_progress_changed.send(sender=TourStatus, user=None, user_ids=new_ids)
+        counts['added'] += len(new_ids)
+        counts['skipped'] += len(user_ids) - len(new_ids)
+
     def mark_complete(self, user):
         """
         Marks the tour status record as complete
@@ -73,21 +409,167 @@ class BaseTour(object):
             tour_status.complete = True
             tour_status.complete_time = datetime.datetime.utcnow()
             tour_status.save()
+            tour_progress_changed.send(sender=TourStatus, user=user, user_ids=[user.pk])
             return True
         return False
 
-    def get_current_step(self, user):
+    def get_step_progress(self, user):
+        """
+        Fetches the recorded step progress of the user with a single query
+        :return: A dict of step ids to whether the step is recorded as complete
+        :rtype: dict
+        """
+        return dict(
+            StepStatus.objects.filter(user=user, step__tour=self.tour).values_list('step_id', 'complete'))
+
+    def record_step_progress(self, user, complete_steps, incomplete_steps, step_progress):
+        """
+        Records the completion of the steps for the user, only writing the records that changed
+        :param step_progress: The recorded step progress of the user, this is updated with the changes
+        :type step_progress: dict
+        """
+        now = datetime.datetime.utcnow()
+        create_ids = [step.id for step in complete_steps if step.id not in step_progress]
+        update_ids = [step.id for step in complete_steps if step_progress.get(step.id) is False]
+        reset_ids = [step.id for step in incomplete_steps if step_progress.get(step.id)]
+        if update_ids:
+            StepStatus.objects.filter(user=user, step_id__in=update_ids).update(complete=True, complete_time=now)
+        if reset_ids:
+            StepStatus.objects.filter(user=user, step_id__in=reset_ids).update(complete=False, complete_time=None)
+        if create_ids:
+            try:
+                with transaction.atomic():
+                    StepStatus.objects.bulk_create([
+                        StepStatus(user=user, step_id=step_id, complete=True, complete_time=now)
+                        for step_id in create_ids
+                    ])
+            except IntegrityError:
+                # Another request recorded the steps first
+                StepStatus.objects.filter(user=user, step_id__in=create_ids).update(complete=True, complete_time=now)
+        step_progress.update((step_id, True) for step_id in create_ids + update_ids)
+        step_progress.update((step_id, False) for step_id in reset_ids)
+        if create_ids or update_ids or reset_ids:
+            tour_progress_changed.send(sender=StepStatus, user=user, user_ids=[user.pk])
+
+    def get_progress_hint(self, user):
+        """
+        Returns the tour definition version and the number of leading steps the user is known to have completed.
+        The number is always 0 unless the tour enables `monotonic_steps`.
+        :rtype: tuple
+        """
+        if not self.monotonic_steps or not user.pk:
+            return None, 0
+        return get_progress_hint(self.tour.id, user.pk)
+
+    def update_progress_hint(self, user, version, position, steps, current_step):
         """
-        Finds the first incomplete steps and returns it
+        Remembers the position of the current step as the number of leading steps the user completed
+        :param version: The tour definition version returned by `get_progress_hint`
+        :param position: The number of leading steps returned by `get_progress_hint`
+        """
+        if version is not None:
+            current_position = steps.index(current_step) if current_step else len(steps)
+            if current_position != position:
+                set_progress_hint(self.tour.id, user.pk, version, current_position)
+
+    def update_progress_summary(self, user, steps, current_step):
+        """
+        Saves the current step, the number of steps before it and the total number of steps to the incomplete tour
+        status of the user if the tour enables `persist_progress_summary`. An unchanged summary is only saved again
+        after `progress_summary_timeout` seconds.
+        :param steps: All steps of the tour
+        :type steps: list
+        """
+        if not self.persist_progress_summary or not user.pk:
+            return
+        num_complete_steps = steps.index(current_step) if current_step else len(steps)
+        summary = (current_step.id if current_step else None, num_complete_steps, len(steps))
+        version, saved_summary = get_progress_summary(self.tour.id, user.pk)
+        if summary != saved_summary:
+            TourStatus.objects.filter(tour=self.tour, user=user, complete=False).update(
+                current_step=current_step, num_complete_steps=num_complete_steps, num_steps=len(steps),
+                evaluate_time=datetime.datetime.utcnow())
+            set_progress_summary(self.tour.id, user.pk, version, summary, self.progress_summary_timeout)
+
+    def iter_step_completion(self, user, steps):
+        """
+        Yields a tuple of each step and whether it is complete, in the order of the steps. Steps that are in
+        `step_completion` are not checked again, and the completion of the other steps is added to it.
+        """
+        step_completion = {} if self.step_completion is None else self.step_completion
+        unchecked_completion = self.check_step_completion(
+            user, [step for step in steps if step.id not in step_completion])
+        try:
+            for step in steps:
+                if step.id not in step_completion:
+                    step_completion[step.id] = next(unchecked_completion)[1]
+                yield step, step_completion[step.id]
+        finally:
+            unchecked_completion.close()
+
+    def check_step_completion(self, user, steps):
+        """
+        Checks the completion of the steps and yields a tuple of each step and whether it is complete, in the order
+        of the steps. The steps are checked one at a time as they are consumed, or all at once on a thread pool if
+        the tour enables `parallel_step_checks`.
+        """
+        if self.parallel_step_checks and len(steps) > 1:
+            step_completion = iter_step_completion(user, steps, timeout=self.step_check_timeout)
+            try:
+                for step_complete in step_completion:
+                    yield step_complete
+            finally:
+                step_completion.close()
+        else:
+            for step in steps:
+                yield step, step.load_step_class().check_complete(user)
+
+    def get_current_step(self, user, live=False, step_progress=None):
+        """
+        Finds the first incomplete steps and returns it. When the tour persists step progress, steps recorded as
+        complete are not evaluated again unless a live check is requested. Monotonic tours also skip the steps
+        before the step that was current the last time.
         :param user: The django user to find the current step for
         :type user: User
+        :param live: Evaluate every step even if it is recorded as complete and update the recorded progress
+        :type live: bool
+        :param step_progress: The already fetched recorded step progress, which is updated with any changes.
+            Defaults to `self.step_progress`.
+        :type step_progress: dict
         :return: The first incomplete step
         :rtype: Step
         """
-        for step in self.get_steps():
-            if not step.load_step_class().is_complete(user):
-                return step
-        return None
+        with instrument('get_current_step', tour=self.tour.name):
+            persist_step_progress = self.persist_step_progress and user.pk
+            if step_progress is None:
+                step_progress = self.step_progress
+            if persist_step_progress and step_progress is None:
+                step_progress = self.get_step_progress(user)
+
+            # Steps before the progress hint of monotonic tours are known to be complete
+            all_steps = self.get_steps()
+            version, position = self.get_progress_hint(user)
+            start = 0 if live else position
+
+            current_step = None
+            complete_steps = []
+            steps = [
+                step for step in all_steps[start:]
+                if not step_progress or not step_progress.get(step.id) or live
+            ]
+            step_completion = self.iter_step_completion(user, steps)
+            for step, complete in step_completion:
+                if not complete:
+                    current_step = step
+                    break
+                complete_steps.append(step)
+            step_completion.close()
+
+            if persist_step_progress:
+                self.record_step_progress(user, complete_steps, [current_step] if current_step else [], step_progress)
+            self.update_progress_hint(user, version, position, all_steps, current_step)
+            self.update_progress_summary(user, all_steps, current_step)
+            return current_step
 
     def get_next_url(self, user):
         """
@@ -101,3 +583,86 @@ class BaseTour(object):
         Checks the state of the steps to see if they are all complete
         """
         return False if self.get_current_step(user) else True
+
+    def iter_progress(self, users, batch_size=1000):
+        """
+        Finds the current step and next url of many users, such as every user of the tour for a report. The steps
+        are loaded once and the users are evaluated in batches, where each step is checked with `is_complete_bulk`
+        for the users of the batch that completed all steps before it. Recorded progress is not used or updated.
+        :param users: A queryset or iterable of users
+        :param batch_size: The number of users evaluated at a time
+        :return: A generator of tuples of each user, their current step and their next url
+        """
+        steps = self.get_steps()
+        step_classes = [step.load_step_class() for step in steps]
+        if isinstance(users, QuerySet):
+            users = users.iterator()
+
+        batch = []
+        for user in users:
+            batch.append(user)
+            if len(batch) == batch_size:
+                for progress in self._get_batch_progress(batch, steps, step_classes):
+                    yield progress
+                batch = []
+        if batch:
+            for progress in self._get_batch_progress(batch, steps, step_classes):
+                yield progress
+
+    def _get_batch_progress(self, users, steps, step_classes):
+        """
+        Returns a list of tuples of each user of a batch, their current step and their next url
+        """
+        with instrument('get_batch_progress', tour=self.tour.name, num_users=len(users)):
+            current_steps = {}
+            remaining_users = users
+            for step, step_class in zip(steps, step_classes):
+                if not remaining_users:
+                    break
+                complete_ids = step_class.is_complete_bulk(remaining_users)
+                for user in remaining_users:
+                    if user.pk not in complete_ids:
+                        current_steps[user.pk] = step
+                remaining_users = [user for user in remaining_users if user.pk in complete_ids]
+
+        progress = []
+        for user in users:
+            current_step = current_steps.get(user.pk)
+            progress.append((user, current_step, current_step.url if current_step else self.tour.complete_url))
+        return progress
+
+    def aget_steps(self, depth=-1):  # pragma: python3
+        """
+        Awaitable version of `get_steps`
+        """
+        from tour.aio import run_in_executor
+        return run_in_executor(self.get_steps, depth)
+
+    def aget_current_step(self, user):  # pragma: python3
+        """
+        Awaitable version of `get_current_step`. The `ais_complete` checks of all steps run concurrently and the
+        first incomplete step is returned, so the result is the same as checking the steps in order. Tours that
+        persist step progress or a progress summary, or that have monotonic steps, are evaluated in order with
+        `get_current_step` so the progress is read and recorded.
+        """
+        from tour.aio import get_first_incomplete_step, run_in_executor, then
+        if (self.persist_step_progress or self.persist_progress_summary or self.monotonic_steps) and user.pk:
+            return run_in_executor(self.get_current_step, user)
+        return then(self.aget_steps(), lambda steps: get_first_incomplete_step(
+            steps, [step.load_step_class().ais_complete(user) for step in steps]))
+
+    def aget_next_url(self, user):  # pragma: python3
+        """
+        Awaitable version of `get_next_url`
+        """
+        from tour.aio import then
+        return then(
+            self.aget_current_step(user),
+            lambda current_step: current_step.url if current_step else self.tour.complete_url)
+
+    def ais_complete(self, user):  # pragma: python3
+        """
+        Awaitable version of `is_complete`
+        """
+        from tour.aio import then
+        return then(self.aget_current_step(user), lambda current_step: current_step is None)
@@ -5,4 +5,5 @@ from tour import api
 urlpatterns = patterns(
     '',
     url(r'^api/tour/$', api.TourApiView.as_view(), name='tour.tour_api'),
+    url(r'^api/tour/export/$', api.TourExportApiView.as_view(), name='tour.tour_export_api'),
 )
@@ -1,5 +1,5 @@
 from django.http import HttpResponseRedirect
-from tour.models import Tour
+from tour.state import get_tour_state
 
 
 class TourStepMixin(object):
@@ -8,7 +8,7 @@ class TourStepMixin(object):
     """
     def tour_should_redirect(self, user, tour_class, current_index, next_index):
         # check if tour is incomplete
-        if tour_class.get_current_step(user):
+        if get_tour_state(self.request).get_current_step(tour_class.tour):
             # check if the current step is later in the tour than the expected step
             if current_index >= 0 and next_index >= 0:
                 if current_index > next_index:
@@ -22,36 +22,51 @@ class TourStepMixin(object):
         return False
 
     def get_user_tour(self, request):
-        # Get the tour class for the user
-        tour = Tour.objects.get_for_user(request.user)
-        if tour is None:
-            tour = Tour.objects.get_recent_tour(request.user)
-        return tour
+        # Get the tour for the user, this is shared with anything else using the tour state of the request
+        return get_tour_state(request).tour
 
     def get_tour_redirect_url(self, request):
         tour = self.get_user_tour(request)
         if not tour:
             return None
 
-        # Determine the current step and expected step indices
-        tour_class = tour.load_tour_class()
-        next_url = tour_class.get_next_url(request.user)
-        url_list = tour_class.get_url_list()
-
-        current_index = -1
-        next_index = -1
-        if request.path in url_list:
-            current_index = url_list.index(request.path)
-        if next_url in url_list:
-            next_index = url_list.index(next_url)
+        # Determine the current step and expected step positions, the current step is only evaluated once
+        # and shared with tour_should_redirect through the tour state
+        tour_state = get_tour_state(request)
+        tour_class = tour_state.get_tour_class(tour)
+        next_url = tour_state.get_next_url(tour)
+        url_index = tour_state.get_url_index(tour)
+
+        current_index = url_index.get_request_position(request)
+        next_index = url_index.get_position(next_url)
         should_redirct = self.tour_should_redirect(request.user, tour_class, current_index, next_index)
         if should_redirct:
             return next_url
         return None
 
-    def dispatch(self, request, *args, **kwargs):
+    def get_tour_response(self, request):
+        """
+        Returns a redirect to the expected step if the user can't access the page yet, otherwise returns None
+        after preparing the tour state of the request for the view
+        """
         redirect_url = self.get_tour_redirect_url(request)
         if redirect_url:
             return HttpResponseRedirect(redirect_url)
 
+        if request.method.upper() not in ('GET', 'HEAD', 'OPTIONS', 'TRACE'):
+            # The view is likely to change the progress of the user, so recalculate anything used after it
+            get_tour_state(request).invalidate()
+        return None
+
+    def aget_tour_response(self, request):  # pragma: python3
+        """
+        Awaitable version of `get_tour_response` for views that are served from an asyncio event loop
+        """
+        from tour.aio import run_in_executor
+        return run_in_executor(self.get_tour_response, request)
+
+    def dispatch(self, request, *args, **kwargs):
+        response = self.get_tour_response(request)
+        if response:
+            return response
         return super(TourStepMixin, self).dispatch(request, *args, **kwargs)